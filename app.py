@@ -1,34 +1,45 @@
 import json
 import os
+import sys
 
+import click
 import pydantic
 from dotenv import load_dotenv, find_dotenv
-from flask import Flask, render_template, redirect, url_for, request, session, jsonify, abort
+from flask import Flask, render_template, redirect, url_for, request, session, jsonify, abort, stream_template
 
 import auth_router
+import avatar_thumbnails
+import feed_cards
+import game_bundle
+import storage_handler
 import utils
-from db import database_handler
+from db import database_handler, migration_runner, query_plan_check
+from db.connection_pool import PoolTimeout
 from db.home import home_handler
 from db.level import level_handler, level_models
 from db.level.level_models import CommentData
 from db.user import user_handler
 from factory import object_factory
-from firebase_handler import Firebase
-from db.level.level_data_model import LevelData
+from db.level.level_data_model import validate_level_data
 
 load_dotenv(find_dotenv())
 
 app = Flask(__name__)
 app.config["TEMPLATES_AUTO_RELOAD"] = True
+app.jinja_env.globals.update(
+    game_modules = game_bundle.GAME_MODULES, game_bundle_url = game_bundle.bundle_url,
+    feed_card = feed_cards.render_feed_card
+)
 
 app.secret_key = os.getenv("APP_SECRET")
 object_factory._create_auth_object(app)
 
 app.register_blueprint(auth_router.auth_blueprint)
-firebase_object = Firebase()
+storage = storage_handler.create_storage(app)
 
 with app.app_context():
     database_handler.setup()
+database_handler.init_app(app)
 
 
 @app.route("/")
@@ -44,92 +55,178 @@ def feed():
         res = home_handler.get_homefeed_with_filters(data)
     else:
         res = home_handler.get_homefeed()
-    return render_template("home/home_template.html", res = res)
+    return stream_template("home/home_template.html", res = res, search = None)
 
 
 @app.route("/search", methods = ["POST"])
 def feed_search():
     data = request.get_json()
-    if data:
-        res = home_handler.get_homefeed_with_filters(data)
-    else:
-        res = home_handler.get_homefeed()
-    return render_template("home/search_results.html", res = res)
+    # A cursor means the client is asking for the next page of results it already has on screen
+    cursor = data.pop("cursor", None) if data else None
+    try:
+        if data:
+            res = home_handler.get_homefeed_with_filters(data, cursor)
+        else:
+            res = home_handler.get_homefeed(cursor)
+    except ValueError:
+        # Covers both invalid search data and a tampered cursor
+        abort(400)
+    
+    template = "home/feed_page.html" if cursor else "home/search_results.html"
+    return stream_template(template, res = res, search = data or None)
+
+
+def can_play(level_info) -> bool:
+    return level_info["level_published"] or (
+        "profile" in session and session["profile"]["user_id"] == level_info["user_id"]
+    )
 
 
 @app.route("/game")
 def game():
     debug_enabled = False
     
-    user_id = session.get("profile")
-    if user_id is not None:
-        user_id = user_id.get("user_id")
-    
     level_id = request.args.get("id")
     if level_id is None or not level_id.isdigit():
-        return render_template("game/game.html", level_data_dict = "", difficulty = "", debug = debug_enabled)
+        return render_template("game/game.html", level_payload_url = None, difficulty = "", debug = debug_enabled)
     
-    level_info = level_handler.get_level_info(level_id)
+    # Only what the page needs: the attacks come from the cacheable payload endpoint
+    level_info = level_handler.get_level_payload_info(level_id)
+    if level_info is None or not can_play(level_info):
+        return render_template("game/game.html", level_payload_url = None, difficulty = "", debug = debug_enabled)
     
-    if len(level_info) != 1:
-        return render_template("game/game.html", level_data_dict = "", difficulty = "", debug = debug_enabled)
-    
-    level_info = level_info[0]
-    level_is_public = level_info[6]
-    level_user = level_info[7]
+    return render_template(
+        "game/game.html", level_payload_url = url_for("level_payload", level_id = level_id),
+        difficulty = level_info["level_diff"], debug = debug_enabled
+    )
+
+
+@app.route("/game-bundle/<filename>")
+def game_bundle_file(filename):
+    return game_bundle.send_bundle(filename)
+
+
+@app.route("/level/<int:level_id>/payload")
+def level_payload(level_id):
+    """
+    The level's attacks in the binary level encoding, with the payload hash as a strong ETag. A client that already has
+    the current payload gets a 304 without the payload ever being read from the database
+    """
+    level_info = level_handler.get_level_payload_info(level_id)
+    if level_info is None or not can_play(level_info):
+        abort(404)
     
-    if not level_is_public and level_user != user_id:
-        return render_template("game/game.html", level_data_dict = "", difficulty = "", debug = debug_enabled)
+    payload = None
+    payload_hash = level_info["level_payload_hash"]
+    if payload_hash is None:
+        payload = level_handler.store_level_payload(level_id)
+        if payload is None:
+            abort(404)
+        payload_hash = payload["level_payload_hash"]
     
-    level_data_dict = level_info[4]
-    difficulty = level_info[5]
+    if request.if_none_match.contains(payload_hash):
+        response = app.response_class(status = 304)
+    else:
+        payload = payload or level_handler.get_level_payload(level_id)
+        # The level may have been deleted or saved since its hash was read, so the ETag always comes from the payload
+        # sent
+        if payload is None:
+            abort(404)
+        payload_hash = payload["level_payload_hash"]
+        response = app.response_class(bytes(payload["level_payload"]), mimetype = "application/octet-stream")
     
-    return render_template(
-        "game/game.html", level_data_dict = level_data_dict, difficulty = difficulty, debug = debug_enabled
-    )
+    response.set_etag(payload_hash)
+    # Revalidated on every play, since saving a level changes its payload under the same URL
+    response.cache_control.no_cache = True
+    if level_info["level_published"]:
+        response.cache_control.public = True
+    else:
+        response.cache_control.private = True
+    return response
+
+
+def is_profile_owner(user_info) -> bool:
+    return "profile" in session and session["profile"]["user_id"] == user_info[0]["user_id"]
 
 
 @app.route("/user/<id>")
 def user(id):
     user_info = user_handler.get_user_info(id)
     if user_info:
-        user_levels = user_handler.get_user_levels(user_info[0][0])
-        level_count = len(user_levels)
+        user_levels = user_handler.get_user_levels(
+            user_info[0]["user_id"], include_private = is_profile_owner(user_info)
+        )
         return render_template(
-            "profile/profile_template.html", user_info = user_info, user_levels = user_levels, level_count = level_count
+            "profile/profile_template.html", user_info = user_info, user_levels = user_levels,
+            level_count = user_info[0]["level_count"], review_count = user_info[0]["review_count"],
+            is_owner = is_profile_owner(user_info)
         )
     else:
         abort(404)
 
 
-@app.route("/level/<level_id>")
+@app.route("/user/<id>/levels", methods = ["POST"])
+def user_levels_page(id):
+    user_info = user_handler.get_user_info(id)
+    if not user_info:
+        abort(404)
+    
+    data = request.get_json(silent = True) or {}
+    try:
+        user_levels = user_handler.get_user_levels(
+            user_info[0]["user_id"], include_private = is_profile_owner(user_info), cursor = data.get("cursor")
+        )
+    except ValueError:
+        abort(400)
+    return render_template(
+        "profile/user_levels_page.html", user_info = user_info, user_levels = user_levels,
+        is_owner = is_profile_owner(user_info)
+    )
+
+
+@app.route("/level/<int:level_id>")
 def level(level_id):
-    level_info = level_handler.get_level_info(level_id)
-    level_is_public = level_info[0][6]
+    viewer = session.get("profile")
+    level_page = level_handler.get_level_page(level_id, viewer["user_id"] if viewer else None)
+    if level_page is None:
+        abort(404)
     
-    if not level_is_public:
+    level_info, comment_page = level_page
+    if not level_info["level_published"]:
         abort(404)
     
-    level_comments = level_handler.get_level_comments(level_id)
-    level_commenters = [comment[1] for comment in level_comments]
     return render_template(
-        "level/level_template.html", levelInfo = level_info, levelComments = level_comments,
-        commenters = level_commenters
+        "level/level_template.html", level = level_info, level_id = level_id, comment_page = comment_page
     )
 
 
+@app.route("/level/<int:level_id>/comments", methods = ["POST"])
+def level_comments_page(level_id):
+    # The comments of a level are shown only where the level page itself is
+    level_info = level_handler.get_level_payload_info(level_id)
+    if level_info is None or not level_info["level_published"]:
+        abort(404)
+    
+    data = request.get_json(silent = True) or {}
+    try:
+        comment_page = level_handler.get_level_comments(level_id, data.get("cursor"))
+    except ValueError:
+        abort(400)
+    return render_template("level/comment_page.html", level_id = level_id, comment_page = comment_page)
+
+
 @app.route("/replace-comment", methods = ["POST"])
 @utils.requires_auth
 def replace_comment():
     user_id = session.get("profile")
     if user_id is not None:
         user_id = user_id.get("user_id")
-
+    
     level_id = request.form.get("level")
     level_info = level_handler.get_level_info(level_id)[0]
     
-    level_is_public = level_info[6]
-    level_user = level_info[7]
+    level_is_public = level_info["level_published"]
+    level_user = level_info["user_id"]
     
     comment_data = CommentData(
         **{
@@ -172,13 +269,12 @@ def delete_comment():
         user_id = user_id.get("user_id")
     
     comment_id = request.form.get('commentId')
-    level_id = request.form.get('levelId')
     
     comment_info = level_handler.get_comment_info(comment_id)[0]
     comment_user = comment_info[3]
     
     if user_id is not None and user_id == comment_user:
-        level_handler.delete_comment(comment_id, level_id)
+        level_handler.delete_comment(comment_id)
     return jsonify({"result": "success"})
 
 
@@ -191,7 +287,7 @@ def level_creator():
     session["level_id"] = None
     if level_id is not None:
         level_data = level_handler.get_level_info(level_id)
-        if session["profile"]["user_id"] != level_data[0][7]:
+        if session["profile"]["user_id"] != level_data[0]["user_id"]:
             return redirect(url_for('home'))
         
         session["level_id"] = level_id
@@ -220,12 +316,12 @@ def level_creator():
 def update_level():
     current_level_data = level_handler.get_level_info(session['level_id'])
     
-    if session['profile']['user_id'] != current_level_data[0][7]:
+    if session['profile']['user_id'] != current_level_data[0]["user_id"]:
         return redirect(url_for('home'))
     
     client_level_data = request.get_json()
     try:
-        level_data = LevelData(**client_level_data)
+        level_data = validate_level_data(client_level_data)
     except pydantic.ValidationError as e:
         response = str(e).replace("(type=value_error)", "")
         return jsonify(response = response)
@@ -252,7 +348,7 @@ def update_level():
 def delete_level():
     level_id = request.args.get("id")
     level_data = level_handler.get_level_info(level_id)
-    if session['profile']['user_id'] != level_data[0][7]:
+    if session['profile']['user_id'] != level_data[0]["user_id"]:
         return redirect(url_for('home'))
     
     level_handler.delete_level(level_id)
@@ -264,7 +360,7 @@ def delete_level():
 def add_level():
     client_level_data = request.get_json()
     try:
-        level_data = LevelData(**client_level_data)
+        level_data = validate_level_data(client_level_data)
     except pydantic.ValidationError as e:
         response = str(e).replace("(type=value_error)", "")
         return jsonify(response = response)
@@ -303,7 +399,7 @@ def get_upload_path():
     file_type = request.args.get('fileType')
     if file_type not in {'png', 'jpeg'}:
         abort(403)
-    return firebase_object.get_signed_url(
+    return storage.get_signed_url(
         file_name = f"{session['profile']['user_name']}_pfp.jpeg", file_type = file_type
     )
 
@@ -311,12 +407,64 @@ def get_upload_path():
 @app.route("/upload-completed", methods = ["POST"])
 @utils.requires_auth
 def upload_completed():
-    file_url = firebase_object.get_file_url(file_name = f"{session['profile']['user_name']}_pfp.jpeg")
-    user_handler.update_user_avatar(file_url)
+    file_name = f"{session['profile']['user_name']}_pfp.jpeg"
+    file_url = storage.get_file_url(file_name = file_name)
+    thumbnails = avatar_thumbnails.create_thumbnails(storage, file_name)
+    user_handler.update_user_avatar(file_url, thumbnails)
     session['profile']['user_avatar'] = file_url
     return redirect(url_for("user", id = session['profile']['user_id']))
 
 
+@app.route("/db-pool-stats")
+@utils.requires_auth
+@utils.requires_admin
+def db_pool_stats():
+    # The pools belong to the worker that answers, so this stays a route rather than a CLI command, which would only
+    # see a pool of its own
+    return jsonify(database_handler.get_pool_stats())
+
+
+@app.cli.command("migrate")
+def migrate():
+    """Applies pending schema migrations from db/migrations"""
+    applied = migration_runner.migrate()
+    print(f"Applied {len(applied)} migrations")
+
+
+@app.cli.command("build-game-bundle")
+def build_game_bundle():
+    """Bundles the minified game scripts into one hashed, precompressed file"""
+    manifest = game_bundle.build_bundle()
+    print(f"Built {manifest[game_bundle.BUNDLE_NAME]}")
+
+
+@app.cli.command("check-query-plans")
+def check_query_plans():
+    """Fails if a hot query can't be served without a sequential scan"""
+    regressions = query_plan_check.check_query_plans()
+    for name, tables in regressions.items():
+        print(f"{name} sequentially scans {', '.join(tables)}")
+    if regressions:
+        sys.exit(1)
+    print("Every hot query is served by an index")
+
+
+@app.cli.command("reconcile-ratings")
+def reconcile_ratings():
+    """Fixes level ratings whose running totals drifted from their comments"""
+    corrected = level_handler.reconcile_level_ratings()
+    print(f"Corrected the ratings of {corrected} levels")
+
+
+@app.cli.command("backfill-level-analytics")
+@click.option("--batch-size", default = 200, help = "Levels read and written per transaction")
+@click.option("--processes", default = None, type = int, help = "Simulation worker processes, one per CPU by default")
+def backfill_level_analytics(batch_size, processes):
+    """Simulates the levels saved before their analytics existed or with an older simulator"""
+    updated = level_handler.backfill_level_analytics(batch_size, processes)
+    print(f"Updated the analytics of {updated} levels")
+
+
 @app.errorhandler(404)
 def resource_not_found(e):
     data = {
@@ -344,6 +492,17 @@ def server_error(e):
     return render_template("error/error.html", data = data)
 
 
+@app.errorhandler(PoolTimeout)
+def database_busy(e):
+    data = {
+        "error_code": 503,
+        "error_message": "Server busy! Try again in a moment. "
+    }
+    return render_template("error/error.html", data = data), 503, {
+        "Retry-After": str(database_handler.RETRY_AFTER_SECONDS)
+    }
+
+
 @app.errorhandler(502)
 def bad_gateway(e):
     data = {
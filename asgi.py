@@ -0,0 +1,303 @@
+"""
+ASGI entry point: gunicorn asgi:application -k uvicorn.workers.UvicornWorker
+
+The read only pages (feed, search, level and profile pages) are served by the coroutines below on the server's event
+loop, through async_database_handler. While one of them waits on Postgres the worker keeps serving other requests.
+Each coroutine is the async twin of the Flask view with the same endpoint, and runs inside a regular Flask request
+context, so sessions, url_for, templates and error handlers behave the same on both paths.
+Every other route, including all writes, is handed to the Flask app as WSGI on a pool of WSGI_THREADS threads per
+worker, so those requests run side by side as they would on a threaded WSGI server.
+"""
+
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Tuple
+
+from flask import Flask, abort, render_template, request, session
+from werkzeug.exceptions import HTTPException
+
+import utils
+from app import app, is_profile_owner
+from db import async_database_handler
+from db.home import home_handler
+from db.level import level_handler
+from db.user import user_handler
+
+# Each thread holds one connection of database_handler's pool while its request uses the database
+WSGI_THREADS = int(os.environ.get("WSGI_THREADS", 8))
+
+
+def create_wsgi_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers = WSGI_THREADS, thread_name_prefix = "wsgi")
+
+
+wsgi_executor = utils.ProcessLocal(create_wsgi_executor)
+
+
+async def feed():
+    data = request.data
+    if request.data:
+        res = await home_handler.get_homefeed_with_filters_async(data)
+    else:
+        res = await home_handler.get_homefeed_async()
+    return render_template("home/home_template.html", res = res, search = None)
+
+
+async def feed_search():
+    data = request.get_json()
+    cursor = data.pop("cursor", None) if data else None
+    try:
+        if data:
+            res = await home_handler.get_homefeed_with_filters_async(data, cursor)
+        else:
+            res = await home_handler.get_homefeed_async(cursor)
+    except ValueError:
+        abort(400)
+    
+    template = "home/feed_page.html" if cursor else "home/search_results.html"
+    return render_template(template, res = res, search = data or None)
+
+
+async def user(id):
+    user_info = await user_handler.get_user_info_async(id)
+    if not user_info:
+        abort(404)
+    
+    user_levels = await user_handler.get_user_levels_async(
+        user_info[0]["user_id"], include_private = is_profile_owner(user_info)
+    )
+    return render_template(
+        "profile/profile_template.html", user_info = user_info, user_levels = user_levels,
+        level_count = user_info[0]["level_count"], review_count = user_info[0]["review_count"],
+        is_owner = is_profile_owner(user_info)
+    )
+
+
+async def user_levels_page(id):
+    user_info = await user_handler.get_user_info_async(id)
+    if not user_info:
+        abort(404)
+    
+    data = request.get_json(silent = True) or {}
+    try:
+        user_levels = await user_handler.get_user_levels_async(
+            user_info[0]["user_id"], include_private = is_profile_owner(user_info), cursor = data.get("cursor")
+        )
+    except ValueError:
+        abort(400)
+    return render_template(
+        "profile/user_levels_page.html", user_info = user_info, user_levels = user_levels,
+        is_owner = is_profile_owner(user_info)
+    )
+
+
+async def level(level_id):
+    viewer = session.get("profile")
+    level_page = await level_handler.get_level_page_async(level_id, viewer["user_id"] if viewer else None)
+    if level_page is None:
+        abort(404)
+    
+    level_info, comment_page = level_page
+    if not level_info["level_published"]:
+        abort(404)
+    
+    return render_template(
+        "level/level_template.html", level = level_info, level_id = level_id, comment_page = comment_page
+    )
+
+
+async def level_comments_page(level_id):
+    level_info = await level_handler.get_level_payload_info_async(level_id)
+    if level_info is None or not level_info["level_published"]:
+        abort(404)
+    
+    data = request.get_json(silent = True) or {}
+    try:
+        comment_page = await level_handler.get_level_comments_async(level_id, data.get("cursor"))
+    except ValueError:
+        abort(400)
+    return render_template("level/comment_page.html", level_id = level_id, comment_page = comment_page)
+
+
+# Flask endpoint -> its async twin
+ASYNC_VIEWS = {
+    "feed": feed,
+    "feed_search": feed_search,
+    "user": user,
+    "user_levels_page": user_levels_page,
+    "level": level,
+    "level_comments_page": level_comments_page,
+}
+
+
+class AsyncReadApplication:
+    def __init__(self, flask_app: Flask, views: dict):
+        self.flask_app = flask_app
+        self.views = views
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        
+        if scope["type"] != "http":
+            raise ValueError(f"unsupported ASGI scope type {scope['type']}")
+        
+        script_name, path_info = split_path(scope)
+        adapter = self.flask_app.url_map.bind("", script_name = script_name or None)
+        try:
+            endpoint, view_args = adapter.match(path_info, method = scope["method"])
+        except HTTPException:
+            # Not found, wrong method and redirects are answered by Flask as usual
+            endpoint = None
+        if endpoint in self.views:
+            await self.dispatch(self.views[endpoint], view_args, scope, receive, send)
+        else:
+            await self.run_wsgi(scope, receive, send)
+    
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await async_database_handler.setup()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await async_database_handler.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    
+    async def run_wsgi(self, scope, receive, send):
+        environ = build_environ(scope, await read_body(receive))
+        loop = asyncio.get_running_loop()
+        
+        def send_from_thread(message: dict):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+        
+        await loop.run_in_executor(wsgi_executor.get(), call_wsgi_app, self.flask_app, environ, send_from_thread)
+    
+    async def dispatch(self, view, view_args: dict, scope, receive, send):
+        body = await read_body(receive)
+        environ = build_environ(scope, body)
+        # The same steps as Flask.full_dispatch_request, with the view awaited on this event loop
+        with self.flask_app.request_context(environ):
+            try:
+                rv = self.flask_app.preprocess_request()
+                if rv is None:
+                    rv = await view(**view_args)
+            except Exception as e:
+                try:
+                    rv = self.flask_app.handle_user_exception(e)
+                except Exception as unhandled:
+                    rv = self.flask_app.handle_exception(unhandled)
+            response = self.flask_app.finalize_request(rv)
+            
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": response.status_code,
+                    "headers": [
+                        (name.lower().encode("latin-1"), value.encode("latin-1"))
+                        for name, value in response.headers.to_wsgi_list()
+                    ]
+                }
+            )
+            try:
+                for chunk in response.iter_encoded():
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            finally:
+                response.close()
+            await send({"type": "http.response.body", "body": b""})
+
+
+def split_path(scope) -> Tuple[str, str]:
+    """
+    SCRIPT_NAME and PATH_INFO of an ASGI http request. The path of the scope includes root_path, where the app is
+    mounted, while PATH_INFO is only the part after it
+    """
+    script_name = scope.get("root_path", "")
+    path_info = scope["path"]
+    if script_name and path_info.startswith(script_name):
+        path_info = path_info[len(script_name):]
+    return script_name, path_info
+
+
+def build_environ(scope, body: bytes) -> dict:
+    """The WSGI environ of an ASGI http request, as the Flask app would get it from a WSGI server"""
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    script_name, path_info = split_path(scope)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": script_name.encode().decode("latin-1"),
+        "PATH_INFO": path_info.encode().decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("ascii"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": scope["client"][0] if scope.get("client") else "",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[name] = value
+            continue
+        # Repeated headers are joined the way a WSGI server joins them
+        key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def call_wsgi_app(wsgi_app, environ: dict, send: Callable[[dict], None]):
+    """Runs a WSGI app on the calling thread and passes its response to send as ASGI messages"""
+    response_start = {}
+    started = False
+    
+    def start_response(status: str, headers, exc_info = None):
+        if exc_info is not None and started:
+            raise exc_info[1].with_traceback(exc_info[2])
+        response_start.update(
+            type = "http.response.start",
+            status = int(status.split(" ", 1)[0]),
+            headers = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+        )
+    
+    result = wsgi_app(environ, start_response)
+    try:
+        for chunk in result:
+            if not chunk:
+                continue
+            if not started:
+                started = True
+                send(response_start)
+            send({"type": "http.response.body", "body": chunk, "more_body": True})
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    if not started:
+        send(response_start)
+    send({"type": "http.response.body", "body": b""})
+
+
+async def read_body(receive) -> bytes:
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+    return bytes(body)
+
+
+application = AsyncReadApplication(app, ASYNC_VIEWS)
@@ -9,6 +9,7 @@ from flask import Flask
 from flask import session
 from werkzeug.local import LocalProxy
 
+import oidc_metadata
 import utils
 from db.auth import auth_handler, auth_models
 
@@ -16,27 +17,37 @@ load_dotenv(find_dotenv(utils.get_project_base_path()))
 
 oauth = OAuth()
 
+# The userinfo claims a login keeps in the session until the user picks a user name
+PROFILE_CLAIMS = ("sub", "nickname", "name", "email", "email_verified", "picture")
+
 
 class Auth:
     def __init__(self, app: Flask):
         oauth.init_app(app)
         self.__registered_app = None
+        self.__provider_metadata = oidc_metadata.ProviderMetadata(
+            os.getenv("OIDC_METADATA_URL", f"https://{os.getenv('DOMAIN')}/.well-known/openid-configuration")
+        )
     
     def _get_app(self) -> Optional[LocalProxy]:
+        # The endpoints and signing keys come from the cached discovery document instead of authlib fetching it
+        metadata = self.__provider_metadata.get()
         if self.__registered_app is None:
             self.__registered_app = oauth.register(
                 "auth0",
                 client_id = os.getenv("CLIENT_ID"),
                 client_secret = os.getenv("CLIENT_SECRET"),
                 api_base_url = f"https://{os.getenv('DOMAIN')}",
-                access_token_url = f"https://{os.getenv('DOMAIN')}/oauth/token",
-                authorize_url = f"https://{os.getenv('DOMAIN')}/authorize",
                 client_kwargs = {
                     "scope": "openid profile email",
                 },
-                server_metadata_url = f"https://{os.getenv('DOMAIN')}/.well-known/openid-configuration",
                 fetch_token = self.fetch_token,
+                **metadata
             )
+        elif self.__registered_app.server_metadata.get(oidc_metadata.CACHED_AT_KEY) != metadata[
+            oidc_metadata.CACHED_AT_KEY
+        ]:
+            self.__registered_app.server_metadata.update(metadata)
         return self.__registered_app
     
     @staticmethod
@@ -54,10 +65,12 @@ class Auth:
         :return: The status of auth
         """
         auth0 = self._get_app()
-        auth0.authorize_access_token()
-        resp = auth0.get('userinfo')
-        # Just making sure the resp data is valid
-        user_data = auth_models.UserModel(**resp.json())
+        # Verifies the ID token's signature against the cached keys, and its issuer, audience, expiry and nonce, so the
+        # claims can be trusted without asking the userinfo endpoint
+        token = auth0.authorize_access_token()
+        claims = {claim: token["userinfo"][claim] for claim in PROFILE_CLAIMS if claim in token["userinfo"]}
+        # Just making sure the claims are valid
+        user_data = auth_models.UserModel(**claims)
         # Replacing user_data object because we want to treat users who have logged in from different authentication
         # methods as the same user
         user_data = auth_handler.check_if_user_in_db(user_data.user_id, user_email = user_data.user_email)
@@ -67,7 +80,7 @@ class Auth:
             return True
         else:
             # Storing user sent info temporarily
-            session['temp'] = resp.json()
+            session['temp'] = claims
             return False
     
     def handle_login(self, redirect_uri: str):
@@ -1,4 +1,4 @@
-from flask import Blueprint, redirect, url_for, session, request, render_template
+from flask import Blueprint, redirect, url_for, session, request, render_template, jsonify, abort
 
 import utils
 from db.auth import auth_handler, auth_models
@@ -17,16 +17,16 @@ def set_username():
     username = data["username"]
     if username is None:
         return redirect(url_for("auth.get_set_username_screen"))
-    username = username[:20]
+    username = username[:auth_handler.USERNAME_MAX_LENGTH]
     
-    if auth_handler.check_if_username_exists(username):
+    user_data = auth_models.UserModel(**dict(session["temp"], nickname = username))
+    # The insert is the availability check: the unique index turns away a name that is already taken
+    if not auth_handler.write_userdata_to_db(user_data):
         session["attempted_username"] = username
         return redirect(url_for("auth.get_set_username_screen"))
     
     session.pop("attempted_username", None)
-    session["temp"]["nickname"] = username
-    user_data = auth_models.UserModel(**session.pop("temp"))
-    auth_handler.write_userdata_to_db(user_data)
+    session.pop("temp")
     # Only after user info is set, we allow user to continue
     session["profile"] = user_data.dict()
     return redirect(url_for("feed"))
@@ -40,7 +40,22 @@ def get_set_username_screen():
     
     if "temp" not in session:
         return redirect(url_for("auth.login_user"))
-    return render_template("auth/set_username.html", attempted_username = attempted_username)
+    suggestions = auth_handler.check_username(attempted_username).suggestions if attempted_username else []
+    return render_template(
+        "auth/set_username.html", attempted_username = attempted_username, suggestions = suggestions
+    )
+
+
+@auth_blueprint.route('/user-name/availability', methods = ['GET'])
+def username_availability():
+    """Whether a user name is free, with a few free alternatives when it isn't, for checking as the user types"""
+    username = request.args.get("username", "")[:auth_handler.USERNAME_MAX_LENGTH]
+    if not username:
+        abort(400)
+    username_check = auth_handler.check_username(username)
+    return jsonify(
+        username = username, available = username_check.available, suggestions = username_check.suggestions
+    )
 
 
 @auth_blueprint.route("/callback")
@@ -0,0 +1,121 @@
+"""
+Thumbnails of the uploaded avatars. Pages show avatars as small circles, and a feed page with dozens of them would
+otherwise download every full size picture.
+
+After an upload, the server reads the picture once, decodes it once and scales that one image down to each of
+THUMBNAIL_SIZES, as a square cut from its middle, in every format of THUMBNAIL_FORMATS. Decoding and encoding are CPU
+bound, so they run in a small pool of processes rather than on the thread serving the request. The thumbnails are
+stored next to the avatar through the storage layer, and their URLs end up in user_info.user_avatar_thumbnails:
+{"64": {"webp": "...", "jpeg": "..."}, ...}, keyed by size as a string as JSON keeps it.
+"""
+
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+
+from PIL import Image, ImageOps
+
+import utils
+
+# 64 covers the avatars next to names in feed cards, comments and the navigation bar on high density screens, 256 the
+# profile page
+THUMBNAIL_SIZES = (64, 256)
+
+# Format name: Pillow format and its encoder options. WebP for browsers that show it, JPEG for the rest
+THUMBNAIL_FORMATS = {
+    "webp": ("WEBP", dict(quality = 80, method = 4)),
+    "jpeg": ("JPEG", dict(quality = 85, optimize = True, progressive = True)),
+}
+# What transparent pixels become in a JPEG thumbnail
+JPEG_BACKGROUND = (255, 255, 255)
+
+# Larger pictures are refused before they are decoded, so an upload can't make a worker allocate gigabytes
+MAX_SOURCE_PIXELS = 50_000_000
+WORKER_COUNT = int(os.environ.get("AVATAR_THUMBNAIL_WORKERS", 2))
+# Seconds a request waits for its thumbnails before it records the avatar without them
+RENDER_TIMEOUT = float(os.environ.get("AVATAR_THUMBNAIL_TIMEOUT", 10))
+
+logger = logging.getLogger(__name__)
+
+
+def create_executor() -> ProcessPoolExecutor:
+    # The pool processes are started by a fork server rather than forked from the web worker, which holds database
+    # connections and threads a child must not inherit
+    return ProcessPoolExecutor(max_workers = WORKER_COUNT, mp_context = multiprocessing.get_context("forkserver"))
+
+
+executor = utils.ProcessLocal(create_executor)
+
+
+def render_thumbnails(data: bytes) -> Dict[int, Dict[str, bytes]]:
+    """
+    Runs in a pool process. Raises PIL.UnidentifiedImageError for data that isn't a picture Pillow reads, and
+    PIL.Image.DecompressionBombError for one of more than MAX_SOURCE_PIXELS
+    :return: The encoded thumbnails by size and format name
+    """
+    largest_size = max(THUMBNAIL_SIZES)
+    with Image.open(io.BytesIO(data)) as image:
+        # Opening only read the header
+        if image.width * image.height > MAX_SOURCE_PIXELS:
+            raise Image.DecompressionBombError(f"{image.width}x{image.height} pixels")
+        # A JPEG is decoded at 1/2, 1/4 or 1/8 of its size right away if that still covers the largest thumbnail
+        image.draft("RGB", (largest_size, largest_size))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+    largest = ImageOps.fit(image, (largest_size, largest_size), method = Image.Resampling.LANCZOS)
+    
+    thumbnails = {}
+    for size in THUMBNAIL_SIZES:
+        thumbnail = largest if size == largest_size else largest.resize((size, size), Image.Resampling.LANCZOS)
+        thumbnails[size] = {}
+        for format_name, (pillow_format, options) in THUMBNAIL_FORMATS.items():
+            encoded = thumbnail
+            if pillow_format == "JPEG" and thumbnail.mode == "RGBA":
+                encoded = Image.new("RGB", thumbnail.size, JPEG_BACKGROUND)
+                encoded.paste(thumbnail, mask = thumbnail)
+            output = io.BytesIO()
+            encoded.save(output, pillow_format, **options)
+            thumbnails[size][format_name] = output.getvalue()
+    return thumbnails
+
+
+def get_thumbnail_name(file_name: str, size: int, format_name: str) -> str:
+    return f"{file_name.rsplit('.', 1)[0]}_{size}.{format_name}"
+
+
+def create_thumbnails(storage, file_name: str) -> Optional[Dict[str, Dict[str, str]]]:
+    """
+    Makes and stores the thumbnails of the avatar stored as file_name
+    :param storage: A storage_handler.Storage
+    :return: The thumbnails' URLs by size and format name, or None if the upload isn't a picture that can be used
+    """
+    data = storage.load_file(file_name)
+    try:
+        rendered = executor.get().submit(render_thumbnails, data).result(timeout = RENDER_TIMEOUT)
+    except TimeoutError:
+        # Caught before OSError, which it is a kind of
+        logger.exception(f"no thumbnails of {file_name} within {RENDER_TIMEOUT} seconds")
+        return None
+    except BrokenProcessPool:
+        # A pool process died, which leaves the pool unusable, so the next upload starts a new one
+        logger.exception(f"the thumbnail pool broke while making thumbnails of {file_name}")
+        executor.get().shutdown(wait = False)
+        executor.reset()
+        return None
+    except (OSError, ValueError, Image.DecompressionBombError) as error:
+        logger.warning(f"could not make thumbnails of {file_name}: {error}")
+        return None
+    
+    return {
+        str(size): {
+            format_name: storage.store_file(
+                get_thumbnail_name(file_name, size, format_name), thumbnail, f"image/{format_name}"
+            )
+            for format_name, thumbnail in formats.items()
+        }
+        for size, formats in rendered.items()
+    }
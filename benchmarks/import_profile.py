@@ -0,0 +1,78 @@
+"""
+Reports what importing the app costs a worker: the time to import it, and the modules that take the most of it, from
+Python's -X importtime. Every worker pays this once when it boots, or the master pays it once under gunicorn --preload.
+Importing the app opens no connections, so this needs the environment variables the app reads but no database.
+Run from the project root with: python -m benchmarks.import_profile [--module asgi] [--top 20]
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+from typing import List, NamedTuple
+
+REPEATS = 3
+
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+class ImportTime(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def profile_import(module: str) -> List[ImportTime]:
+    """Imports module in a fresh interpreter, so nothing is cached in sys.modules"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output = True, text = True
+    )
+    if result.returncode != 0:
+        sys.exit(f"importing {module} failed:\n{result.stderr[-2000:]}")
+    
+    import_times = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            import_times.append(ImportTime(name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return import_times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default = "app", help = "the module a worker imports, app or asgi")
+    parser.add_argument("--top", type = int, default = 20)
+    args = parser.parse_args()
+    
+    # The fastest run has the least noise from the disk cache and other processes
+    import_times = min(
+        (profile_import(args.module) for _ in range(REPEATS)),
+        key = lambda times: max(entry.cumulative_us for entry in times)
+    )
+    module_index = next(index for index, entry in enumerate(import_times) if entry.module == args.module)
+    total_us = import_times[module_index].cumulative_us
+    # A module is listed after everything it imports, so the app's own imports are the depth 1 entries right before it
+    subtree_start = module_index
+    while subtree_start > 0 and import_times[subtree_start - 1].depth > 0:
+        subtree_start -= 1
+    subtree = import_times[subtree_start:module_index + 1]
+    direct = [entry for entry in subtree if entry.depth == 1]
+    
+    print(f"import {args.module}: {total_us / 1000:.1f} ms, {len(subtree)} modules")
+    print()
+    print(f"slowest imports of {args.module}, including what they import")
+    print(f"{'module':<50} {'cumulative ms':>14} {'share':>6}")
+    for entry in sorted(direct, key = lambda entry: entry.cumulative_us, reverse = True)[:args.top]:
+        print(f"{entry.module:<50} {entry.cumulative_us / 1000:>14.1f} {entry.cumulative_us / total_us:>6.0%}")
+    
+    print()
+    print(f"slowest single modules, without what they import")
+    print(f"{'module':<50} {'self ms':>14}")
+    for entry in sorted(subtree, key = lambda entry: entry.self_us, reverse = True)[:args.top]:
+        print(f"{entry.module:<50} {entry.self_us / 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Compares the stored JSON level format with the binary level encoding on a maximum size level.
+Run from the project root with: python -m benchmarks.level_codec_benchmark
+"""
+
+import gzip
+import json
+import timeit
+
+from benchmarks.level_fixtures import make_attacks
+from db.level import level_codec
+
+REPEATS = 5
+NUMBER = 200
+
+
+def best_time_in_microseconds(statement) -> float:
+    return min(timeit.repeat(statement, repeat = REPEATS, number = NUMBER)) / NUMBER * 1e6
+
+
+def main():
+    attacks = make_attacks()
+    json_data = json.dumps({"attacks": attacks}).encode()
+    binary_data = level_codec.encode_attacks(attacks)
+    
+    rows = [
+        (
+            "json", len(json_data), len(gzip.compress(json_data)),
+            best_time_in_microseconds(lambda: json.dumps({"attacks": attacks})),
+            best_time_in_microseconds(lambda: json.loads(json_data))
+        ),
+        (
+            f"binary v{level_codec.FORMAT_VERSION}", len(binary_data), len(gzip.compress(binary_data)),
+            best_time_in_microseconds(lambda: level_codec.encode_attacks(attacks)),
+            best_time_in_microseconds(lambda: level_codec.decode_attacks(binary_data))
+        ),
+    ]
+    
+    print(f"{len(attacks)} attacks x {len(attacks[0]['arrows'])} arrows")
+    print(f"{'format':<10} {'bytes':>8} {'gzipped':>8} {'encode us':>10} {'decode us':>10}")
+    for name, size, gzipped_size, encode_time, decode_time in rows:
+        print(f"{name:<10} {size:>8} {gzipped_size:>8} {encode_time:>10.1f} {decode_time:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
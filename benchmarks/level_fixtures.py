@@ -0,0 +1,41 @@
+"""
+Level data shaped like what the level creator sends: numbers typed into inputs arrive as strings, checkboxes as bools
+"""
+
+import random
+from typing import List
+
+MAX_ATTACKS = 40
+MAX_ARROWS = 50
+
+
+def make_attacks(attack_count = MAX_ATTACKS, arrow_count = MAX_ARROWS, seed = 0) -> List[dict]:
+    rng = random.Random(seed)
+    return [
+        {
+            "clockwiseShift": rng.random() < 0.5,
+            "attackDelay": str(rng.randint(0, 2000)),
+            "arrows": [
+                {
+                    "direction": rng.choice("UDLR?"),
+                    "reversed": rng.random() < 0.2,
+                    "delay": str(rng.randint(50, 1000)),
+                    "speed": str(rng.randint(50, 400))
+                }
+                for _ in range(arrow_count)
+            ]
+        }
+        for _ in range(attack_count)
+    ]
+
+
+def make_level(attack_count = MAX_ATTACKS, arrow_count = MAX_ARROWS, seed = 0) -> dict:
+    """A level creator payload for /add-level and /update-level"""
+    rng = random.Random(seed)
+    return {
+        "title": f"Level {seed}",
+        "description": "Spears from every direction, some of them coming back around.",
+        "difficulty": rng.choice(["easy", "medium", "hard"]),
+        "isPublic": True,
+        "attacks": make_attacks(attack_count, arrow_count, seed)
+    }
@@ -0,0 +1,34 @@
+"""
+Compares the CPU time per save of validating a maximum size level through the nested LevelData models and through
+validate_level_data.
+Run from the project root with: python -m benchmarks.level_validation_benchmark
+"""
+
+import time
+import timeit
+
+from benchmarks.level_fixtures import make_level
+from db.level.level_data_model import LevelData, validate_level_data
+
+REPEATS = 5
+NUMBER = 200
+
+
+def best_time_in_microseconds(statement) -> float:
+    return min(timeit.repeat(statement, repeat = REPEATS, number = NUMBER, timer = time.process_time)) / NUMBER * 1e6
+
+
+def main():
+    level = make_level()
+    model_time = best_time_in_microseconds(lambda: LevelData(**level))
+    columnar_time = best_time_in_microseconds(lambda: validate_level_data(level))
+    
+    print(f"{len(level['attacks'])} attacks x {len(level['attacks'][0]['arrows'])} arrows")
+    print(f"{'path':<10} {'cpu us per save':>16}")
+    print(f"{'models':<10} {model_time:>16.1f}")
+    print(f"{'columnar':<10} {columnar_time:>16.1f}")
+    print(f"speedup {model_time / columnar_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
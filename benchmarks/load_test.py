@@ -0,0 +1,338 @@
+"""
+Seeds a benchmark database with synthetic_data, then drives the app's routes from several threads at once and reports
+throughput, latency percentiles and SQL statements per request, by route. Each run is saved as JSON, so runs on two
+commits can be compared with --compare. A run in which any request failed exits with an error and saves nothing.
+
+The requests go through Flask's test client, in this process: the whole app runs, from routing to the rendered page,
+but no HTTP server. The mix of routes and their arguments come from seeded random generators, so every run with the
+same arguments makes the same requests. Logged in requests (adding levels and comments) are made as users the dataset
+keeps free of levels and comments.
+
+The database in LOAD_TEST_DATABASE_URL (or --database-url) is migrated and emptied first, so use one made for this.
+Run from the project root with: python -m benchmarks.load_test [--requests 2000] [--concurrency 8]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from psycopg2.extras import DictCursor
+
+from benchmarks import synthetic_data
+from benchmarks.level_fixtures import make_level
+from benchmarks.synthetic_data import Dataset, DatasetConfig
+from db import migration_runner
+
+RESULTS_PATH = f"{os.path.dirname(os.path.realpath(__file__))}/results"
+
+# Relative frequency of each route in the mix
+ROUTE_WEIGHTS = {
+    "home_feed": 30,
+    "search": 15,
+    "level": 20,
+    "game": 10,
+    "user": 10,
+    "add_level": 5,
+    "replace_comment": 10,
+}
+LOGGED_IN_ROUTES = {"add_level", "replace_comment"}
+
+# The status of a route's response when it works. The app's error handlers answer with error/error.html and a 200, and
+# requires_auth redirects to the login page, so the status alone doesn't show that a request failed
+EXPECTED_STATUS = {route: 200 for route in ROUTE_WEIGHTS}
+EXPECTED_STATUS["replace_comment"] = 302
+ERROR_PAGE_MARKER = b'class="error-page-div"'
+
+PERCENTILES = (50, 95, 99)
+
+
+class Sample(NamedTuple):
+    route: str
+    status: int
+    failed: bool
+    seconds: float
+    sql_statements: int
+
+
+class StatementCounter(threading.local):
+    count = 0
+
+
+statement_counter = StatementCounter()
+
+
+def request_failed(route: str, response, body: bytes) -> bool:
+    if response.status_code != EXPECTED_STATUS[route] or ERROR_PAGE_MARKER in body:
+        return True
+    if route == "replace_comment":
+        # Back to the level page, where requires_auth would have gone to the login page
+        return "/level/" not in (response.location or "")
+    if route == "add_level":
+        # A level that fails validation is answered with the reasons, as a 200 too
+        return (response.get_json(silent = True) or {}).get("response") != "Saved!"
+    return False
+
+
+def count_sql_statements():
+    """
+    Counts the statements each thread executes. Every statement the app runs goes through a DictCursor, and each
+    request runs on the thread that made it, so the count a thread gathers during a request is that request's
+    """
+    execute = DictCursor.execute
+    
+    def counting_execute(self, query, vars = None):
+        statement_counter.count += 1
+        return execute(self, query, vars)
+    
+    DictCursor.execute = counting_execute
+
+
+class Worker:
+    """One simulated visitor, with its own session cookie and its own random sequence of requests"""
+    
+    def __init__(self, flask_app, dataset: Dataset, index: int, seed: int):
+        self.client = flask_app.test_client()
+        self.dataset = dataset
+        self.rng = random.Random(seed * 1000 + index)
+        self.routes = list(ROUTE_WEIGHTS)
+        self.uncommented_level_ids = []
+        
+        if index < len(dataset.reserved_user_ids):
+            with self.client.session_transaction() as session:
+                session["profile"] = dict(
+                    user_id = dataset.reserved_user_ids[index], user_name = dataset.reserved_user_names[index],
+                    user_email = f"{dataset.reserved_user_names[index]}@example.com", user_avatar = None
+                )
+            # Each user may review a level only once
+            self.uncommented_level_ids = self.rng.sample(dataset.published_level_ids, len(dataset.published_level_ids))
+        else:
+            # Without a free user to log in as, this visitor only reads
+            self.routes = [route for route in self.routes if route not in LOGGED_IN_ROUTES]
+        self.weights = [ROUTE_WEIGHTS[route] for route in self.routes]
+    
+    def next_request(self):
+        """The route name and the test client arguments of the next request"""
+        route = self.rng.choices(self.routes, self.weights)[0]
+        if route == "replace_comment" and not self.uncommented_level_ids:
+            route = "level"
+        
+        if route == "home_feed":
+            return route, dict(method = "GET", path = "/home-feed")
+        if route == "search":
+            return route, dict(method = "POST", path = "/search", json = self.make_search())
+        if route == "level":
+            return route, dict(method = "GET", path = f"/level/{self.rng.choice(self.dataset.published_level_ids)}")
+        if route == "game":
+            return route, dict(method = "GET", path = f"/game?id={self.rng.choice(self.dataset.published_level_ids)}")
+        if route == "user":
+            return route, dict(method = "GET", path = f"/user/{self.rng.choice(self.dataset.user_names)}")
+        if route == "add_level":
+            level = make_level(self.rng.randint(1, 40), self.rng.randint(1, 50), seed = self.rng.randrange(10 ** 6))
+            return route, dict(method = "POST", path = "/add-level", json = level)
+        return route, dict(
+            method = "POST", path = "/replace-comment", data = dict(
+                level = self.uncommented_level_ids.pop(), comment = self.rng.choice(synthetic_data.COMMENT_TEXTS),
+                rating = self.rng.randint(1, 5)
+            )
+        )
+    
+    def make_search(self) -> dict:
+        """A search like the sort and filter form sends"""
+        difficulties = ["easy", "medium", "hard"]
+        return {
+            "search": self.rng.choice(["", "", *synthetic_data.TITLE_WORDS]),
+            "filters": {
+                "difficulty": self.rng.sample(difficulties, self.rng.randint(1, len(difficulties))),
+                "rating": self.rng.choice([[0, 5], [3, 5], [0, 0]]),
+                "timespan": self.rng.choice(["alltime", "year", "week"]),
+                "intensity": None,
+                "duration": None
+            },
+            "sorting": self.rng.choice(["time", "rating", "relevance", "intensity", "duration"])
+        }
+    
+    def run(self, request_count: int) -> List[Sample]:
+        samples = []
+        for _ in range(request_count):
+            route, request = self.next_request()
+            statement_counter.count = 0
+            started_at = time.perf_counter()
+            response = self.client.open(**request)
+            # Reading the body runs streamed templates to the end
+            body = response.get_data()
+            seconds = time.perf_counter() - started_at
+            response.close()
+            samples.append(
+                Sample(
+                    route, response.status_code, request_failed(route, response, body), seconds,
+                    statement_counter.count
+                )
+            )
+        return samples
+
+
+def run_load(workers: List[Worker], request_count: int) -> Tuple[List[Sample], float]:
+    """Splits request_count requests over the workers, all running at once"""
+    per_worker = [
+        request_count // len(workers) + (index < request_count % len(workers)) for index in range(len(workers))
+    ]
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers = len(workers)) as executor:
+        results = list(executor.map(Worker.run, workers, per_worker))
+    return [sample for samples in results for sample in samples], time.perf_counter() - started_at
+
+
+def percentile(sorted_values: List[float], percent: float) -> float:
+    """Nearest rank percentile"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(samples: List[Sample], seconds: Optional[float] = None) -> dict:
+    """Latencies and statement counts are those of the requests that worked: a failed one often stops early"""
+    succeeded = [sample for sample in samples if not sample.failed]
+    latencies = sorted(sample.seconds * 1000 for sample in succeeded)
+    summary = {
+        "requests": len(samples),
+        "errors": len(samples) - len(succeeded),
+        "mean_ms": sum(latencies) / len(latencies) if latencies else 0.0,
+        **{f"p{percent}_ms": percentile(latencies, percent) for percent in PERCENTILES},
+        "sql_statements_per_request": (
+            sum(sample.sql_statements for sample in succeeded) / len(succeeded) if succeeded else 0.0
+        ),
+        "max_sql_statements": max((sample.sql_statements for sample in succeeded), default = 0),
+    }
+    if seconds is not None:
+        summary["seconds"] = seconds
+        summary["requests_per_second"] = len(samples) / seconds
+    return summary
+
+
+def get_commit() -> Dict[str, object]:
+    def git(*args) -> str:
+        return subprocess.run(["git", *args], capture_output = True, text = True).stdout.strip()
+    
+    return {
+        "commit": git("rev-parse", "HEAD") or None,
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))
+    }
+
+
+def print_report(result: dict):
+    overall = result["overall"]
+    print(
+        f"{overall['requests']} requests in {overall['seconds']:.1f} s: "
+        f"{overall['requests_per_second']:.1f} requests/s, {overall['errors']} errors"
+    )
+    print(f"{'route':<16} {'requests':>8} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'sql/req':>8}")
+    for route, summary in [*result["routes"].items(), ("all", overall)]:
+        print(
+            f"{route:<16} {summary['requests']:>8} {summary['errors']:>6} {summary['p50_ms']:>8.1f} "
+            f"{summary['p95_ms']:>8.1f} {summary['p99_ms']:>8.1f} {summary['sql_statements_per_request']:>8.2f}"
+        )
+
+
+def print_comparison(baseline: dict, result: dict):
+    """Changes from the baseline run, negative being faster or fewer"""
+    print(f"compared with {baseline['commit'] or 'unknown commit'} ({baseline['created_at']})")
+    print(f"{'route':<16} {'p50':>8} {'p95':>8} {'p99':>8} {'sql/req':>8}")
+    routes = [*result["routes"].items(), ("all", result["overall"])]
+    for route, summary in routes:
+        before = baseline["overall"] if route == "all" else baseline["routes"].get(route)
+        if before is None:
+            continue
+        changes = [
+            f"{(summary[key] - before[key]) / before[key]:>+8.0%}" if before[key] else f"{'n/a':>8}"
+            for key in ("p50_ms", "p95_ms", "p99_ms")
+        ]
+        sql_change = summary["sql_statements_per_request"] - before["sql_statements_per_request"]
+        print(f"{route:<16} {' '.join(changes)} {sql_change:>+8.2f}")
+    throughput_change = result["overall"]["requests_per_second"] / baseline["overall"]["requests_per_second"] - 1
+    print(f"throughput {throughput_change:+.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database-url", default = os.environ.get("LOAD_TEST_DATABASE_URL"))
+    parser.add_argument("--users", type = int, default = DatasetConfig().user_count)
+    parser.add_argument("--levels", type = int, default = DatasetConfig().level_count)
+    parser.add_argument("--comments-per-level", type = int, default = DatasetConfig().comments_per_level)
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--requests", type = int, default = 2000)
+    parser.add_argument("--warmup", type = int, default = 200, help = "requests made before measuring, to fill caches")
+    parser.add_argument("--concurrency", type = int, default = 8)
+    parser.add_argument("--output", help = "where to save the results, by default under benchmarks/results")
+    parser.add_argument("--compare", help = "the results of an earlier run to compare with")
+    args = parser.parse_args()
+    if not args.database_url:
+        sys.exit("Set LOAD_TEST_DATABASE_URL or pass --database-url: the database is emptied and refilled")
+    
+    # Every connection the app opens goes to the benchmark database. Replicas would serve other data, and a local
+    # storage backend needs no Firebase credentials
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["DATABASE_REPLICA_URLS"] = ""
+    os.environ["DB_MIGRATE_ON_STARTUP"] = "false"
+    os.environ.setdefault("STORAGE_BACKEND", "local")
+    os.environ.setdefault("APP_SECRET", "load-test")
+    # Imported once the environment points at the benchmark database
+    from app import app as flask_app
+    
+    migration_runner.migrate(args.database_url)
+    config = DatasetConfig(
+        user_count = args.users, level_count = args.levels, comments_per_level = args.comments_per_level,
+        reserved_user_count = args.concurrency, seed = args.seed
+    )
+    with flask_app.app_context():
+        dataset = synthetic_data.seed(config)
+    
+    count_sql_statements()
+    workers = [Worker(flask_app, dataset, index, args.seed) for index in range(args.concurrency)]
+    if args.warmup:
+        run_load(workers, args.warmup)
+    samples, seconds = run_load(workers, args.requests)
+    
+    result = {
+        **get_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec = "seconds"),
+        "python": platform.python_version(),
+        "dataset": config._asdict(),
+        "load": {"requests": args.requests, "warmup": args.warmup, "concurrency": args.concurrency},
+        "overall": summarize(samples, seconds),
+        "routes": {
+            route: summarize([sample for sample in samples if sample.route == route])
+            for route in ROUTE_WEIGHTS if any(sample.route == route for sample in samples)
+        },
+    }
+    print_report(result)
+    if result["overall"]["errors"]:
+        # Timings of a run with failures aren't comparable with anything, so none are saved
+        statuses = sorted({(sample.route, sample.status) for sample in samples if sample.failed})
+        sys.exit(f"{result['overall']['errors']} requests failed (route, status: {statuses}), results not saved")
+    
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_PATH, exist_ok = True)
+        commit = (result["commit"] or "unknown")[:10]
+        output = f"{RESULTS_PATH}/load_test_{commit}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, "w") as file:
+        json.dump(result, file, indent = 2)
+    print(f"saved to {output}")
+    
+    if args.compare:
+        with open(args.compare) as file:
+            print_comparison(json.load(file), result)
+
+
+if __name__ == "__main__":
+    main()
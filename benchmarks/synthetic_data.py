@@ -0,0 +1,115 @@
+"""
+Fills the database with a synthetic, reproducible dataset: the same arguments always write the same users, levels and
+comments. Levels are shaped like what the level creator sends and pass validate_level_data, and they are written with
+the same derived columns (analytics, binary payload) a save through the app writes, so the pages read real data.
+
+Seeding empties the user, level and comment tables first. Only point it at a database made for benchmarking.
+"""
+
+import json
+import random
+from typing import List, NamedTuple
+
+from benchmarks.level_fixtures import make_level
+from db import database_handler
+from db.level import level_handler
+from db.level.level_data_model import validate_level_data
+
+TITLE_WORDS = ["Spear", "Storm", "Soul", "Arrow", "Rain", "Green", "Shield", "Fury", "Echo", "Spiral", "Undying"]
+COMMENT_TEXTS = [
+    "Great level!", "Way too hard for me", "The reversed arrows got me every time", "Fun but short",
+    "Loved the pattern in the middle", "Needs more variety", "Perfect difficulty curve",
+]
+INSERT_BATCH_SIZE = 500
+
+
+class DatasetConfig(NamedTuple):
+    user_count: int = 200
+    level_count: int = 1000
+    comments_per_level: int = 5
+    # Users with no levels and no comments, left for the load test to comment as
+    reserved_user_count: int = 16
+    seed: int = 0
+
+
+class Dataset(NamedTuple):
+    user_ids: List[str]
+    user_names: List[str]
+    reserved_user_ids: List[str]
+    reserved_user_names: List[str]
+    published_level_ids: List[int]
+
+
+def make_user(index: int) -> dict:
+    return dict(
+        user_id = f"synthetic|{index}", user_name = f"player{index}", user_email = f"player{index}@example.com",
+        user_avatar = None
+    )
+
+
+def make_level_row(rng: random.Random, index: int, user_id: str) -> dict:
+    """The add_level statement's parameters for one level, from a level creator payload"""
+    level = make_level(attack_count = rng.randint(1, 40), arrow_count = rng.randint(1, 50), seed = index)
+    level["title"] = f"{rng.choice(TITLE_WORDS)} {rng.choice(TITLE_WORDS)} {index}"[:20]
+    level["isPublic"] = rng.random() < 0.9
+    level_data = validate_level_data(level)
+    level_description = json.dumps({"attacks": level["attacks"]})
+    return dict(
+        level_name = level_data.title, level_diff = level_data.difficulty, level_summary = level_data.description,
+        level_description = level_description, user_id = user_id, level_published = level_data.is_public,
+        **level_handler.get_saved_level_columns(level_description)
+    )
+
+
+def clear():
+    with database_handler.get_db_cursor(commit = True) as cursor:
+        cursor.execute("TRUNCATE comments, levels, user_stats, user_info RESTART IDENTITY CASCADE")
+
+
+def seed(config: DatasetConfig, log = print) -> Dataset:
+    rng = random.Random(config.seed)
+    clear()
+    
+    users = [make_user(index) for index in range(config.user_count + config.reserved_user_count)]
+    database_handler.execute_statement_batch("auth/insert_user_data", users, page_size = INSERT_BATCH_SIZE)
+    user_ids = [user["user_id"] for user in users[:config.user_count]]
+    reserved_users = users[config.user_count:]
+    log(f"seeded {len(users)} users")
+    
+    level_rows = [make_level_row(rng, index, rng.choice(user_ids)) for index in range(config.level_count)]
+    level_ids = []
+    # One statement per level for the id each one returns, all in one transaction
+    with database_handler.get_db_cursor(commit = True) as cursor:
+        for level_row in level_rows:
+            database_handler.execute_statement(cursor, "level/add_level", level_row)
+            level_ids.append(cursor.fetchone()["level_id"])
+    published_levels = [
+        (level_id, level_row["user_id"]) for level_id, level_row in zip(level_ids, level_rows)
+        if level_row["level_published"]
+    ]
+    log(f"seeded {len(level_ids)} levels, {len(published_levels)} of them published")
+    
+    comments = []
+    for level_id, author_id in published_levels:
+        # The app lets each user review a level once, and never their own
+        reviewers = rng.sample(user_ids, min(config.comments_per_level + 1, len(user_ids)))
+        for user_id in [reviewer for reviewer in reviewers if reviewer != author_id][:config.comments_per_level]:
+            comments.append(
+                dict(
+                    user_id = user_id, level_id = level_id, comment_rating = rng.randint(1, 5),
+                    comment_desc = rng.choice(COMMENT_TEXTS)
+                )
+            )
+    database_handler.execute_statement_batch("level/add_level_comment", comments, page_size = INSERT_BATCH_SIZE)
+    log(f"seeded {len(comments)} comments")
+    
+    with database_handler.get_db_cursor(commit = True) as cursor:
+        cursor.execute("ANALYZE user_info, levels, comments, user_stats")
+    
+    return Dataset(
+        user_ids = user_ids, user_names = [user["user_name"] for user in users[:config.user_count]],
+        reserved_user_ids = [user["user_id"] for user in reserved_users],
+        reserved_user_names = [user["user_name"] for user in reserved_users],
+        published_level_ids = [level_id for level_id, _ in published_levels]
+    )
+
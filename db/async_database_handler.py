@@ -0,0 +1,173 @@
+"""
+The asyncio counterpart of database_handler, for the read only pages served by asgi.py. A request waiting on Postgres
+only holds its coroutine, so one process can keep many page loads in flight on a small pool of connections.
+
+Connections run in autocommit mode, so every query is its own transaction and nothing is written through them; writes
+still go through database_handler. Rows look like database_handler's DictRows, which lets both paths share the
+result caches and the templates.
+Registry statements listed in sql_registry.PREPARED_STATEMENTS are prepared on each connection the first time they
+run there, like the synchronous path does.
+Queries go to the read replicas by the same rules as database_handler's reads, see replica_router.
+"""
+
+import os
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import AsyncIterator, Optional, Tuple
+
+import psycopg
+import psycopg_pool
+from psycopg import AsyncConnection, AsyncCursor
+
+from db import replica_router, sql_registry
+from db.connection_pool import PoolTimeout
+from db.replica_router import Replica, ReplicaSet
+
+pool: Optional[psycopg_pool.AsyncConnectionPool] = None
+replicas = ReplicaSet([])
+
+
+class Row(list):
+    """A row indexed by position or by column name, like psycopg2's DictRow"""
+    
+    __slots__ = ("_index",)
+    
+    def __init__(self, index: dict, values):
+        super().__init__(values)
+        self._index = index
+    
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            key = self._index[key]
+        return super().__getitem__(key)
+    
+    def get(self, key, default = None):
+        try:
+            return self[key]
+        except (KeyError, IndexError):
+            return default
+    
+    def keys(self):
+        return self._index.keys()
+    
+    def items(self):
+        return [(name, self[index]) for name, index in self._index.items()]
+
+
+def row_factory(cursor: AsyncCursor):
+    if cursor.description is None:
+        return tuple
+    return partial(Row, {column.name: index for index, column in enumerate(cursor.description)})
+
+
+def create_pool(dsn: str, min_size: int, timeout: float) -> psycopg_pool.AsyncConnectionPool:
+    return psycopg_pool.AsyncConnectionPool(
+        dsn,
+        min_size = min_size,
+        max_size = int(os.environ.get("ASYNC_DB_POOL_MAX_SIZE", 20)),
+        timeout = timeout,
+        max_idle = float(os.environ.get("DB_POOL_MAX_IDLE", 60)),
+        max_lifetime = float(os.environ.get("DB_POOL_MAX_LIFETIME", 1800)),
+        # Only registry statements are prepared, so one off search queries don't fill the connection's plan cache
+        kwargs = dict(autocommit = True, prepare_threshold = None, row_factory = row_factory),
+        open = False
+    )
+
+
+async def setup():
+    """Opens the pools. Called once per event loop, when the ASGI server starts"""
+    global pool, replicas
+    sql_registry.load()
+    min_size = int(os.environ.get("ASYNC_DB_POOL_MIN_SIZE", 1))
+    pool = create_pool(os.environ.get("DATABASE_URL"), min_size, float(os.environ.get("DB_POOL_TIMEOUT", 5)))
+    replicas = ReplicaSet(
+        [
+            Replica(f"replica_{index}", create_pool(dsn, min_size, float(os.environ.get("DB_REPLICA_TIMEOUT", 1))))
+            for index, dsn in enumerate(replica_router.get_replica_dsns())
+        ]
+    )
+    await pool.open()
+    for replica in replicas.replicas:
+        # Without waiting, so a replica that is down doesn't keep the server from starting
+        await replica.pool.open(wait = False)
+
+
+async def close():
+    for replica in replicas.replicas:
+        await replica.pool.close()
+    await pool.close()
+
+
+def get_pool_stats() -> dict:
+    stats = pool.get_stats()
+    if replicas.replicas:
+        stats["replicas"] = [
+            dict(replica_stats, **replica.pool.get_stats())
+            for replica, replica_stats in zip(replicas.replicas, replicas.stats())
+        ]
+    return stats
+
+
+async def check_replica_lag(connection: AsyncConnection) -> float:
+    async with connection.cursor() as cursor:
+        await cursor.execute(replica_router.LAG_QUERY)
+        return float((await cursor.fetchone())[0])
+
+
+async def checkout_connection(from_primary = False) -> Tuple[AsyncConnection, psycopg_pool.AsyncConnectionPool]:
+    """
+    A connection to the next replica that can serve the request, or to the primary, with the pool it came from.
+    from_primary skips the replicas
+    """
+    if not from_primary and not replica_router.session_recently_wrote():
+        for replica in replicas.candidates():
+            try:
+                connection = await replica.pool.getconn()
+            except psycopg_pool.PoolTimeout:
+                # The async pool keeps retrying a replica that is down until the timeout, so it can't tell a down
+                # replica from a busy one. Either way it sits out until its next check
+                replica.record_failure()
+                continue
+            if replica.needs_check():
+                try:
+                    replica.record_lag(await check_replica_lag(connection))
+                except psycopg.Error:
+                    replica.record_failure()
+                if not replica.usable:
+                    await replica.pool.putconn(connection)
+                    continue
+            return connection, replica.pool
+    
+    try:
+        return await pool.getconn(), pool
+    except psycopg_pool.PoolTimeout as e:
+        # The same exception as the synchronous pool, so both paths answer a busy database with a 503
+        raise PoolTimeout(str(e)) from e
+
+
+@asynccontextmanager
+async def get_db_cursor(from_primary = False) -> AsyncIterator[AsyncCursor]:
+    """Raises connection_pool.PoolTimeout if no connection frees up within DB_POOL_TIMEOUT seconds"""
+    connection, connection_pool = await checkout_connection(from_primary)
+    try:
+        async with connection.cursor() as cursor:
+            yield cursor
+    finally:
+        await connection_pool.putconn(connection)
+
+
+async def execute_statement(cursor: AsyncCursor, statement_name: str, parameters = None, **template_args):
+    statement = sql_registry.get_statement(statement_name)
+    await cursor.execute(statement.render(**template_args), parameters, prepare = statement.is_prepared)
+
+
+async def fetch_statement(statement_name: str, parameters = None, from_primary = False, **template_args) -> list:
+    async with get_db_cursor(from_primary) as cursor:
+        await execute_statement(cursor, statement_name, parameters, **template_args)
+        return await cursor.fetchall()
+
+
+async def fetch_query(query: str, parameters = None, from_primary = False) -> list:
+    async with get_db_cursor(from_primary) as cursor:
+        await cursor.execute(query, parameters)
+        return await cursor.fetchall()
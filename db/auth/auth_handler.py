@@ -1,40 +1,142 @@
 import os
-from typing import Optional
-
-from flask import render_template_string
+import random
+import threading
+import time
+from typing import List, NamedTuple, Optional
 
 from db import database_handler
 from db.auth import auth_models
+from db.auth.bloom_filter import BloomFilter
+
+USERNAME_MAX_LENGTH = 20
+USERNAME_SUGGESTION_COUNT = 3
+# Candidates generated per check. Most are free, the extra ones make up for those the filter or the database rule out
+USERNAME_CANDIDATE_COUNT = 10
+
+USERNAME_FILTER_ERROR_RATE = float(os.environ.get("USERNAME_FILTER_ERROR_RATE", 0.01))
+USERNAME_FILTER_MIN_CAPACITY = 10_000
+# Seconds between rebuilds, which pick up the names other workers registered meanwhile
+USERNAME_FILTER_REBUILD_INTERVAL = float(os.environ.get("USERNAME_FILTER_REBUILD_INTERVAL", 600))
+
+
+class TakenUsernames:
+    """
+    A Bloom filter of every registered user name, so a name it has never seen is known to be free without a query.
+    Each worker builds its own when it first checks a name, and adds the names it registers itself. Names registered
+    through other workers only show up after the next rebuild, so a "free" answer is advisory: registering a user is
+    still checked by the unique index on user_info.user_name
+    """
+    
+    def __init__(self):
+        self.__filter: Optional[BloomFilter] = None
+        self.__next_filter: Optional[BloomFilter] = None
+        self.__built_at = float("-inf")
+        self.__lock = threading.Lock()
+    
+    def build(self):
+        user_count = database_handler.execute_statements("auth/user_name_count", None, get_result = True)[0][0]
+        names = BloomFilter(max(2 * user_count, USERNAME_FILTER_MIN_CAPACITY), USERNAME_FILTER_ERROR_RATE)
+        # Names this worker registers during the build may not be in the rows being read, so they go in both filters
+        self.__next_filter = names
+        try:
+            for row in database_handler.stream_statement("auth/user_names", None):
+                names.add(row["user_name"])
+        finally:
+            self.__next_filter = None
+        self.__filter = names
+        self.__built_at = time.monotonic()
+    
+    def rebuild_if_stale(self):
+        """
+        Starts a build in the background on the first check a process makes, and a rebuild once the filter is
+        USERNAME_FILTER_REBUILD_INTERVAL seconds old
+        """
+        if time.monotonic() - self.__built_at < USERNAME_FILTER_REBUILD_INTERVAL:
+            return
+        if not self.__lock.acquire(blocking = False):
+            return
+        # Counts as fresh while it rebuilds, so only one rebuild starts
+        self.__built_at = time.monotonic()
+        
+        def rebuild():
+            try:
+                self.build()
+            finally:
+                self.__lock.release()
+        
+        threading.Thread(target = rebuild, name = "username-filter-rebuild", daemon = True).start()
+    
+    def add(self, user_name: str):
+        for names in (self.__filter, self.__next_filter):
+            if names is not None:
+                names.add(user_name)
+    
+    def may_contain(self, user_name: str) -> bool:
+        # Until the filter is built every name might be taken, which sends every check to the database
+        return self.__filter is None or user_name in self.__filter
+
+
+taken_usernames = TakenUsernames()
 
-BASE_PATH = f"{os.path.dirname(os.path.realpath(__file__))}/sql"
+
+class UsernameCheck(NamedTuple):
+    available: bool
+    suggestions: List[str]
 
 
 def check_if_user_in_db(user_id, user_email = None) -> Optional[auth_models.UserModel]:
-    with open(f"{BASE_PATH}/get_user_data.sql") as file:
-        query = render_template_string(file.read(), check_email = bool(user_email))
-        with database_handler.get_db_cursor(True) as cur:
-            cur.execute(query, dict(user_id = user_id, user_email = user_email))
-            res = cur.fetchall()
-            # If we are getting more than one match for this, something has gone wrong
-            assert len(res) <= 1
-            if res:
-                user_id, user_name, user_email, user_avatar, creation_time = res[0]
-                return auth_models.UserModel(
-                    sub = user_id, nickname = user_name, email = user_email, picture = user_avatar,
-                    creation_date = creation_time
-                )
-            else:
-                return None
-
-
-def check_if_username_exists(user_name) -> bool:
-    return bool(
-        database_handler.execute_query_from_files(
-            f"{BASE_PATH}/check_if_username_unique.sql", (user_name,),
-            get_result = True
+    # Stays on the primary: a user who just signed up has to be found on their next request
+    with database_handler.get_db_cursor() as cur:
+        database_handler.execute_statement(
+            cur, "auth/get_user_data", dict(user_id = user_id, user_email = user_email), check_email = bool(user_email)
+        )
+        res = cur.fetchall()
+        # If we are getting more than one match for this, something has gone wrong
+        assert len(res) <= 1
+        if res:
+            row = res[0]
+            return auth_models.UserModel(
+                sub = row["user_id"], nickname = row["user_name"], email = row["user_email"],
+                picture = row["user_avatar"], creation_date = row["creation_time"]
+            )
+        else:
+            return None
+
+
+def get_username_candidates(user_name: str) -> List[str]:
+    # Leaves room for a four digit suffix within the length limit
+    base = user_name[:USERNAME_MAX_LENGTH - 4]
+    candidates = [f"{base}{number}" for number in range(1, 4)]
+    candidates += [f"{base}{random.randint(10, 9999)}" for _ in range(USERNAME_CANDIDATE_COUNT - len(candidates))]
+    return list(dict.fromkeys(candidate for candidate in candidates if candidate != user_name))
+
+
+def check_username(user_name: str) -> UsernameCheck:
+    """
+    Whether the name is free, and if it isn't, up to USERNAME_SUGGESTION_COUNT similar names that are.
+    A name the filter has never seen needs no query; otherwise the name and the candidates are looked up in one query
+    """
+    taken_usernames.rebuild_if_stale()
+    if not taken_usernames.may_contain(user_name):
+        return UsernameCheck(True, [])
+    
+    candidates = get_username_candidates(user_name)
+    taken = {
+        row["user_name"] for row in database_handler.execute_statements(
+            "auth/taken_user_names", ([user_name] + candidates,), get_result = True
         )
-    )
+    }
+    if user_name not in taken:
+        return UsernameCheck(True, [])
+    suggestions = [candidate for candidate in candidates if candidate not in taken]
+    return UsernameCheck(False, suggestions[:USERNAME_SUGGESTION_COUNT])
 
 
-def write_userdata_to_db(user_data: auth_models.UserModel):
-    database_handler.execute_query_from_files(f"{BASE_PATH}/insert_user_data.sql", user_data.dict())
+def write_userdata_to_db(user_data: auth_models.UserModel) -> bool:
+    """
+    :return: False, writing nothing, if the user name is already taken
+    """
+    inserted = database_handler.execute_statements("auth/insert_user_data", user_data.dict(), get_result = True)
+    # Taken either way: if the insert lost the race, this worker's filter just hadn't seen the name yet
+    taken_usernames.add(user_data.user_name)
+    return bool(inserted)
@@ -0,0 +1,39 @@
+import hashlib
+import math
+import threading
+from typing import List
+
+
+class BloomFilter:
+    """
+    A set of strings that answers membership with "definitely not in it" or "probably in it", in a fixed amount of
+    memory. At `capacity` items, about `error_rate` of the strings that were never added are reported as probably in
+    it; past capacity that share grows, but nothing that was added is ever reported missing. Items can't be removed
+    """
+    
+    def __init__(self, capacity: int, error_rate: float):
+        # The optimal sizes for a filter holding `capacity` items at the requested false positive rate
+        self.bit_count = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.bit_count / capacity * math.log(2)))
+        self.count = 0
+        
+        self.__bits = bytearray((self.bit_count + 7) // 8)
+        self.__lock = threading.Lock()
+    
+    def __positions(self, item: str) -> List[int]:
+        # Double hashing: the hash_count positions are derived from two halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size = 16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        step = int.from_bytes(digest[8:], "little") | 1
+        return [(first + index * step) % self.bit_count for index in range(self.hash_count)]
+    
+    def add(self, item: str):
+        positions = self.__positions(item)
+        # Setting a bit reads and writes its whole byte, so concurrent adds must not interleave
+        with self.__lock:
+            for position in positions:
+                self.__bits[position >> 3] |= 1 << (position & 7)
+            self.count += 1
+    
+    def __contains__(self, item: str) -> bool:
+        return all(self.__bits[position >> 3] & (1 << (position & 7)) for position in self.__positions(item))
@@ -1,3 +0,0 @@
-SELECT *
-FROM user_info
-WHERE user_name = %s
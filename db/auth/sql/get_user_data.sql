@@ -1,4 +1,8 @@
-SELECT *
+SELECT user_id,
+       user_name,
+       user_email,
+       user_avatar,
+       creation_time
 FROM user_info
 WHERE user_id = %(user_id)s
 {% if check_email %}
@@ -1,2 +1,4 @@
 INSERT INTO user_info (user_id, user_name, user_email, user_avatar)
-VALUES (%(user_id)s, %(user_name)s, %(user_email)s, %(user_avatar)s);
+VALUES (%(user_id)s, %(user_name)s, %(user_email)s, %(user_avatar)s)
+ON CONFLICT (user_name) DO NOTHING
+RETURNING user_id;
@@ -0,0 +1,3 @@
+SELECT user_name
+FROM user_info
+WHERE user_name = ANY (%s)
@@ -0,0 +1,2 @@
+SELECT COUNT(*) AS user_name_count
+FROM user_info
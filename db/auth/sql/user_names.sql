@@ -0,0 +1,2 @@
+SELECT user_name
+FROM user_info
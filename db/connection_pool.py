@@ -0,0 +1,156 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Tuple
+
+import psycopg2
+from psycopg2.extensions import connection as Connection, TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection frees up within the pool's wait budget"""
+
+
+class BoundedConnectionPool:
+    """
+    A thread safe connection pool that blocks for at most `timeout` seconds when every connection is checked out.
+    Idle connections are pinged before reuse once they have sat for `max_idle` seconds, and connections older than
+    `max_lifetime` seconds are closed and replaced, so a restarted database or a dropped socket never reaches a handler
+    """
+    
+    def __init__(
+            self, dsn: str, min_size: int, max_size: int, timeout: float, max_idle: float, max_lifetime: float,
+            connection_factory: Callable = Connection
+    ):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.connection_factory = connection_factory
+        
+        self.__condition = threading.Condition()
+        # Idle connections with the time they were returned. Reused last in first out to keep warm connections warm
+        self.__idle: Deque[Tuple[Connection, float]] = deque()
+        self.__created_at: Dict[int, float] = {}
+        # Connections that are open or being opened, idle or not
+        self.__size = 0
+        
+        self.__checkouts = 0
+        self.__timeouts = 0
+        self.__discarded = 0
+        self.__total_wait = 0.0
+        self.__max_wait = 0.0
+        
+        for _ in range(min_size):
+            self.__size += 1
+            self.__idle.append((self.__connect(), time.monotonic()))
+    
+    def __connect(self) -> Connection:
+        try:
+            connection = psycopg2.connect(self.dsn, connection_factory = self.connection_factory)
+        except Exception:
+            with self.__condition:
+                self.__size -= 1
+                self.__condition.notify()
+            raise
+        self.__created_at[id(connection)] = time.monotonic()
+        return connection
+    
+    def __discard(self, connection: Connection):
+        self.__created_at.pop(id(connection), None)
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+        with self.__condition:
+            self.__size -= 1
+            self.__discarded += 1
+            self.__condition.notify()
+    
+    def __is_healthy(self, connection: Connection, returned_at: float) -> bool:
+        now = time.monotonic()
+        if connection.closed or now - self.__created_at[id(connection)] > self.max_lifetime:
+            return False
+        if now - returned_at < self.max_idle:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+    
+    def getconn(self) -> Connection:
+        started = time.monotonic()
+        deadline = started + self.timeout
+        while True:
+            with self.__condition:
+                while not self.__idle and self.__size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.__timeouts += 1
+                        raise PoolTimeout(f"no database connection became free within {self.timeout} seconds")
+                    self.__condition.wait(remaining)
+                
+                if self.__idle:
+                    connection, returned_at = self.__idle.pop()
+                else:
+                    connection, returned_at = None, None
+                    self.__size += 1
+            
+            # Opening and pinging happen outside the lock so a slow database doesn't stall every other checkout
+            if connection is None:
+                connection = self.__connect()
+            elif not self.__is_healthy(connection, returned_at):
+                self.__discard(connection)
+                continue
+            
+            waited = time.monotonic() - started
+            with self.__condition:
+                self.__checkouts += 1
+                self.__total_wait += waited
+                self.__max_wait = max(self.__max_wait, waited)
+            return connection
+    
+    def putconn(self, connection: Connection):
+        status = connection.info.transaction_status if not connection.closed else TRANSACTION_STATUS_UNKNOWN
+        if status == TRANSACTION_STATUS_UNKNOWN:
+            self.__discard(connection)
+            return
+        if status != TRANSACTION_STATUS_IDLE:
+            try:
+                connection.rollback()
+            except psycopg2.Error:
+                self.__discard(connection)
+                return
+        
+        with self.__condition:
+            self.__idle.append((connection, time.monotonic()))
+            self.__condition.notify()
+    
+    def closeall(self):
+        with self.__condition:
+            idle = list(self.__idle)
+            self.__idle.clear()
+        for connection, _ in idle:
+            self.__discard(connection)
+    
+    def stats(self) -> dict:
+        with self.__condition:
+            idle = len(self.__idle)
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self.__size,
+                "in_use": self.__size - idle,
+                "idle": idle,
+                "checkouts": self.__checkouts,
+                "timeouts": self.__timeouts,
+                "discarded": self.__discarded,
+                "total_wait_seconds": round(self.__total_wait, 6),
+                "average_wait_seconds": round(self.__total_wait / self.__checkouts, 6) if self.__checkouts else 0.0,
+                "max_wait_seconds": round(self.__max_wait, 6),
+            }
@@ -1,64 +1,349 @@
+import itertools
+import logging
 import os
 from contextlib import contextmanager
-from typing import Union, List
+from functools import wraps
+from typing import Callable, Union, List, Iterator, Optional, Tuple
+from uuid import uuid4
 
+import psycopg2
 from dotenv import load_dotenv, find_dotenv
-from flask import current_app
-from psycopg2.extras import DictCursor
-from psycopg2.pool import ThreadedConnectionPool
+from flask import current_app, g, has_request_context, got_request_exception
+from psycopg2.extensions import connection as Connection
+from psycopg2.extras import DictCursor, DictRow, execute_batch
 
 import utils
+from db import sql_registry, migration_runner, replica_router
+from db.connection_pool import BoundedConnectionPool, PoolTimeout
+from db.replica_router import Replica, ReplicaSet
 
-pool = None
+# Rows pulled from a server-side cursor per round trip when streaming results
+STREAM_BATCH_SIZE = 50
+
+# Seconds a client is asked to wait before retrying when the pool is exhausted
+RETRY_AFTER_SECONDS = 2
 
 load_dotenv(find_dotenv(utils.get_project_base_path()))
 
+logger = logging.getLogger(__name__)
+
+
+class PreparingConnection(Connection):
+    """A connection that remembers which registry statements have already been PREPAREd on it"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+
 
 def setup():
-    global pool
-    DATABASE_URL = os.environ.get("DATABASE_URL")
-    current_app.logger.info(f"creating db connection pool")
-    pool = ThreadedConnectionPool(1, 100, dsn = DATABASE_URL)
+    """
+    Prepares what every process shares. The connection pools open nothing here: each process creates its own on first
+    use (see pool and replicas), so a server that imports the app before forking its workers hands them no sockets
+    """
+    if os.environ.get("DB_MIGRATE_ON_STARTUP", "false").lower() == "true":
+        current_app.logger.info(f"applying pending migrations")
+        migration_runner.migrate(os.environ.get("DATABASE_URL"), log = current_app.logger.info, wait = False)
+    current_app.logger.info(f"loading sql statements")
+    sql_registry.load()
+
+
+def create_pool() -> BoundedConnectionPool:
+    logger.info(f"creating db connection pool in process {os.getpid()}")
+    return BoundedConnectionPool(
+        os.environ.get("DATABASE_URL"),
+        min_size = int(os.environ.get("DB_POOL_MIN_SIZE", 1)),
+        max_size = int(os.environ.get("DB_POOL_MAX_SIZE", 100)),
+        timeout = float(os.environ.get("DB_POOL_TIMEOUT", 5)),
+        max_idle = float(os.environ.get("DB_POOL_MAX_IDLE", 60)),
+        max_lifetime = float(os.environ.get("DB_POOL_MAX_LIFETIME", 1800)),
+        connection_factory = PreparingConnection
+    )
+
+
+def create_replicas() -> ReplicaSet:
+    replica_dsns = replica_router.get_replica_dsns()
+    if replica_dsns:
+        logger.info(f"creating connection pools for {len(replica_dsns)} read replicas in process {os.getpid()}")
+    return ReplicaSet(
+        [
+            # No connections are opened up front, so a replica that is down doesn't keep the app from starting
+            Replica(f"replica_{index}", BoundedConnectionPool(
+                dsn,
+                min_size = 0,
+                max_size = int(os.environ.get("DB_POOL_MAX_SIZE", 100)),
+                timeout = float(os.environ.get("DB_REPLICA_TIMEOUT", 1)),
+                max_idle = float(os.environ.get("DB_POOL_MAX_IDLE", 60)),
+                max_lifetime = float(os.environ.get("DB_POOL_MAX_LIFETIME", 1800)),
+                connection_factory = PreparingConnection
+            ))
+            for index, dsn in enumerate(replica_dsns)
+        ]
+    )
+
+
+pool = utils.ProcessLocal(create_pool)
+replicas = utils.ProcessLocal(create_replicas)
+
+
+def get_pool_stats() -> dict:
+    stats = pool.get().stats()
+    replica_set = replicas.get()
+    if replica_set.replicas:
+        stats["replicas"] = [
+            dict(replica_stats, **replica.pool.stats())
+            for replica, replica_stats in zip(replica_set.replicas, replica_set.stats())
+        ]
+    return stats
+
+
+def init_app(app):
+    """Gives each request of the app its own unit of work, see get_db_connection"""
+    app.after_request(commit_request_transaction)
+    app.teardown_appcontext(release_request_connection)
+    
+    # Flask makes an error response out of an exception and runs the after_request functions on it too, so a request
+    # that raised has to be marked before then. Every exception of the view, aborts included, passes through
+    # handle_user_exception. Whatever it doesn't handle, and anything raised after the view, reaches
+    # got_request_exception
+    handle_user_exception = app.handle_user_exception
+    
+    @wraps(handle_user_exception)
+    def handle_failed_request(error):
+        mark_request_failed(app)
+        return handle_user_exception(error)
+    
+    app.handle_user_exception = handle_failed_request
+    got_request_exception.connect(mark_request_failed, app)
+
+
+def mark_request_failed(sender, **extra):
+    g.db_failed = True
 
 
 @contextmanager
-def get_db_connection():
+def checkout_connection():
+    """Raises connection_pool.PoolTimeout if no connection frees up within DB_POOL_TIMEOUT seconds"""
+    connection = pool.get().getconn()
     try:
-        connection = None
-        while connection is None:
-            try:
-                connection = pool.getconn()
-            except:
-                current_app.logger.info("failed to get connection. retrying immediately.")
-        
         yield connection
     finally:
-        if connection is not None:
-            pool.putconn(connection)
+        pool.get().putconn(connection)
+
+
+@contextmanager
+def get_db_connection():
+    """
+    During a request, the request's connection: it is checked out the first time the request needs the database, every
+    statement of the request runs in its one transaction, and that transaction is committed once the response is ready,
+    or rolled back if the request raised (see commit_request_transaction). Anywhere else, such as CLI commands, a
+    connection of its own for the with block.
+    Raises connection_pool.PoolTimeout if no connection frees up within DB_POOL_TIMEOUT seconds
+    """
+    if not has_request_context():
+        with checkout_connection() as connection:
+            yield connection
+        return
+    
+    if "db_connection" not in g:
+        g.db_connection = pool.get().getconn()
+        g.db_after_commit = []
+    yield g.db_connection
+
+
+def after_commit(callback: Callable[[], None]):
+    """
+    Calls callback once the current writes are committed: at the end of the request, or right away outside of one.
+    Caches are invalidated this way, so that no request can reload them from data that isn't committed yet. A request
+    that raised commits nothing and calls none of its callbacks
+    """
+    if has_request_context() and "db_connection" in g:
+        g.db_after_commit.append(callback)
+    else:
+        callback()
+
+
+def commit_request_transaction(response):
+    # Runs before the response is sent, so a failed commit still turns into an error response
+    connection = g.pop("db_connection", None)
+    if connection is None:
+        return response
+    if g.pop("db_failed", False):
+        # The response is an error page and the view may have stopped halfway through its writes. Returning the
+        # connection to the pool rolls them back
+        pool.get().putconn(connection)
+        g.pop("db_wrote", None)
+        g.pop("db_after_commit")
+        return response
+    try:
+        connection.commit()
+    finally:
+        pool.get().putconn(connection)
+    if g.pop("db_wrote", False) and replicas.get().replicas:
+        replica_router.remember_write()
+    for callback in g.pop("db_after_commit"):
+        callback()
+    return response
+
+
+def release_request_connection(error = None):
+    # Only reached with the connection still checked out when the request failed before its response was made;
+    # returning it to the pool rolls the transaction back
+    connection = g.pop("db_connection", None)
+    if connection is not None:
+        pool.get().putconn(connection)
 
 
 @contextmanager
 def get_db_cursor(commit = False) -> DictCursor:
-    """use commit = true to make lasing changes. Call this function in a with statement"""
+    """
+    use commit = true to make lasing changes. Call this function in a with statement.
+    During a request the commit is left to the end of the request
+    """
     with get_db_connection() as connection:
         
         cursor = connection.cursor(cursor_factory = DictCursor)
         try:
             yield cursor
-            if commit:
+            if commit and not has_request_context():
                 connection.commit()
+            elif commit:
+                g.db_wrote = True
         finally:
             cursor.close()
 
 
-def execute_query_from_files(file_paths: Union[str, List[str]], parameters, get_result = False):
-    with get_db_cursor(commit = True) as cursor:
-        if isinstance(file_paths, str):
-            file_paths = [file_paths]
-        for file_path in file_paths:
-            with open(file_path) as file:
-                query = file.read()
-                cursor.execute(query, parameters)
-                if get_result:
-                    res = cursor.fetchall()
+def check_replica_lag(connection) -> float:
+    with connection.cursor() as cursor:
+        cursor.execute(replica_router.LAG_QUERY)
+        return float(cursor.fetchone()[0])
+
+
+def checkout_replica() -> Tuple[Optional[Connection], Optional[Replica]]:
+    """
+    A connection to the next replica that can serve this request's reads, or (None, None) if the reads belong on the
+    primary: outside of requests, where CLI jobs read rows they are about to rewrite, once the request has used the
+    primary, so it reads its own writes, and for a session that wrote recently
+    """
+    if not has_request_context() or "db_connection" in g or replica_router.session_recently_wrote():
+        return None, None
+    
+    for replica in replicas.get().candidates():
+        try:
+            connection = replica.pool.getconn()
+        except PoolTimeout:
+            # Busy rather than down, so it stays in the rotation
+            continue
+        except psycopg2.OperationalError:
+            replica.record_failure()
+            continue
+        
+        # Each read is a transaction of its own, and the connection goes back to the pool without a rollback
+        connection.autocommit = True
+        if replica.needs_check():
+            try:
+                replica.record_lag(check_replica_lag(connection))
+            except psycopg2.Error:
+                replica.record_failure()
+            if not replica.usable:
+                replica.pool.putconn(connection)
+                continue
+        return connection, replica
+    return None, None
+
+
+@contextmanager
+def get_read_connection():
+    """A connection for statements that only read: a read replica's when one can serve them, else get_db_connection"""
+    connection, replica = checkout_replica()
+    if replica is None:
+        with get_db_connection() as connection:
+            yield connection
+        return
+    
+    try:
+        yield connection
+    finally:
+        replica.pool.putconn(connection)
+
+
+@contextmanager
+def get_read_cursor() -> DictCursor:
+    with get_read_connection() as connection:
+        cursor = connection.cursor(cursor_factory = DictCursor)
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+
+def execute_statement(cursor: DictCursor, statement_name: str, parameters = None, **template_args):
+    """
+    Runs a registry statement on the cursor. Prepared statements are PREPAREd on the cursor's connection the first
+    time they run there and EXECUTEd afterwards
+    """
+    statement = sql_registry.get_statement(statement_name)
+    connection = cursor.connection
+    if not statement.is_prepared or not isinstance(connection, PreparingConnection):
+        cursor.execute(statement.render(**template_args), parameters)
+        return
+    
+    if statement_name not in connection.prepared_statements:
+        cursor.execute(statement.prepare_query)
+        connection.prepared_statements.add(statement_name)
+    cursor.execute(statement.execute_query, statement.bind(parameters))
+
+
+def execute_statements(statement_names: Union[str, List[str]], parameters, get_result = False):
+    """Statements that only read run on a read replica when one can serve them (see get_read_connection)"""
+    if isinstance(statement_names, str):
+        statement_names = [statement_names]
+    res = []
+    read_only = all(sql_registry.get_statement(name).is_read_only for name in statement_names)
+    with get_read_cursor() if read_only else get_db_cursor(commit = True) as cursor:
+        for statement_name in statement_names:
+            execute_statement(cursor, statement_name, parameters)
+            if get_result:
+                res = cursor.fetchall()
         return res if get_result else None
+
+
+def execute_statement_batch(statement_name: str, parameter_list: List[dict], page_size = STREAM_BATCH_SIZE):
+    """Runs a write statement once per parameter set, sending page_size of them per round trip, in one transaction"""
+    with get_db_cursor(commit = True) as cursor:
+        execute_batch(cursor, sql_registry.get_query(statement_name), parameter_list, page_size = page_size)
+
+
+def stream_query(query: str, parameters, batch_size = STREAM_BATCH_SIZE) -> Iterator[DictRow]:
+    """
+    Yields the rows of a SELECT as they arrive from a named server-side cursor, batch_size rows per round trip.
+    The connection is returned when the rows run out or the iterator is closed
+    """
+    rows = _stream_rows(query, parameters, batch_size)
+    # Pulling the first row here makes the pool checkout and the query happen before a streamed response starts,
+    # so a pool timeout or a query error still turns into a proper error response
+    first_row = next(rows, None)
+    if first_row is None:
+        return iter(())
+    return itertools.chain((first_row,), rows)
+
+
+def _stream_rows(query: str, parameters, batch_size: int) -> Iterator[DictRow]:
+    # A streamed response outlives its request's unit of work, so the stream holds a connection of its own
+    with checkout_connection() as connection:
+        cursor = connection.cursor(name = f"stream_{uuid4().hex}", cursor_factory = DictCursor)
+        cursor.itersize = batch_size
+        try:
+            cursor.execute(query, parameters)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+
+
+def stream_statement(statement_name: str, parameters, batch_size = STREAM_BATCH_SIZE) -> Iterator[DictRow]:
+    # Server-side cursors can only DECLARE a plain SELECT, so streamed statements always send their text
+    return stream_query(sql_registry.get_query(statement_name), parameters, batch_size)
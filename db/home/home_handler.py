@@ -1,69 +1,204 @@
 import os
+from typing import Optional, Iterable
 
-from db import database_handler
-from db.home.home_models import SearchData
+from db import async_database_handler, database_handler
+from db.home.home_models import SearchData, FeedCursor
+from db.result_cache import ResultCache
 
-BASE_PATH = f"{os.path.dirname(os.path.realpath(__file__))}/sql"
+FEED_PAGE_SIZE = 20
+
+# Feed and search pages only change when a level, a comment or an avatar is written, so they are cached until then.
+# Every session is served from the same entries, so they are loaded from the primary: a lagging replica could refill
+# the cache right after an invalidation with rows from before the write, which would then be served for the whole ttl
+feed_cache = ResultCache(
+    max_entries = int(os.environ.get("FEED_CACHE_MAX_ENTRIES", 512)),
+    ttl = float(os.environ.get("FEED_CACHE_TTL", 30))
+)
+
+SORT_COLUMNS = {
+    "time": "level_created_timestamp",
+    "rating": "level_rating",
+    "relevance": "search_rank",
+    "intensity": "level_arrows_per_second",
+    "duration": "level_duration_ms",
+}
+
+# Sort values that come before every real level, used as the cursor of the first page. This keeps the keyset
+# condition a plain row comparison, which lets one prepared plan serve every page
+FIRST_PAGE_SORT_VALUES = {
+    "time": "infinity",
+    "rating": float("inf"),
+    "relevance": float("inf"),
+    "intensity": float("inf"),
+    "duration": float("inf"),
+}
+MAX_LEVEL_ID = 2 ** 31 - 1
 
 
 def build_query(search_data: SearchData):
+    """
+    Builds the search query. Every value coming from the user is passed as a parameter, only the shape of the query
+    depends on which filters are set
+    """
+    search_terms = search_data.search_terms()
+    if search_terms:
+        # Weighted title/summary/author match, plus how closely the words resemble the text to reward near misses
+        rank = "ts_rank(l.level_search, to_tsquery('english', %(ts_query)s)) " \
+               "+ word_similarity(%(search)s, l.level_search_text)"
+    else:
+        rank = "0"
+    
     query = f"SELECT l.level_id,l.level_name,l.level_rating,l.level_summary," \
-            f"l.level_description,l.level_diff,u.user_id,u.user_name,u.user_avatar " \
+            f"l.level_diff,l.level_created_timestamp,l.level_arrows_per_second,l.level_duration_ms,l.level_version," \
+            f"u.user_id,u.user_name,u.user_avatar,u.user_avatar_thumbnails,u.user_version,{rank} AS search_rank " \
             f"FROM levels AS l,user_info AS u " \
             f"WHERE l.user_id = u.user_id AND l.level_published = TRUE " \
             f"AND (l.level_rating >= %(low_rating)s AND l.level_rating <= %(high_rating)s) "
     
     # Add difficulty params
     if search_data.filters.difficulty:
-        quoted_difficulty_conditions = " or l.level_diff = " \
-            .join(f"'{difficulty}'" for difficulty in search_data.filters.difficulty)
-        query = query + f" and ( l.level_diff = {quoted_difficulty_conditions} )"
+        query = query + " and l.level_diff = ANY(%(difficulty)s::DIFF_T[])"
     
     # Add timespan
     if search_data.filters.timespan:
-        query = query + f" and l.level_created_timestamp >= CURRENT_TIMESTAMP - INTERVAL '{search_data.filters.timespan} days'"
+        query = query + " and l.level_created_timestamp >= CURRENT_TIMESTAMP - %(timespan)s * INTERVAL '1 day'"
     
-    # Add search
-    if search_data.search:
-        search_query = ""
-        for word in search_data.search.split(" "):
-            word.replace(" ", "")
-            if word == "":
-                continue
-            else:
-                if search_query == "":
-                    search_query = " and level_ts @@ to_tsquery('english','" + word + ":*"
-                else:
-                    search_query = search_query + " | " + word + ":* "
-        
-        if search_query != "":
-            search_query = search_query + " ')"
-            query = query + search_query
+    # Add the simulated analytics ranges, stored when the level was saved so no level JSON is parsed here
+    if search_data.filters.intensity:
+        query = query + " and l.level_arrows_per_second BETWEEN %(low_intensity)s AND %(high_intensity)s"
+    if search_data.filters.duration:
+        query = query + " and l.level_duration_ms BETWEEN %(low_duration_ms)s AND %(high_duration_ms)s"
+    
+    # Add search. Both conditions are served by GIN indexes; the trigram one catches typos the stemmer can't match
+    if search_terms:
+        query = query + " and (l.level_search @@ to_tsquery('english', %(ts_query)s)" \
+                        " or %(search)s <%% l.level_search_text)"
+    
+    # Continue after the last level of the previous page. The level id breaks ties so no level is skipped or repeated.
+    # The search rank is computed per row, so the page is cut from the matches in an outer query
+    sort_column = SORT_COLUMNS[search_data.sorting]
+    query = f"SELECT * FROM ({query}) AS matches" \
+            f" where (matches.{sort_column}, matches.level_id) < (%(cursor_value)s, %(cursor_id)s)"
     
     # Add sorting
-    query = query + " order by "
-    if search_data.sorting == "time":
-        query = query + "l.level_created_timestamp desc;"
-    else:
-        query = query + "l.level_rating desc;"
+    query = query + f" order by matches.{sort_column} desc, matches.level_id desc limit %(limit)s;"
     
     return query
 
 
-def get_homefeed():
-    return database_handler.execute_query_from_files(f"{BASE_PATH}/home_feed.sql", [], get_result = True)
+def get_cursor_parameters(cursor: Optional[str], sorting: str) -> dict:
+    feed_cursor = FeedCursor.decode(cursor)
+    return dict(
+        cursor_value = feed_cursor.sort_value if feed_cursor else FIRST_PAGE_SORT_VALUES[sorting],
+        cursor_id = feed_cursor.level_id if feed_cursor else MAX_LEVEL_ID,
+        # Fetching one extra row tells us if there is another page without a COUNT query
+        limit = FEED_PAGE_SIZE + 1
+    )
+
+
+class FeedPage:
+    """
+    One page of feed rows. The rows can be a list or a stream straight from the database; either way the cursor for
+    the next page is only known once the page has been iterated, so templates read next_cursor after their loop.
+    Cached row lists are shared between requests, so a page never modifies its rows
+    """
+    
+    def __init__(self, rows: Iterable, sorting: str):
+        self.__rows = rows
+        self.__sorting = sorting
+        self.count = 0
+        self.next_cursor: Optional[str] = None
+    
+    def __iter__(self):
+        last_row = None
+        for row in self.__rows:
+            # The query fetches one row past the page; seeing it means there is another page
+            if self.count == FEED_PAGE_SIZE:
+                self.next_cursor = make_cursor(last_row, self.__sorting)
+                continue
+            self.count += 1
+            last_row = row
+            yield row
+
+
+def make_cursor(row, sorting) -> str:
+    sort_value = row[SORT_COLUMNS[sorting]]
+    if sorting == "time":
+        sort_value = sort_value.isoformat()
+    return FeedCursor(sort_value = sort_value, level_id = row["level_id"]).encode()
+
 
+def invalidate_feed_cache():
+    database_handler.after_commit(feed_cache.invalidate)
 
-def get_homefeed_with_filters(data):
+
+def load_homefeed(parameters: dict) -> list:
+    with database_handler.get_db_cursor() as cur:
+        database_handler.execute_statement(cur, "home/home_feed", parameters)
+        return cur.fetchall()
+
+
+def get_homefeed(cursor: Optional[str] = None) -> FeedPage:
+    parameters = get_cursor_parameters(cursor, "time")
+    rows = feed_cache.get_or_load(("home", cursor), lambda: load_homefeed(parameters))
+    return FeedPage(rows, "time")
+
+
+async def get_homefeed_async(cursor: Optional[str] = None) -> FeedPage:
+    parameters = get_cursor_parameters(cursor, "time")
+    rows = await feed_cache.get_or_load_async(
+        ("home", cursor),
+        lambda: async_database_handler.fetch_statement("home/home_feed", parameters, from_primary = True)
+    )
+    return FeedPage(rows, "time")
+
+
+def get_search_parameters(search_data: SearchData, cursor: Optional[str]) -> dict:
+    search_terms = search_data.search_terms()
+    intensity = search_data.filters.intensity or (0, 0)
+    duration = search_data.filters.duration or (0, 0)
+    return dict(
+        search = " ".join(search_terms),
+        # Terms only hold word characters, so they can't break the tsquery syntax around them
+        ts_query = " | ".join(f"{term}:*" for term in search_terms),
+        difficulty = sorted(search_data.filters.difficulty),
+        timespan = search_data.filters.timespan,
+        low_rating = search_data.filters.rating[0],
+        high_rating = search_data.filters.rating[1],
+        low_intensity = intensity[0],
+        high_intensity = intensity[1],
+        low_duration_ms = duration[0] * 1000,
+        high_duration_ms = duration[1] * 1000,
+        **get_cursor_parameters(cursor, search_data.sorting)
+    )
+
+
+def search_levels(search_data: SearchData, cursor: Optional[str]):
+    with database_handler.get_db_cursor() as cur:
+        query = build_query(search_data)
+        cur.execute(query, get_search_parameters(search_data, cursor))
+        return cur.fetchall()
+
+
+def get_homefeed_with_filters(data, cursor: Optional[str] = None) -> FeedPage:
     # Apply filters and sort
     search_data = SearchData(**data)
-    with database_handler.get_db_cursor(True) as cur:
-        query = build_query(search_data)
-        cur.execute(
-            query, dict(
-                search = search_data.search, low_rating = search_data.filters.rating[0],
-                high_rating = search_data.filters.rating[1]
-            )
+    # Validating the cursor here keeps a bad one from becoming a cache entry
+    get_cursor_parameters(cursor, search_data.sorting)
+    rows = feed_cache.get_or_load(
+        ("search", search_data.cache_key(), cursor),
+        lambda: search_levels(search_data, cursor)
+    )
+    return FeedPage(rows, search_data.sorting)
+
+
+async def get_homefeed_with_filters_async(data, cursor: Optional[str] = None) -> FeedPage:
+    search_data = SearchData(**data)
+    get_cursor_parameters(cursor, search_data.sorting)
+    rows = await feed_cache.get_or_load_async(
+        ("search", search_data.cache_key(), cursor),
+        lambda: async_database_handler.fetch_query(
+            build_query(search_data), get_search_parameters(search_data, cursor), from_primary = True
         )
-        res = cur.fetchall()
-        return res
+    )
+    return FeedPage(rows, search_data.sorting)
@@ -1,18 +1,28 @@
-from typing import Set, Literal
+import base64
+import json
+import re
+from typing import Set, Literal, Union, Optional, List
 
-from pydantic import BaseModel, validator, conlist, conint, field_validator
+from pydantic import BaseModel, validator, conlist, conint, confloat, field_validator
 
 
 class FilterData(BaseModel):
     difficulty: Set[Literal["easy", "medium", "hard"]] = {}
     rating: conlist(conint(ge = 0, le = 5), min_length = 2, max_length = 2) = [0, 5]
     timespan: Literal["day", "week", "month", "year", "alltime"] = 0
+    # Ranges of the simulated level analytics: arrows per second and length in seconds
+    intensity: Optional[conlist(confloat(ge = 0), min_length = 2, max_length = 2)] = None
+    duration: Optional[conlist(conint(ge = 0), min_length = 2, max_length = 2)] = None
     
     @field_validator("rating")
     def fix_rating_order(cls, value):
         # If rating is out of order, fix it
         return sorted(value)
     
+    @field_validator("intensity", "duration")
+    def fix_range_order(cls, value):
+        return sorted(value) if value is not None else None
+    
     @field_validator("timespan")
     def convert_timespan_value_to_days(cls, value):
         return {
@@ -26,5 +36,41 @@ class FilterData(BaseModel):
 
 class SearchData(BaseModel):
     filters: FilterData
-    sorting: Literal["time", "rating"]
+    sorting: Literal["time", "rating", "relevance", "intensity", "duration"]
     search: str
+    
+    def search_terms(self) -> List[str]:
+        """The lowercased words of the search, in order and without repeats or punctuation"""
+        return list(dict.fromkeys(re.findall(r"\w+", self.search.lower())))
+    
+    def cache_key(self) -> tuple:
+        """Searches that run the same query with the same parameters get the same key"""
+        return (
+            tuple(sorted(self.filters.difficulty)), tuple(self.filters.rating), self.filters.timespan,
+            tuple(self.filters.intensity or ()), tuple(self.filters.duration or ()), self.sorting,
+            tuple(self.search_terms())
+        )
+
+
+class FeedCursor(BaseModel):
+    """
+    Position of the last level shown in a feed page.
+    The sort value is the level's created timestamp or rating, and the level id breaks ties between equal sort values
+    """
+    
+    sort_value: Union[float, str]
+    level_id: conint(gt = 0)
+    
+    def encode(self) -> str:
+        raw = json.dumps([self.sort_value, self.level_id])
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+    
+    @classmethod
+    def decode(cls, cursor: Optional[str]) -> Optional["FeedCursor"]:
+        if not cursor:
+            return None
+        try:
+            sort_value, level_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (ValueError, TypeError) as e:
+            raise ValueError("The feed cursor is not valid") from e
+        return cls(sort_value = sort_value, level_id = level_id)
@@ -2,13 +2,18 @@ SELECT l.level_id,
        l.level_name,
        l.level_rating,
        l.level_summary,
-       l.level_description,
        l.level_diff,
+       l.level_created_timestamp,
+       l.level_version,
        u.user_id,
        u.user_name,
-       u.user_avatar
+       u.user_avatar,
+       u.user_avatar_thumbnails,
+       u.user_version
 FROM levels AS l,
      user_info AS u
 WHERE l.user_id = u.user_id
   AND l.level_published = TRUE
-ORDER BY l.level_created_timestamp DESC;
+  AND (l.level_created_timestamp, l.level_id) < (%(cursor_value)s, %(cursor_id)s)
+ORDER BY l.level_created_timestamp DESC, l.level_id DESC
+LIMIT %(limit)s;
@@ -0,0 +1,92 @@
+"""
+Compact binary encoding of a level's attacks, the "attacks" list of the level JSON.
+
+Layout, little endian:
+    header          magic b"UDA", format version (u8), attack count (u8)
+    for each attack
+        attack header   attack delay (u16), flags (u8, bit 0 = clockwise shift), arrow count (u8)
+        arrows          arrow count fixed width records of
+                            direction and reversed (u8, direction index in bits 0-2, reversed in bit 3),
+                            delay (u16), speed (u16)
+
+LevelData caps attacks at 40 and arrows at 50 per attack, and every value fits its field, so a maximum size level
+takes a little over 10 KB. Decoding gives back the level JSON with numbers as numbers, which is what the creator's
+strings mean once LevelData has validated them.
+The game decodes the same layout with static/game/js/attacks/attack_codec.js; change both together and bump
+FORMAT_VERSION when the layout changes.
+"""
+
+import struct
+from typing import List
+
+MAGIC = b"UDA"
+FORMAT_VERSION = 1
+
+DIRECTIONS = ("U", "D", "L", "R", "?")
+DIRECTION_INDICES = {direction: index for index, direction in enumerate(DIRECTIONS)}
+REVERSED_BIT = 0b1000
+CLOCKWISE_SHIFT_BIT = 0b1
+
+HEADER = struct.Struct("<3sBB")
+ATTACK_HEADER = struct.Struct("<HBB")
+ARROW = struct.Struct("<BHH")
+
+
+def encoded_size(attacks: List[dict]) -> int:
+    return HEADER.size + sum(ATTACK_HEADER.size + ARROW.size * len(attack["arrows"]) for attack in attacks)
+
+
+def encode_attacks(attacks: List[dict]) -> bytes:
+    """
+    Encodes the attacks of a level that passed LevelData validation
+    :param attacks: The "attacks" list of the level JSON, as sent by the level creator
+    """
+    buffer = bytearray(encoded_size(attacks))
+    HEADER.pack_into(buffer, 0, MAGIC, FORMAT_VERSION, len(attacks))
+    offset = HEADER.size
+    for attack in attacks:
+        arrows = attack["arrows"]
+        flags = CLOCKWISE_SHIFT_BIT if attack["clockwiseShift"] else 0
+        ATTACK_HEADER.pack_into(buffer, offset, int(attack["attackDelay"]), flags, len(arrows))
+        offset += ATTACK_HEADER.size
+        for arrow in arrows:
+            packed_direction = DIRECTION_INDICES[arrow["direction"]] | (REVERSED_BIT if arrow["reversed"] else 0)
+            ARROW.pack_into(buffer, offset, packed_direction, int(arrow["delay"]), int(arrow["speed"]))
+            offset += ARROW.size
+    return bytes(buffer)
+
+
+def decode_attacks(data: bytes) -> List[dict]:
+    """
+    :return: The "attacks" list of the level JSON
+    """
+    data = memoryview(data)
+    magic, version, attack_count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("The data is not an encoded level")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported level encoding version {version}")
+    
+    attacks = []
+    offset = HEADER.size
+    for _ in range(attack_count):
+        attack_delay, flags, arrow_count = ATTACK_HEADER.unpack_from(data, offset)
+        offset += ATTACK_HEADER.size
+        end = offset + ARROW.size * arrow_count
+        attacks.append(
+            {
+                "attackDelay": attack_delay,
+                "clockwiseShift": bool(flags & CLOCKWISE_SHIFT_BIT),
+                "arrows": [
+                    {
+                        "direction": DIRECTIONS[packed_direction & ~REVERSED_BIT],
+                        "reversed": bool(packed_direction & REVERSED_BIT),
+                        "delay": delay,
+                        "speed": speed
+                    }
+                    for packed_direction, delay, speed in ARROW.iter_unpack(data[offset:end])
+                ]
+            }
+        )
+        offset = end
+    return attacks
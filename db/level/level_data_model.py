@@ -1,6 +1,8 @@
+from itertools import chain
+from operator import itemgetter
 from typing import Literal
 
-from pydantic import BaseModel, Field, conint, constr, conlist
+from pydantic import BaseModel, Field, ValidationError, conint, constr, conlist, create_model
 
 
 class Arrow(BaseModel):
@@ -34,3 +36,84 @@ class LevelData(BaseModel):
     description: constr(min_length = 3, max_length = 200)
     difficulty: Literal["easy", "medium", "hard"]
     is_public: bool = Field(alias = "isPublic")
+
+
+# LevelData without the attacks, for validate_level_data to check the other fields with
+LevelDetails = create_model(
+    "LevelDetails",
+    **{name: (field.annotation, field) for name, field in LevelData.model_fields.items() if name != "attacks"}
+)
+
+DIRECTIONS = set(Arrow.model_fields["direction"].annotation.__args__)
+MAX_INT_STRING_LENGTH = 4
+
+
+def _int_column_in_range(values: list, minimum: int, maximum: int) -> bool:
+    """
+    True when each value is an int, or a short string of ASCII digits as the level creator sends them, and lies in the
+    range. Those are converted the same way by pydantic. Anything else returns False
+    """
+    types = set(map(type, values))
+    if not types <= {int, str}:
+        return False
+    if str in types:
+        # Levels repeat the same few delays and speeds, so only the distinct strings are checked and converted
+        strings = set(values) if types == {str} else {value for value in values if type(value) is str}
+        digits = "".join(strings)
+        if "" in strings or max(map(len, strings)) > MAX_INT_STRING_LENGTH:
+            return False
+        if not (digits.isascii() and digits.isdigit()):
+            return False
+        values = [value for value in values if type(value) is int] + list(map(int, strings))
+    return minimum <= min(values) and max(values) <= maximum
+
+
+def _attacks_are_valid(attacks) -> bool:
+    """
+    Checks the attacks the way LevelData does, a field at a time across every attack and arrow instead of building an
+    Attack and an Arrow model for each of them.
+    False means the attacks could not be accepted here, not that LevelData would reject them
+    """
+    if type(attacks) is not list or not 1 <= len(attacks) <= 40 or set(map(type, attacks)) != {dict}:
+        return False
+    try:
+        attack_delays = list(map(itemgetter("attackDelay"), attacks))
+        clockwise_shifts = list(map(itemgetter("clockwiseShift"), attacks))
+        arrow_lists = list(map(itemgetter("arrows"), attacks))
+        if set(map(type, arrow_lists)) != {list} or not all(1 <= len(arrows) <= 50 for arrows in arrow_lists):
+            return False
+        
+        arrows = list(chain.from_iterable(arrow_lists))
+        if set(map(type, arrows)) != {dict}:
+            return False
+        directions = list(map(itemgetter("direction"), arrows))
+        reversed_flags = list(map(itemgetter("reversed"), arrows))
+        delays = list(map(itemgetter("delay"), arrows))
+        speeds = list(map(itemgetter("speed"), arrows))
+    except KeyError:
+        return False
+    
+    return (
+        set(map(type, clockwise_shifts + reversed_flags)) == {bool}
+        and set(map(type, directions)) == {str} and set(directions) <= DIRECTIONS
+        and _int_column_in_range(attack_delays, 0, 9999)
+        and _int_column_in_range(delays, 0, 9999)
+        and _int_column_in_range(speeds, 1, 999)
+    )
+
+
+def validate_level_data(data: dict) -> LevelData:
+    """
+    Validates a level creator payload, accepting and rejecting exactly what LevelData(**data) does.
+    The attacks are checked column by column, and any payload that check cannot accept goes through LevelData itself,
+    so the ValidationError raised is always LevelData's own.
+    On that fast path the returned model's attacks are the payload's attack dicts rather than Attack models
+    """
+    if type(data) is dict and _attacks_are_valid(data.get("attacks")):
+        try:
+            details = LevelDetails.model_validate(data)
+        except ValidationError:
+            pass
+        else:
+            return LevelData.model_construct(attacks = data["attacks"], **dict(details))
+    return LevelData(**data)
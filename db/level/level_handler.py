@@ -1,54 +1,260 @@
+import hashlib
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, NamedTuple, Optional
 
-from db import database_handler
-from db.level.level_models import CommentData, LevelData
+from psycopg2.extras import DictCursor, DictRow
 
-BASE_PATH = f"{os.path.dirname(os.path.realpath(__file__))}/sql"
+import feed_cards
+from db import async_database_handler, database_handler
+from db.home import home_handler
+from db.level import level_codec, level_simulator
+from db.level.level_models import CommentCursor, CommentData, LevelData
 
 
 def get_level_info(level_id):
-    return database_handler.execute_query_from_files(f"{BASE_PATH}/level_info.sql", (level_id,), get_result = True)
+    return database_handler.execute_statements("level/level_info", (level_id,), get_result = True)
+
+
+async def get_level_info_async(level_id):
+    return await async_database_handler.fetch_statement("level/level_info", (level_id,))
 
 
 def get_comment_info(comment_id):
-    return database_handler.execute_query_from_files(f"{BASE_PATH}/comment_info.sql", (comment_id,), get_result = True)
+    return database_handler.execute_statements("level/comment_info", (comment_id,), get_result = True)
+
+
+COMMENT_PAGE_SIZE = 20
+MAX_COMMENT_ID = 2 ** 31 - 1
+
+
+class CommentPage(NamedTuple):
+    comments: List[dict]
+    next_cursor: Optional[str]
+
+
+def make_comment_page(rows: list) -> CommentPage:
+    """
+    :param rows: Up to COMMENT_PAGE_SIZE + 1 comments; the extra one only shows that there is another page
+    """
+    comments = rows[:COMMENT_PAGE_SIZE]
+    next_cursor = None
+    if len(rows) > COMMENT_PAGE_SIZE:
+        last_comment = comments[-1]
+        next_cursor = CommentCursor(
+            comment_rating = last_comment["comment_rating"], comment_id = last_comment["comment_id"]
+        ).encode()
+    return CommentPage(comments, next_cursor)
+
+
+def get_level_page(level_id, viewer_id: Optional[str]) -> Optional[tuple]:
+    """
+    Reads the level, whether the viewer already reviewed it and its first page of comments in a single query
+    :return: The level row and its first CommentPage, or None if there is no such level
+    """
+    rows = database_handler.execute_statements(
+        "level/level_page",
+        dict(level_id = level_id, viewer_id = viewer_id, limit = COMMENT_PAGE_SIZE + 1),
+        get_result = True
+    )
+    if not rows:
+        return None
+    return rows[0], make_comment_page(rows[0]["comments"])
+
+
+def get_level_comments_parameters(level_id, cursor: Optional[str]) -> dict:
+    """Raises ValueError for a tampered cursor"""
+    comment_cursor = CommentCursor.decode(cursor)
+    return dict(
+        level_id = level_id,
+        # The first page starts before every real comment, which keeps the keyset condition a row comparison
+        cursor_rating = comment_cursor.comment_rating if comment_cursor else float("inf"),
+        cursor_id = comment_cursor.comment_id if comment_cursor else MAX_COMMENT_ID,
+        limit = COMMENT_PAGE_SIZE + 1
+    )
+
+
+def get_level_comments(level_id, cursor: Optional[str] = None) -> CommentPage:
+    """The page of comments after the cursor. Raises ValueError for a tampered cursor"""
+    rows = database_handler.execute_statements(
+        "level/level_comments", get_level_comments_parameters(level_id, cursor), get_result = True
+    )
+    return make_comment_page(rows)
+
+
+async def get_level_page_async(level_id, viewer_id: Optional[str]) -> Optional[tuple]:
+    rows = await async_database_handler.fetch_statement(
+        "level/level_page", dict(level_id = level_id, viewer_id = viewer_id, limit = COMMENT_PAGE_SIZE + 1)
+    )
+    if not rows:
+        return None
+    return rows[0], make_comment_page(rows[0]["comments"])
+
+
+async def get_level_comments_async(level_id, cursor: Optional[str] = None) -> CommentPage:
+    rows = await async_database_handler.fetch_statement(
+        "level/level_comments", get_level_comments_parameters(level_id, cursor)
+    )
+    return make_comment_page(rows)
 
 
-def get_level_comments(level_id):
-    return database_handler.execute_query_from_files(f"{BASE_PATH}/level_comments.sql", (level_id,), get_result = True)
+# The comment write statements also adjust the level's running rating_sum and rating_count in the same statement,
+# so a rating change costs the same no matter how many reviews the level already has
 
 
 def add_level_comment(comment_data: CommentData):
-    query_file_paths = [f"{BASE_PATH}/add_level_comment.sql", f"{BASE_PATH}/update_level_rating.sql"]
-    database_handler.execute_query_from_files(query_file_paths, comment_data.model_dump())
+    database_handler.execute_statements("level/add_level_comment", comment_data.model_dump())
+    home_handler.invalidate_feed_cache()
+    feed_cards.invalidate_level(comment_data.level_id)
 
 
 def update_level_comment(comment_data: CommentData):
-    query_file_paths = [f"{BASE_PATH}/update_level_comment.sql", f"{BASE_PATH}/update_level_rating.sql"]
-    database_handler.execute_query_from_files(query_file_paths, comment_data.model_dump())
+    database_handler.execute_statements("level/update_level_comment", comment_data.model_dump())
+    home_handler.invalidate_feed_cache()
+    feed_cards.invalidate_level(comment_data.level_id)
+
+
+def delete_comment(comment_id):
+    levels = database_handler.execute_statements(
+        "level/delete_comment", dict(comment_id = comment_id), get_result = True
+    )
+    home_handler.invalidate_feed_cache()
+    for level in levels:
+        feed_cards.invalidate_level(level["level_id"])
+
+
+def reconcile_level_ratings(batch_size = 1000) -> int:
+    """
+    Recomputes every level's rating totals from its comments, one range of level ids per transaction, and fixes the
+    levels whose running totals drifted
+    :return: The number of levels that were corrected
+    """
+    max_level_id = database_handler.execute_statements("level/max_level_id", None, get_result = True)[0][0]
+    corrected = []
+    for first_level_id in range(1, max_level_id + 1, batch_size):
+        corrected += database_handler.execute_statements(
+            "level/reconcile_level_ratings",
+            dict(first_level_id = first_level_id, end_level_id = first_level_id + batch_size),
+            get_result = True
+        )
+    if corrected:
+        home_handler.invalidate_feed_cache()
+        for level in corrected:
+            feed_cards.invalidate_level(level["level_id"])
+    return len(corrected)
+
+
+def get_level_payload_columns(attacks: list) -> dict:
+    level_payload = level_codec.encode_attacks(attacks)
+    return dict(level_payload = level_payload, level_payload_hash = hashlib.sha256(level_payload).hexdigest())
+
+
+def get_saved_level_columns(level_description: str) -> dict:
+    """The columns derived from the level's attacks, written along with it"""
+    attacks = json.loads(level_description)["attacks"]
+    return dict(level_simulator.analyze_level(attacks)._asdict(), **get_level_payload_columns(attacks))
+
+
+def get_level_payload_info(level_id) -> Optional[DictRow]:
+    """The level's difficulty, visibility, owner and payload hash, without reading its attacks"""
+    rows = database_handler.execute_statements("level/level_payload_info", (level_id,), get_result = True)
+    return rows[0] if rows else None
+
+
+async def get_level_payload_info_async(level_id) -> Optional[DictRow]:
+    rows = await async_database_handler.fetch_statement("level/level_payload_info", (level_id,))
+    return rows[0] if rows else None
+
+
+def get_level_payload(level_id) -> Optional[DictRow]:
+    rows = database_handler.execute_statements("level/level_payload", (level_id,), get_result = True)
+    return rows[0] if rows else None
+
+
+def store_level_payload(level_id) -> Optional[dict]:
+    """
+    Encodes and stores the payload of a level saved before payloads existed. This runs while serving a read, so it
+    commits on a connection of its own rather than in the request's transaction: filling in a derived column isn't a
+    write of the visitor's, and shouldn't send their next reads to the primary. A level saved since its attacks were
+    read keeps the payload that save wrote
+    :return: The level_payload and level_payload_hash columns, or None if there is no such level
+    """
+    with database_handler.checkout_connection() as connection:
+        with connection.cursor(cursor_factory = DictCursor) as cursor:
+            # Read from the primary: a lagging replica could hand back attacks older than the ones being replaced
+            database_handler.execute_statement(cursor, "level/level_description", (level_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            columns = get_level_payload_columns(row["level_description"]["attacks"])
+            database_handler.execute_statement(cursor, "level/store_level_payload", dict(columns, level_id = level_id))
+        connection.commit()
+    return columns
+
+
+def analyze_stored_level(level_description: dict) -> level_simulator.LevelAnalytics:
+    # Module level so the backfill's worker processes can pickle it
+    return level_simulator.analyze_level(level_description["attacks"])
 
 
-def delete_comment(comment_id, level_id):
-    with database_handler.get_db_cursor(commit = True) as cursor:
-        with open(f"{BASE_PATH}/delete_comment.sql") as file:
-            query = file.read()
-            cursor.execute(query, (comment_id,))
-        with open(f"{BASE_PATH}/update_level_rating.sql") as file:
-            query = file.read()
-            cursor.execute(query, dict(level_id = level_id))
+def backfill_level_analytics(batch_size = 200, processes: Optional[int] = None) -> int:
+    """
+    Simulates the levels whose analytics are missing or were computed by an older simulator version, one range of
+    level ids at a time. The simulations of a range are spread over a pool of worker processes
+    :param processes: Number of worker processes, one per CPU by default
+    :return: The number of levels that were updated
+    """
+    processes = processes or os.cpu_count() or 1
+    max_level_id = database_handler.execute_statements("level/max_level_id", None, get_result = True)[0][0]
+    updated = 0
+    with ProcessPoolExecutor(processes) as executor:
+        for first_level_id in range(1, max_level_id + 1, batch_size):
+            levels = database_handler.execute_statements(
+                "level/stale_level_analytics",
+                dict(
+                    first_level_id = first_level_id, end_level_id = first_level_id + batch_size,
+                    analytics_version = level_simulator.ANALYTICS_VERSION
+                ),
+                get_result = True
+            )
+            if not levels:
+                continue
+            analytics = executor.map(
+                analyze_stored_level, [level["level_description"] for level in levels],
+                chunksize = max(1, len(levels) // (4 * processes))
+            )
+            database_handler.execute_statement_batch(
+                "level/update_level_analytics",
+                [dict(level_analytics._asdict(), level_id = level["level_id"]) for level, level_analytics in
+                 zip(levels, analytics)]
+            )
+            updated += len(levels)
+    if updated:
+        home_handler.invalidate_feed_cache()
+    return updated
 
 
 def update_level(level_data: LevelData):
-    database_handler.execute_query_from_files(f"{BASE_PATH}/update_level.sql", level_data.model_dump())
+    database_handler.execute_statements(
+        "level/update_level",
+        dict(level_data.model_dump(), **get_saved_level_columns(level_data.level_description))
+    )
+    home_handler.invalidate_feed_cache()
+    feed_cards.invalidate_level(level_data.level_id)
 
 
 def delete_level(level_id):
-    database_handler.execute_query_from_files(f"{BASE_PATH}/delete_level.sql", (level_id,))
+    database_handler.execute_statements("level/delete_level", (level_id,))
+    home_handler.invalidate_feed_cache()
+    feed_cards.invalidate_level(level_id)
 
 
 def add_level(level_data: LevelData):
-    return database_handler.execute_query_from_files(
-        f"{BASE_PATH}/add_level.sql",
-        level_data.model_dump(),
+    level = database_handler.execute_statements(
+        "level/add_level",
+        dict(level_data.model_dump(), **get_saved_level_columns(level_data.level_description)),
         get_result = True
     )[0]
+    home_handler.invalidate_feed_cache()
+    return level
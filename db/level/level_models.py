@@ -1,5 +1,6 @@
+import base64
 import json
-from typing import Literal
+from typing import Literal, Optional
 
 from flask import session
 from pydantic import BaseModel, Field, conint, confloat, constr, field_validator
@@ -46,3 +47,27 @@ class CommentData(CommentBase):
         if "profile" in session:
             return session["profile"]["user_id"]
         raise ValueError("The user cannot add a comment without logging in")
+
+
+class CommentCursor(BaseModel):
+    """
+    Position of the last comment shown on a level page.
+    Comments are listed best rated first, and the comment id breaks ties between equal ratings
+    """
+    
+    comment_rating: float
+    comment_id: conint(gt = 0)
+    
+    def encode(self) -> str:
+        raw = json.dumps([self.comment_rating, self.comment_id])
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+    
+    @classmethod
+    def decode(cls, cursor: Optional[str]) -> Optional["CommentCursor"]:
+        if not cursor:
+            return None
+        try:
+            comment_rating, comment_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (ValueError, TypeError) as e:
+            raise ValueError("The comment cursor is not valid") from e
+        return cls(comment_rating = comment_rating, comment_id = comment_id)
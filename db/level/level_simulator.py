@@ -0,0 +1,91 @@
+"""
+Replays a level's attacks the way the game's AttackRunner schedules them, without rendering anything, and measures the
+resulting timeline.
+
+Each arrow reaches the shield at its attack's start plus the running sum of the arrow delays before it. An attack
+starts once the previous attack's last arrow delay and its attackDelay have passed, and its arrows are put on the
+stage when the previous attack starts. An arrow flies in from ON_SCREEN_DISTANCE at its speed, so it is on screen from
+the later of (hit time - flight time) and the time its attack was staged, until it reaches the shield.
+Times are in milliseconds from the start of the first attack; the game's fixed lead-in before it is left out.
+clockwiseShift only rotates an attack's directions at random when it is staged, so it does not move anything on the
+timeline.
+"""
+
+from typing import List, NamedTuple
+
+import numpy as np
+
+# Bump when the simulation or the analytics change, so the backfill recomputes levels analyzed by an older version
+ANALYTICS_VERSION = 1
+
+# Pixels from the shield to the nearest screen edge (half the 480px game height minus the 32px shield distance)
+ON_SCREEN_DISTANCE = 240 - 32
+
+
+class LevelAnalytics(NamedTuple):
+    level_duration_ms: int
+    level_arrow_count: int
+    level_arrows_per_second: float
+    level_peak_arrows: int
+    level_reversal_density: float
+    level_analytics_version: int = ANALYTICS_VERSION
+
+
+class Timeline(NamedTuple):
+    appear_times: np.ndarray
+    hit_times: np.ndarray
+    reversed: np.ndarray
+
+
+def simulate(attacks: List[dict]) -> Timeline:
+    """
+    :param attacks: The "attacks" list of a level that passed validation. Numbers may still be strings
+    """
+    arrows = [arrow for attack in attacks for arrow in attack["arrows"]]
+    arrow_counts = np.array([len(attack["arrows"]) for attack in attacks])
+    attack_delays = np.array([int(attack["attackDelay"]) for attack in attacks])
+    delays = np.array([int(arrow["delay"]) for arrow in arrows])
+    speeds = np.array([int(arrow["speed"]) for arrow in arrows])
+    reversed_arrows = np.array([bool(arrow["reversed"]) for arrow in arrows])
+    
+    attack_of_arrow = np.repeat(np.arange(len(attacks)), arrow_counts)
+    first_arrows = np.concatenate(([0], np.cumsum(arrow_counts)[:-1]))
+    last_arrows = first_arrows + arrow_counts - 1
+    
+    # Running sum of the delays within each attack: the level wide running sum minus what came before the attack
+    running_delays = np.cumsum(delays)
+    before_attack = running_delays[first_arrows] - delays[first_arrows]
+    arrow_offsets = running_delays - before_attack[attack_of_arrow]
+    
+    attack_lengths = attack_delays + arrow_offsets[last_arrows]
+    attack_starts = np.concatenate(([0], np.cumsum(attack_lengths)[:-1]))
+    attack_staged = np.concatenate(([0], attack_starts[:-1]))
+    
+    hit_times = attack_starts[attack_of_arrow] + arrow_offsets
+    flight_times = ON_SCREEN_DISTANCE * 1000 / speeds
+    appear_times = np.maximum(hit_times - flight_times, attack_staged[attack_of_arrow])
+    return Timeline(appear_times, hit_times, reversed_arrows)
+
+
+def peak_concurrent_arrows(timeline: Timeline) -> int:
+    times = np.concatenate((timeline.appear_times, timeline.hit_times))
+    changes = np.concatenate((np.ones(len(timeline.hit_times), int), -np.ones(len(timeline.hit_times), int)))
+    # At equal times arrows leave before new ones count, so an arrow blocked as the next appears is not an overlap
+    order = np.lexsort((changes, times))
+    return int(np.cumsum(changes[order]).max())
+
+
+def analyze_level(attacks: List[dict]) -> LevelAnalytics:
+    if not any(attack["arrows"] for attack in attacks):
+        return LevelAnalytics(0, 0, 0.0, 0, 0.0)
+    timeline = simulate(attacks)
+    arrow_count = len(timeline.hit_times)
+    duration = int(timeline.hit_times.max())
+    return LevelAnalytics(
+        level_duration_ms = duration,
+        level_arrow_count = arrow_count,
+        # A level whose arrows all land at once still gets a finite rate
+        level_arrows_per_second = arrow_count * 1000 / max(duration, 1),
+        level_peak_arrows = peak_concurrent_arrows(timeline),
+        level_reversal_density = float(timeline.reversed.mean())
+    )
@@ -1,3 +1,7 @@
-INSERT INTO levels(level_name, level_diff, level_summary, level_description, user_id, level_published)
-VALUES (%(level_name)s, %(level_diff)s, %(level_summary)s, %(level_description)s, %(user_id)s, %(level_published)s)
+INSERT INTO levels(level_name, level_diff, level_summary, level_description, user_id, level_published,
+                   level_duration_ms, level_arrow_count, level_arrows_per_second, level_peak_arrows,
+                   level_reversal_density, level_analytics_version, level_payload, level_payload_hash)
+VALUES (%(level_name)s, %(level_diff)s, %(level_summary)s, %(level_description)s, %(user_id)s, %(level_published)s,
+        %(level_duration_ms)s, %(level_arrow_count)s, %(level_arrows_per_second)s, %(level_peak_arrows)s,
+        %(level_reversal_density)s, %(level_analytics_version)s, %(level_payload)s, %(level_payload_hash)s)
 RETURNING level_id;
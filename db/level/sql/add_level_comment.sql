@@ -1,3 +1,12 @@
-INSERT INTO comments(user_id, level_id, comment_rating, comment_desc)
-VALUES (%(user_id)s, %(level_id)s, %(comment_rating)s, %(comment_desc)s)
-RETURNING comment_id;
+WITH new_comment AS (
+    INSERT INTO comments (user_id, level_id, comment_rating, comment_desc)
+        VALUES (%(user_id)s, %(level_id)s, %(comment_rating)s, %(comment_desc)s)
+        RETURNING comment_id, level_id, comment_rating
+)
+UPDATE levels AS l
+SET rating_sum=l.rating_sum + c.comment_rating,
+    rating_count=l.rating_count + 1,
+    level_rating=ROUND(CAST((l.rating_sum + c.comment_rating) / (l.rating_count + 1) AS NUMERIC), 2)
+FROM new_comment AS c
+WHERE l.level_id = c.level_id
+RETURNING c.comment_id;
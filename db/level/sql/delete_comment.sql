@@ -1,3 +1,15 @@
-DELETE
-FROM comments
-WHERE comment_id = %s;
+WITH deleted_comment AS (
+    DELETE
+        FROM comments
+            WHERE comment_id = %(comment_id)s
+            RETURNING level_id, comment_rating
+)
+UPDATE levels AS l
+SET rating_sum=l.rating_sum - c.comment_rating,
+    rating_count=l.rating_count - 1,
+    level_rating=COALESCE(
+            ROUND(CAST((l.rating_sum - c.comment_rating) / NULLIF(l.rating_count - 1, 0) AS NUMERIC), 2), 0
+        )
+FROM deleted_comment AS c
+WHERE l.level_id = c.level_id
+RETURNING l.level_id;
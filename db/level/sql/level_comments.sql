@@ -1,13 +1,14 @@
-SELECT u.user_id,
-       u.user_name,
-       c.comment_id,
+SELECT c.comment_id,
        c.comment_rating,
        c.comment_desc,
-       u.user_avatar
-FROM levels AS l,
-     comments AS c,
+       u.user_id,
+       u.user_name,
+       u.user_avatar,
+       u.user_avatar_thumbnails
+FROM comments AS c,
      user_info AS u
-WHERE c.level_id = l.level_id
-  AND l.level_id = %s
-  AND c.user_id = u.user_id
-ORDER BY c.comment_rating DESC;
+WHERE c.user_id = u.user_id
+  AND c.level_id = %(level_id)s
+  AND (c.comment_rating, c.comment_id) < (%(cursor_rating)s, %(cursor_id)s)
+ORDER BY c.comment_rating DESC, c.comment_id DESC
+LIMIT %(limit)s;
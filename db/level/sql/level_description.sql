@@ -0,0 +1,3 @@
+SELECT l.level_description
+FROM levels AS l
+WHERE l.level_id = %s;
@@ -0,0 +1,38 @@
+SELECT l.level_id,
+       l.level_name,
+       l.level_rating,
+       l.level_summary,
+       l.level_diff,
+       l.level_published,
+       u.user_id,
+       u.user_name,
+       u.user_avatar,
+       u.user_avatar_thumbnails,
+       EXISTS(
+               SELECT
+               FROM comments AS vc
+               WHERE vc.level_id = l.level_id
+                 AND vc.user_id = %(viewer_id)s
+           ) AS viewer_has_reviewed,
+       (
+           SELECT COALESCE(JSON_AGG(page ORDER BY page.comment_rating DESC, page.comment_id DESC), '[]')
+           FROM (
+                    SELECT c.comment_id,
+                           c.comment_rating,
+                           c.comment_desc,
+                           cu.user_id,
+                           cu.user_name,
+                           cu.user_avatar,
+                           cu.user_avatar_thumbnails
+                    FROM comments AS c,
+                         user_info AS cu
+                    WHERE c.user_id = cu.user_id
+                      AND c.level_id = l.level_id
+                    ORDER BY c.comment_rating DESC, c.comment_id DESC
+                    LIMIT %(limit)s
+                ) AS page
+       ) AS comments
+FROM levels AS l,
+     user_info AS u
+WHERE l.user_id = u.user_id
+  AND l.level_id = %(level_id)s;
@@ -0,0 +1,4 @@
+SELECT l.level_payload,
+       l.level_payload_hash
+FROM levels AS l
+WHERE l.level_id = %s;
@@ -0,0 +1,7 @@
+SELECT l.level_id,
+       l.level_diff,
+       l.level_published,
+       l.user_id,
+       l.level_payload_hash
+FROM levels AS l
+WHERE l.level_id = %s;
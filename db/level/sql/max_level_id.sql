@@ -0,0 +1,2 @@
+SELECT COALESCE(MAX(level_id), 0) AS max_level_id
+FROM levels;
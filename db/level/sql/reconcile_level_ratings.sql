@@ -0,0 +1,17 @@
+UPDATE levels AS l
+SET rating_sum=totals.rating_sum,
+    rating_count=totals.rating_count,
+    level_rating=COALESCE(ROUND(CAST(totals.rating_sum / NULLIF(totals.rating_count, 0) AS NUMERIC), 2), 0)
+FROM (
+         SELECT lv.level_id,
+                COALESCE(SUM(c.comment_rating), 0) AS rating_sum,
+                COUNT(c.comment_id)                AS rating_count
+         FROM levels AS lv
+                  LEFT JOIN comments AS c ON c.level_id = lv.level_id
+         WHERE lv.level_id >= %(first_level_id)s
+           AND lv.level_id < %(end_level_id)s
+         GROUP BY lv.level_id
+     ) AS totals
+WHERE l.level_id = totals.level_id
+  AND (l.rating_count <> totals.rating_count OR ABS(l.rating_sum - totals.rating_sum) > 1e-6)
+RETURNING l.level_id;
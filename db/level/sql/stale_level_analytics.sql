@@ -0,0 +1,5 @@
+SELECT level_id, level_description
+FROM levels
+WHERE level_id >= %(first_level_id)s
+  AND level_id < %(end_level_id)s
+  AND level_analytics_version < %(analytics_version)s;
@@ -0,0 +1,5 @@
+UPDATE levels
+SET level_payload=%(level_payload)s,
+    level_payload_hash=%(level_payload_hash)s
+WHERE level_id = %(level_id)s
+  AND level_payload_hash IS NULL;
@@ -1,8 +1,15 @@
 UPDATE levels
 SET level_name=%(level_name)s,
-    level_rating=%(level_rating)s,
     level_summary=%(level_summary)s,
     level_description=%(level_description)s,
     level_diff=%(level_diff)s,
-    level_published= %(level_published)s
+    level_published= %(level_published)s,
+    level_duration_ms=%(level_duration_ms)s,
+    level_arrow_count=%(level_arrow_count)s,
+    level_arrows_per_second=%(level_arrows_per_second)s,
+    level_peak_arrows=%(level_peak_arrows)s,
+    level_reversal_density=%(level_reversal_density)s,
+    level_analytics_version=%(level_analytics_version)s,
+    level_payload=%(level_payload)s,
+    level_payload_hash=%(level_payload_hash)s
 WHERE level_id = %(level_id)s;
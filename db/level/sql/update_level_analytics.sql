@@ -0,0 +1,8 @@
+UPDATE levels
+SET level_duration_ms=%(level_duration_ms)s,
+    level_arrow_count=%(level_arrow_count)s,
+    level_arrows_per_second=%(level_arrows_per_second)s,
+    level_peak_arrows=%(level_peak_arrows)s,
+    level_reversal_density=%(level_reversal_density)s,
+    level_analytics_version=%(level_analytics_version)s
+WHERE level_id = %(level_id)s;
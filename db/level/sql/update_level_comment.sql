@@ -1,4 +1,19 @@
-UPDATE comments
-SET comment_desc=%(comment_desc)s,
-    comment_rating=%(comment_rating)s
-WHERE comment_id =%(comment_id)s;
+WITH old_comment AS (
+    SELECT comment_id, comment_rating
+    FROM comments
+    WHERE comment_id = %(comment_id)s
+        FOR UPDATE
+),
+     updated_comment AS (
+         UPDATE comments AS c
+             SET comment_desc=%(comment_desc)s,
+                 comment_rating=%(comment_rating)s
+             FROM old_comment AS o
+             WHERE c.comment_id = o.comment_id
+             RETURNING c.level_id, o.comment_rating AS old_rating, c.comment_rating AS new_rating
+     )
+UPDATE levels AS l
+SET rating_sum=l.rating_sum - c.old_rating + c.new_rating,
+    level_rating=ROUND(CAST((l.rating_sum - c.old_rating + c.new_rating) / l.rating_count AS NUMERIC), 2)
+FROM updated_comment AS c
+WHERE l.level_id = c.level_id;
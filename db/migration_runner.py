@@ -0,0 +1,127 @@
+"""
+Schema changes live in db/migrations/ as NNNN_description.sql files and are applied in version order.
+Applied versions are recorded in the schema_migrations table, so each migration runs once per database.
+
+A migration runs inside a transaction together with its version record, unless its first line is
+"-- migrate: no-transaction". Those migrations (e.g. CREATE INDEX CONCURRENTLY) run one statement at a time in
+autocommit mode, so they must only hold plain statements separated by semicolons. If one fails partway, drop any
+INVALID index it left behind before running it again, since IF NOT EXISTS would skip over it.
+"""
+
+import glob
+import os
+import re
+from typing import List, NamedTuple, Optional
+
+import psycopg2
+
+MIGRATIONS_PATH = f"{os.path.dirname(os.path.realpath(__file__))}/migrations"
+
+NO_TRANSACTION_MARKER = "-- migrate: no-transaction"
+
+# Held while migrating so that each migration is applied once, however many processes try at the same time
+ADVISORY_LOCK_ID = 72_617_401
+
+MIGRATION_FILE_PATTERN = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    sql: str
+    
+    @property
+    def in_transaction(self) -> bool:
+        return not self.sql.startswith(NO_TRANSACTION_MARKER)
+    
+    def statements(self) -> List[str]:
+        sql = "\n".join(line for line in self.sql.splitlines() if not line.lstrip().startswith("--"))
+        return [statement.strip() for statement in sql.split(";") if statement.strip()]
+
+
+def get_migrations() -> List[Migration]:
+    migrations = []
+    for file_path in glob.glob(f"{MIGRATIONS_PATH}/*.sql"):
+        match = MIGRATION_FILE_PATTERN.match(os.path.basename(file_path))
+        if match is None:
+            raise ValueError(f"{file_path} is not named like NNNN_description.sql")
+        with open(file_path) as file:
+            migrations.append(Migration(int(match.group(1)), match.group(2), file.read()))
+    
+    migrations.sort(key = lambda migration: migration.version)
+    versions = [migration.version for migration in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError("Two migrations share a version number")
+    return migrations
+
+
+def get_applied_versions(cursor) -> set:
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INT PRIMARY KEY, name TEXT NOT NULL, applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    )
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def apply_migration(connection, migration: Migration):
+    if migration.in_transaction:
+        connection.autocommit = False
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(migration.sql)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (migration.version, migration.name)
+                )
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.autocommit = True
+    else:
+        with connection.cursor() as cursor:
+            for statement in migration.statements():
+                cursor.execute(statement)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (migration.version, migration.name)
+            )
+
+
+def migrate(dsn: Optional[str] = None, log = print, wait = True) -> List[str]:
+    """
+    Applies every pending migration in version order
+    :param wait: Whether to wait for another process that is migrating the same database. App processes applying
+    migrations at startup don't: one that blocked on the lock would hold its session open, and CREATE INDEX
+    CONCURRENTLY in the other process's migration waits for every open transaction to end
+    :return: The names of the migrations that were applied
+    """
+    dsn = dsn or os.environ.get("DATABASE_URL")
+    migrations = get_migrations()
+    applied = []
+    
+    # Migrations get their own connection rather than a pooled one: they switch autocommit on and off and hold a
+    # session level lock
+    connection = psycopg2.connect(dsn)
+    connection.autocommit = True
+    try:
+        with connection.cursor() as cursor:
+            if wait:
+                cursor.execute("SELECT pg_advisory_lock(%s)", (ADVISORY_LOCK_ID,))
+            else:
+                cursor.execute("SELECT pg_try_advisory_lock(%s)", (ADVISORY_LOCK_ID,))
+                if not cursor.fetchone()[0]:
+                    log("another process is applying migrations, leaving them to it")
+                    return applied
+            applied_versions = get_applied_versions(cursor)
+        
+        for migration in migrations:
+            if migration.version in applied_versions:
+                continue
+            log(f"applying migration {migration.version:04d}_{migration.name}")
+            apply_migration(connection, migration)
+            applied.append(f"{migration.version:04d}_{migration.name}")
+    finally:
+        connection.close()
+    
+    return applied
@@ -1,24 +1,26 @@
-CREATE TABLE usr (
-    user_id     SERIAL PRIMARY KEY,
-    user_name   VARCHAR(20) NOT NULL,
-    user_avatar TEXT        NOT NULL,
-    user_rating FLOAT
-);
+-- The tables the app was deployed with before migrations existed. Everything is created only if missing, so this
+-- version is simply recorded on databases that already have them.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
 
+DO
+$$
+    BEGIN
+        CREATE TYPE DIFF_T AS ENUM ('easy', 'medium', 'hard');
+    EXCEPTION
+        WHEN duplicate_object THEN NULL;
+    END
+$$;
 
 CREATE TABLE IF NOT EXISTS user_info (
     user_id       TEXT PRIMARY KEY,
-    user_name     TEXT UNIQUE NOT NULL,
-    user_email    TEXT UNIQUE NOT NULL,
+    user_name     TEXT NOT NULL,
+    user_email    TEXT NOT NULL,
     user_avatar   TEXT,
     creation_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
-CREATE TYPE DIFF_T AS ENUM ('easy', 'medium', 'hard');
-
-CREATE EXTENSION pg_trgm;
-
-CREATE TABLE levels (
+CREATE TABLE IF NOT EXISTS levels (
     level_id                SERIAL PRIMARY KEY,
     level_name              VARCHAR(30) NOT NULL,
     level_rating            FLOAT                DEFAULT 0.0,
@@ -34,7 +36,7 @@ CREATE TABLE levels (
             REFERENCES user_info (user_id) ON DELETE CASCADE
 );
 
-CREATE TABLE comments (
+CREATE TABLE IF NOT EXISTS comments (
     comment_id        SERIAL PRIMARY KEY,
     comment_rating    FLOAT     NOT NULL,
     comment_desc      TEXT,
@@ -0,0 +1,55 @@
+-- Full text search over level title, summary and author name, with a trigram index on the same text for typos.
+
+ALTER TABLE levels
+    DROP COLUMN IF EXISTS level_ts;
+
+ALTER TABLE levels
+    ADD COLUMN IF NOT EXISTS level_search_text TEXT     NOT NULL DEFAULT '',
+    ADD COLUMN IF NOT EXISTS level_search      TSVECTOR NOT NULL DEFAULT ''::TSVECTOR;
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE OR REPLACE FUNCTION refresh_level_search() RETURNS TRIGGER AS
+$$
+DECLARE
+    author TEXT;
+BEGIN
+    SELECT user_name INTO author FROM user_info WHERE user_id = NEW.user_id;
+    NEW.level_search_text := CONCAT_WS(' ', NEW.level_name, NEW.level_summary, author);
+    NEW.level_search := SETWEIGHT(TO_TSVECTOR('english', COALESCE(NEW.level_name, '')), 'A') ||
+                        SETWEIGHT(TO_TSVECTOR('english', COALESCE(NEW.level_summary, '')), 'B') ||
+                        SETWEIGHT(TO_TSVECTOR('simple', COALESCE(author, '')), 'C');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS levels_refresh_search ON levels;
+CREATE TRIGGER levels_refresh_search
+    BEFORE INSERT OR UPDATE OF level_name, level_summary, user_id
+    ON levels
+    FOR EACH ROW
+EXECUTE FUNCTION refresh_level_search();
+
+CREATE OR REPLACE FUNCTION refresh_author_level_search() RETURNS TRIGGER AS
+$$
+BEGIN
+    -- Touching level_name fires levels_refresh_search for every level of the renamed author
+    UPDATE levels SET level_name = level_name WHERE user_id = NEW.user_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS user_info_refresh_level_search ON user_info;
+CREATE TRIGGER user_info_refresh_level_search
+    AFTER UPDATE OF user_name
+    ON user_info
+    FOR EACH ROW
+    WHEN (OLD.user_name IS DISTINCT FROM NEW.user_name)
+EXECUTE FUNCTION refresh_author_level_search();
+
+UPDATE levels
+SET level_name = level_name
+WHERE level_search_text = '';
+
+CREATE INDEX IF NOT EXISTS levels_search_idx ON levels USING GIN (level_search);
+CREATE INDEX IF NOT EXISTS levels_search_text_trgm_idx ON levels USING GIN (level_search_text gin_trgm_ops);
@@ -0,0 +1,19 @@
+-- Running rating totals per level, kept up to date by the comment write statements.
+
+ALTER TABLE levels
+    ADD COLUMN IF NOT EXISTS rating_sum   FLOAT NOT NULL DEFAULT 0.0,
+    ADD COLUMN IF NOT EXISTS rating_count INT   NOT NULL DEFAULT 0;
+
+UPDATE levels AS l
+SET rating_sum=totals.rating_sum,
+    rating_count=totals.rating_count,
+    level_rating=COALESCE(ROUND(CAST(totals.rating_sum / NULLIF(totals.rating_count, 0) AS NUMERIC), 2), 0)
+FROM (
+         SELECT lv.level_id,
+                COALESCE(SUM(c.comment_rating), 0) AS rating_sum,
+                COUNT(c.comment_id)                AS rating_count
+         FROM levels AS lv
+                  LEFT JOIN comments AS c ON c.level_id = lv.level_id
+         GROUP BY lv.level_id
+     ) AS totals
+WHERE l.level_id = totals.level_id;
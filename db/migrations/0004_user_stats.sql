@@ -0,0 +1,60 @@
+-- Per user totals shown on the profile page, kept up to date by a trigger on levels.
+
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id           TEXT PRIMARY KEY,
+    level_count       INT   NOT NULL DEFAULT 0,
+    rated_level_count INT   NOT NULL DEFAULT 0,
+    level_rating_sum  FLOAT NOT NULL DEFAULT 0.0,
+    review_count      INT   NOT NULL DEFAULT 0,
+    CONSTRAINT fk_user
+        FOREIGN KEY (user_id)
+            REFERENCES user_info (user_id) ON DELETE CASCADE
+);
+
+CREATE OR REPLACE FUNCTION refresh_user_stats() RETURNS TRIGGER AS
+$$
+BEGIN
+    -- Take the old version of the level out of its author's totals and add the new one in. Unrated levels don't
+    -- count towards the average rating, matching what the profile always showed
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE user_stats
+        SET level_count=level_count - 1,
+            rated_level_count=rated_level_count - (COALESCE(OLD.level_rating, 0) <> 0)::INT,
+            level_rating_sum=level_rating_sum - COALESCE(OLD.level_rating, 0),
+            review_count=review_count - OLD.rating_count
+        WHERE user_id = OLD.user_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO user_stats (user_id, level_count, rated_level_count, level_rating_sum, review_count)
+        VALUES (NEW.user_id, 1, (COALESCE(NEW.level_rating, 0) <> 0)::INT, COALESCE(NEW.level_rating, 0),
+                NEW.rating_count)
+        ON CONFLICT (user_id) DO UPDATE
+            SET level_count=user_stats.level_count + EXCLUDED.level_count,
+                rated_level_count=user_stats.rated_level_count + EXCLUDED.rated_level_count,
+                level_rating_sum=user_stats.level_rating_sum + EXCLUDED.level_rating_sum,
+                review_count=user_stats.review_count + EXCLUDED.review_count;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS levels_refresh_user_stats ON levels;
+CREATE TRIGGER levels_refresh_user_stats
+    AFTER INSERT OR DELETE OR UPDATE OF level_rating, rating_count, user_id
+    ON levels
+    FOR EACH ROW
+EXECUTE FUNCTION refresh_user_stats();
+
+INSERT INTO user_stats (user_id, level_count, rated_level_count, level_rating_sum, review_count)
+SELECT user_id,
+       COUNT(*),
+       COUNT(*) FILTER ( WHERE COALESCE(level_rating, 0) <> 0 ),
+       COALESCE(SUM(level_rating), 0),
+       SUM(rating_count)
+FROM levels
+GROUP BY user_id
+ON CONFLICT (user_id) DO UPDATE
+    SET level_count=EXCLUDED.level_count,
+        rated_level_count=EXCLUDED.rated_level_count,
+        level_rating_sum=EXCLUDED.level_rating_sum,
+        review_count=EXCLUDED.review_count;
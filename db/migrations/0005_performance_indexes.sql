@@ -0,0 +1,21 @@
+-- migrate: no-transaction
+-- Indexes for the handlers' access paths. They are built CONCURRENTLY so writes keep flowing while they build,
+-- which is why this migration runs outside a transaction, one statement at a time.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS levels_published_created_idx
+    ON levels (level_published, level_created_timestamp, level_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS levels_published_rating_idx
+    ON levels (level_published, level_rating, level_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS levels_user_rating_idx
+    ON levels (user_id, level_rating, level_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS comments_level_rating_idx
+    ON comments (level_id, comment_rating);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS user_info_user_name_idx
+    ON user_info (user_name);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS user_info_user_email_idx
+    ON user_info (user_email);
@@ -0,0 +1,18 @@
+-- migrate: no-transaction
+-- Timeline analytics of each level's attacks, computed by db/level/level_simulator.py when a level is saved.
+-- Existing levels keep the zero defaults with analytics version 0 until flask backfill-level-analytics runs.
+-- The indexes serve the intensity and duration sorts and range filters of the search, so they are built CONCURRENTLY.
+
+ALTER TABLE levels
+    ADD COLUMN IF NOT EXISTS level_duration_ms        INT      NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS level_arrow_count        SMALLINT NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS level_arrows_per_second  FLOAT    NOT NULL DEFAULT 0.0,
+    ADD COLUMN IF NOT EXISTS level_peak_arrows        SMALLINT NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS level_reversal_density   FLOAT    NOT NULL DEFAULT 0.0,
+    ADD COLUMN IF NOT EXISTS level_analytics_version  SMALLINT NOT NULL DEFAULT 0;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS levels_published_arrows_per_second_idx
+    ON levels (level_published, level_arrows_per_second, level_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS levels_published_duration_idx
+    ON levels (level_published, level_duration_ms, level_id);
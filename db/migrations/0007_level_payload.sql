@@ -0,0 +1,7 @@
+-- The level's attacks in the binary encoding of db/level/level_codec.py, and the hash the payload endpoint uses as its
+-- ETag. Both are written when a level is saved; levels saved before this migration get them the first time they are
+-- played.
+
+ALTER TABLE levels
+    ADD COLUMN IF NOT EXISTS level_payload      BYTEA,
+    ADD COLUMN IF NOT EXISTS level_payload_hash TEXT;
@@ -0,0 +1,42 @@
+-- Version counters for what a feed card shows: the level's name, summary, difficulty and rating, and its author's
+-- name and avatar. Rendered cards are cached under both versions, so a card is re-rendered only after one of them
+-- changes.
+
+ALTER TABLE levels
+    ADD COLUMN IF NOT EXISTS level_version INT NOT NULL DEFAULT 0;
+
+ALTER TABLE user_info
+    ADD COLUMN IF NOT EXISTS user_version INT NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION bump_level_version() RETURNS TRIGGER AS
+$$
+BEGIN
+    NEW.level_version = OLD.level_version + 1;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION bump_user_version() RETURNS TRIGGER AS
+$$
+BEGIN
+    NEW.user_version = OLD.user_version + 1;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS levels_bump_level_version ON levels;
+CREATE TRIGGER levels_bump_level_version
+    BEFORE UPDATE
+    ON levels
+    FOR EACH ROW
+    WHEN ((OLD.level_name, OLD.level_summary, OLD.level_diff, OLD.level_rating)
+        IS DISTINCT FROM (NEW.level_name, NEW.level_summary, NEW.level_diff, NEW.level_rating))
+EXECUTE FUNCTION bump_level_version();
+
+DROP TRIGGER IF EXISTS user_info_bump_user_version ON user_info;
+CREATE TRIGGER user_info_bump_user_version
+    BEFORE UPDATE
+    ON user_info
+    FOR EACH ROW
+    WHEN ((OLD.user_name, OLD.user_avatar) IS DISTINCT FROM (NEW.user_name, NEW.user_avatar))
+EXECUTE FUNCTION bump_user_version();
@@ -0,0 +1,8 @@
+-- migrate: no-transaction
+-- Serves the level page's comment pages, which are cut by (comment_rating, comment_id) within a level. It also covers
+-- every query the old (level_id, comment_rating) index served, so that one is dropped.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS comments_level_rating_id_idx
+    ON comments (level_id, comment_rating, comment_id);
+
+DROP INDEX CONCURRENTLY IF EXISTS comments_level_rating_idx;
@@ -0,0 +1,9 @@
+-- migrate: no-transaction
+-- User names are unique, and the unique index is what guarantees it: registering inserts with ON CONFLICT on it
+-- instead of checking first, so two people picking the same name at once can't both get it. It serves every lookup the
+-- plain index served, so that one is dropped. Building it fails if duplicate names already exist; rename those first.
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS user_info_user_name_key
+    ON user_info (user_name);
+
+DROP INDEX CONCURRENTLY IF EXISTS user_info_user_name_idx;
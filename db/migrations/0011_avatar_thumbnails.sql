@@ -0,0 +1,17 @@
+-- Small copies of each user's avatar, made on the server after an upload, so pages that show avatars as small circles
+-- don't download the full size picture for each one. Maps a size in pixels to the thumbnail's URL per format:
+-- {"64": {"webp": "...", "jpeg": "..."}, ...}. NULL until the user uploads an avatar the server could read, and pages
+-- then show user_avatar itself.
+
+ALTER TABLE user_info
+    ADD COLUMN IF NOT EXISTS user_avatar_thumbnails JSONB;
+
+-- Feed cards show the thumbnails too
+DROP TRIGGER IF EXISTS user_info_bump_user_version ON user_info;
+CREATE TRIGGER user_info_bump_user_version
+    BEFORE UPDATE
+    ON user_info
+    FOR EACH ROW
+    WHEN ((OLD.user_name, OLD.user_avatar, OLD.user_avatar_thumbnails)
+        IS DISTINCT FROM (NEW.user_name, NEW.user_avatar, NEW.user_avatar_thumbnails))
+EXECUTE FUNCTION bump_user_version();
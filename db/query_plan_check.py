@@ -0,0 +1,85 @@
+"""
+EXPLAINs the hot queries and reports the ones that would read a whole table.
+
+Sequential scans are switched off for the check, so the planner picks an index whenever one can serve the query, even
+on a small development database where a scan would be cheaper. A sequential scan that still shows up means no index
+covers that access path.
+"""
+
+from typing import Dict, List
+
+from db import database_handler, sql_registry
+from db.home import home_handler
+from db.level import level_handler
+from db.home.home_models import SearchData
+
+SAMPLE_LEVEL_ID = 1
+SAMPLE_USER_ID = "auth0|sample"
+SAMPLE_USER_NAME = "sample"
+
+
+def get_hot_queries() -> Dict[str, tuple]:
+    search_data = SearchData(
+        filters = {"difficulty": ["easy", "hard"], "rating": [1, 5], "timespan": "month", "intensity": [1, 4]},
+        sorting = "relevance", search = "undyne spears"
+    )
+    return {
+        "home/home_feed": (
+            sql_registry.get_query("home/home_feed"), home_handler.get_cursor_parameters(None, "time")
+        ),
+        "home/search": (
+            home_handler.build_query(search_data), home_handler.get_search_parameters(search_data, None)
+        ),
+        "level/level_info": (sql_registry.get_query("level/level_info"), (SAMPLE_LEVEL_ID,)),
+        "level/level_page": (
+            sql_registry.get_query("level/level_page"),
+            dict(level_id = SAMPLE_LEVEL_ID, viewer_id = SAMPLE_USER_ID, limit = level_handler.COMMENT_PAGE_SIZE + 1)
+        ),
+        "level/level_comments": (
+            sql_registry.get_query("level/level_comments"),
+            dict(
+                level_id = SAMPLE_LEVEL_ID, cursor_rating = 5.0, cursor_id = level_handler.MAX_COMMENT_ID,
+                limit = level_handler.COMMENT_PAGE_SIZE + 1
+            )
+        ),
+        "level/level_payload_info": (sql_registry.get_query("level/level_payload_info"), (SAMPLE_LEVEL_ID,)),
+        "user/user_info": (sql_registry.get_query("user/user_info"), (SAMPLE_USER_NAME,)),
+        "user/user_levels": (
+            sql_registry.get_query("user/user_levels"),
+            dict(
+                user_id = SAMPLE_USER_ID, include_private = False,
+                **home_handler.get_cursor_parameters(None, "rating")
+            )
+        ),
+        "auth/taken_user_names": (
+            sql_registry.get_query("auth/taken_user_names"), ([SAMPLE_USER_NAME, f"{SAMPLE_USER_NAME}1"],)
+        ),
+        "auth/get_user_data": (
+            sql_registry.get_query("auth/get_user_data", check_email = True),
+            dict(user_id = SAMPLE_USER_ID, user_email = "sample@example.com")
+        ),
+    }
+
+
+def find_sequential_scans(plan: dict) -> List[str]:
+    scans = []
+    if plan["Node Type"] == "Seq Scan":
+        scans.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        scans.extend(find_sequential_scans(child))
+    return scans
+
+
+def check_query_plans() -> Dict[str, List[str]]:
+    """
+    :return: The tables each hot query reads with a sequential scan. Queries with no sequential scans are left out
+    """
+    regressions = {}
+    with database_handler.get_db_cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        for name, (query, parameters) in get_hot_queries().items():
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {query}", parameters)
+            scans = find_sequential_scans(cursor.fetchone()[0][0]["Plan"])
+            if scans:
+                regressions[name] = scans
+    return regressions
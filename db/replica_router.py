@@ -0,0 +1,86 @@
+"""
+Picks the read replica a read only statement runs on.
+
+Replicas are listed in DATABASE_REPLICA_URLS, separated by commas, and taken in turns. A replica that can't be
+reached, or whose replay trails the primary by more than DB_REPLICA_MAX_LAG seconds, is skipped until its next check,
+DB_REPLICA_CHECK_INTERVAL seconds later. With no replica to use, reads go to the primary.
+A session that wrote recently reads from the primary for long enough that any replica it could be sent to has
+replayed its writes, so nobody saves a level or a comment and then misses it on the next page.
+"""
+
+import itertools
+import os
+import time
+from typing import Any, List, Optional
+
+from flask import has_request_context, session
+
+MAX_LAG = float(os.environ.get("DB_REPLICA_MAX_LAG", 5))
+CHECK_INTERVAL = float(os.environ.get("DB_REPLICA_CHECK_INTERVAL", 5))
+READ_YOUR_WRITES_WINDOW = MAX_LAG + CHECK_INTERVAL
+
+SESSION_WRITE_KEY = "db_written_at"
+
+# Seconds the replica's replay trails the primary. A replica that replayed everything it received is caught up even if
+# the primary has been idle since, and a server that isn't a standby at all has no lag
+LAG_QUERY = "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 " \
+            "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+
+
+def get_replica_dsns() -> List[str]:
+    return [dsn.strip() for dsn in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if dsn.strip()]
+
+
+class Replica:
+    """A replica's connection pool and what its last check found"""
+    
+    def __init__(self, name: str, pool: Any):
+        self.name = name
+        self.pool = pool
+        self.usable = True
+        self.lag: Optional[float] = None
+        self.checked_at = float("-inf")
+    
+    def needs_check(self) -> bool:
+        return time.monotonic() - self.checked_at >= CHECK_INTERVAL
+    
+    def record_lag(self, lag: float):
+        self.lag = lag
+        self.usable = lag <= MAX_LAG
+        self.checked_at = time.monotonic()
+    
+    def record_failure(self):
+        self.lag = None
+        self.usable = False
+        self.checked_at = time.monotonic()
+
+
+class ReplicaSet:
+    def __init__(self, replicas: List[Replica]):
+        self.replicas = replicas
+        self.__turns = itertools.count()
+    
+    def candidates(self) -> List[Replica]:
+        """
+        The replicas worth trying for one read, starting with the next one in turn: those that passed their last
+        check, and those that failed it but are due to be checked again
+        """
+        if not self.replicas:
+            return []
+        start = next(self.__turns) % len(self.replicas)
+        ordered = self.replicas[start:] + self.replicas[:start]
+        return [replica for replica in ordered if replica.usable or replica.needs_check()]
+    
+    def stats(self) -> List[dict]:
+        return [
+            {"name": replica.name, "usable": replica.usable, "lag_seconds": replica.lag} for replica in self.replicas
+        ]
+
+
+def session_recently_wrote() -> bool:
+    return has_request_context() and time.time() - session.get(SESSION_WRITE_KEY, 0) < READ_YOUR_WRITES_WINDOW
+
+
+def remember_write():
+    """Sends the current session's reads to the primary for the next READ_YOUR_WRITES_WINDOW seconds"""
+    session[SESSION_WRITE_KEY] = time.time()
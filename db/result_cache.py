@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class _Flight:
+    """A load in progress. Threads asking for the same key wait on it instead of querying the database themselves"""
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+    
+    @classmethod
+    def landed(cls, value: Any) -> "_Flight":
+        flight = cls()
+        flight.value = value
+        flight.event.set()
+        return flight
+    
+    def result(self) -> Any:
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class ResultCache:
+    """
+    An in-process LRU cache whose entries also expire `ttl` seconds after they were loaded.
+    Concurrent misses on the same key share a single load, and invalidate() drops every entry. A load that was already
+    running when invalidate() was called still answers its waiting callers but is not stored, so stale rows read before
+    a write committed never outlive that write.
+    Each worker process has its own cache, which is why the ttl bounds how long another worker can serve stale results
+    """
+    
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        
+        self.__lock = threading.Lock()
+        self.__entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.__flights: Dict[Hashable, _Flight] = {}
+        self.__generation = 0
+        
+        self.__hits = 0
+        self.__misses = 0
+    
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        flight, generation = self.__join(key)
+        if generation is None:
+            flight.event.wait()
+            return flight.result()
+        
+        try:
+            flight.value = loader()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            self.__land(key, flight, generation)
+        return flight.value
+    
+    async def get_or_load_async(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """get_or_load for coroutines. It shares entries and loads in progress with the threads using get_or_load"""
+        flight, generation = self.__join(key)
+        if generation is None:
+            if not flight.event.is_set():
+                # The load may be running on another thread, so the wait happens on a worker thread rather than
+                # blocking the event loop
+                await asyncio.to_thread(flight.event.wait)
+            return flight.result()
+        
+        try:
+            flight.value = await loader()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            self.__land(key, flight, generation)
+        return flight.value
+    
+    def __join(self, key: Hashable) -> Tuple[_Flight, Optional[int]]:
+        """
+        The flight answering key: an already landed one on a hit, or another caller's load in progress, or else a new
+        one that the caller has to load. Only in that last case is the generation it started in returned as well
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self.__entries.move_to_end(key)
+                    self.__hits += 1
+                    return _Flight.landed(value), None
+                del self.__entries[key]
+            
+            self.__misses += 1
+            flight = self.__flights.get(key)
+            if flight is not None:
+                return flight, None
+            flight = self.__flights[key] = _Flight()
+            return flight, self.__generation
+    
+    def __land(self, key: Hashable, flight: _Flight, generation: int):
+        with self.__lock:
+            del self.__flights[key]
+            if flight.error is None and generation == self.__generation:
+                self.__entries[key] = (time.monotonic() + self.ttl, flight.value)
+                while len(self.__entries) > self.max_entries:
+                    self.__entries.popitem(last = False)
+        flight.event.set()
+    
+    def invalidate(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.__generation += 1
+    
+    def discard(self, predicate: Callable[[Hashable], bool]):
+        """Drops the entries whose key matches, leaving the rest of the cache warm"""
+        with self.__lock:
+            for key in [key for key in self.__entries if predicate(key)]:
+                del self.__entries[key]
+            self.__generation += 1
+    
+    def stats(self) -> dict:
+        with self.__lock:
+            return {
+                "entries": len(self.__entries),
+                "hits": self.__hits,
+                "misses": self.__misses,
+            }
@@ -0,0 +1,106 @@
+"""
+Every query under db/*/sql/ is read and compiled once, then served by its name, which is the package and the file name
+without the extension (e.g. "level/level_info").
+
+Statements listed in PREPARED_STATEMENTS are also PREPAREd on each pooled connection the first time they run there.
+From then on, executing them only sends the parameter values, so Postgres skips parsing and planning the query.
+"""
+
+import glob
+import os
+import re
+from typing import Dict, List, Optional, Union
+
+from jinja2 import Environment, Template
+
+DB_PATH = os.path.dirname(os.path.realpath(__file__))
+
+PREPARED_STATEMENTS = {
+    "level/level_info", "level/level_page", "level/level_comments", "level/level_payload_info", "level/level_payload",
+    "home/home_feed"
+}
+
+PLACEHOLDER_PATTERN = re.compile(r"%\((\w+)\)s|%s|%%")
+
+# A statement that is a plain SELECT only reads, so it may run on a read replica. Anything else goes to the primary,
+# including a WITH, which can wrap a write
+READ_ONLY_PATTERN = re.compile(r"^\s*(--[^\n]*\n\s*)*SELECT\b", re.IGNORECASE)
+
+jinja_environment = Environment()
+
+statements: Dict[str, "Statement"] = {}
+
+
+class Statement:
+    def __init__(self, name: str, text: str):
+        self.name = name
+        self.text = text
+        self.template: Optional[Template] = None
+        if "{%" in text or "{{" in text:
+            self.template = jinja_environment.from_string(text)
+        self.__rendered: Dict[tuple, str] = {}
+        
+        self.is_read_only = READ_ONLY_PATTERN.match(text) is not None
+        self.is_prepared = name in PREPARED_STATEMENTS and self.template is None
+        self.plan_name = name.replace("/", "__")
+        self.__parameter_names: List[Union[str, int]] = []
+        if self.is_prepared:
+            self.prepare_query = f"PREPARE {self.plan_name} AS {self.__to_numbered_placeholders()}"
+            placeholders = ", ".join(["%s"] * len(self.__parameter_names))
+            self.execute_query = f"EXECUTE {self.plan_name}({placeholders})" if placeholders \
+                else f"EXECUTE {self.plan_name}"
+    
+    def __to_numbered_placeholders(self) -> str:
+        """Rewrites psycopg2 style %(name)s / %s placeholders into the $1, $2... form PREPARE expects"""
+        positional_count = 0
+        
+        def replace(match):
+            nonlocal positional_count
+            if match.group(0) == "%%":
+                return "%"
+            if match.group(1) is not None:
+                key = match.group(1)
+            else:
+                key = positional_count
+                positional_count += 1
+            if key not in self.__parameter_names:
+                self.__parameter_names.append(key)
+            return f"${self.__parameter_names.index(key) + 1}"
+        
+        return PLACEHOLDER_PATTERN.sub(replace, self.text)
+    
+    def bind(self, parameters) -> list:
+        """Orders the parameters to match the numbered placeholders of the prepared statement"""
+        return [parameters[key] for key in self.__parameter_names]
+    
+    def render(self, **template_args) -> str:
+        if self.template is None:
+            return self.text
+        # Templated statements only have a handful of variants, so each one is rendered once and kept
+        key = tuple(sorted(template_args.items()))
+        if key not in self.__rendered:
+            self.__rendered[key] = self.template.render(**template_args)
+        return self.__rendered[key]
+
+
+def load():
+    """Reads every sql file under db/*/sql/. Called once at startup, before any statement is requested"""
+    loaded = {}
+    for file_path in sorted(glob.glob(f"{DB_PATH}/*/sql/*.sql")):
+        package = os.path.basename(os.path.dirname(os.path.dirname(file_path)))
+        name = f"{package}/{os.path.splitext(os.path.basename(file_path))[0]}"
+        with open(file_path) as file:
+            loaded[name] = Statement(name, file.read())
+    
+    statements.clear()
+    statements.update(loaded)
+
+
+def get_statement(name: str) -> Statement:
+    if not statements:
+        load()
+    return statements[name]
+
+
+def get_query(name: str, **template_args) -> str:
+    return get_statement(name).render(**template_args)
@@ -1,3 +1,4 @@
 UPDATE user_info
-SET user_avatar=%(user_avatar)s
+SET user_avatar=%(user_avatar)s,
+    user_avatar_thumbnails=%(user_avatar_thumbnails)s
 WHERE user_id =%(user_id)s;
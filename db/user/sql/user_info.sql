@@ -2,8 +2,10 @@ SELECT u.user_id,
        u.user_name,
        u.user_email,
        u.user_avatar,
-       ROUND(CAST(COALESCE(AVG(l.level_rating) FILTER ( WHERE l.level_rating != 0 ), 0) AS NUMERIC), 2)
+       COALESCE(ROUND(CAST(s.level_rating_sum / NULLIF(s.rated_level_count, 0) AS NUMERIC), 2), 0) AS average_rating,
+       COALESCE(s.level_count, 0)                                                                   AS level_count,
+       COALESCE(s.review_count, 0)                                                                  AS review_count,
+       u.user_avatar_thumbnails
 FROM user_info AS u
-     LEFT JOIN levels l ON u.user_id = l.user_id
+     LEFT JOIN user_stats AS s ON u.user_id = s.user_id
 WHERE u.user_name = %s
-GROUP BY u.user_id, u.user_name, u.user_email, u.user_avatar
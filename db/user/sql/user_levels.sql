@@ -1,4 +1,13 @@
-SELECT *
+SELECT level_id,
+       level_name,
+       level_rating,
+       level_summary,
+       level_diff,
+       level_created_timestamp,
+       level_published
 FROM levels
-WHERE user_id = %s
-ORDER BY level_rating DESC;
+WHERE user_id = %(user_id)s
+  AND (level_published OR %(include_private)s)
+  AND (level_rating, level_id) < (%(cursor_value)s, %(cursor_id)s)
+ORDER BY level_rating DESC, level_id DESC
+LIMIT %(limit)s;
@@ -1,34 +1,55 @@
-import os
+from typing import Optional
 
 from flask import session
+from psycopg2.extras import Json
 
-from db import database_handler
-
-BASE_PATH = f"{os.path.dirname(os.path.realpath(__file__))}/sql"
+import feed_cards
+from db import async_database_handler, database_handler
+from db.home import home_handler
 
 
 def get_user_info(id):
-    with open(f"{BASE_PATH}/user_info.sql") as f:
-        query = f.read()
-        
-        with database_handler.get_db_cursor() as cur:
-            cur.execute(query, (id,))
-            res = cur.fetchall()
-            return res
-
-
-def get_user_levels(id):
-    with open(f"{BASE_PATH}/user_levels.sql") as f:
-        query = f.read()
-        
-        with database_handler.get_db_cursor() as cur:
-            cur.execute(query, (id,))
-            res = cur.fetchall()
-            return res
-
-
-def update_user_avatar(user_avatar_url):
+    with database_handler.get_read_cursor() as cur:
+        database_handler.execute_statement(cur, "user/user_info", (id,))
+        res = cur.fetchall()
+        return res
+
+
+def get_user_levels(id, include_private = False, cursor: Optional[str] = None) -> home_handler.FeedPage:
+    """One page of a user's levels, best rated first. Private levels are only listed for their author"""
+    parameters = dict(
+        user_id = id, include_private = include_private, **home_handler.get_cursor_parameters(cursor, "rating")
+    )
+    with database_handler.get_read_cursor() as cur:
+        database_handler.execute_statement(cur, "user/user_levels", parameters)
+        res = cur.fetchall()
+        return home_handler.FeedPage(res, "rating")
+
+
+async def get_user_info_async(id):
+    return await async_database_handler.fetch_statement("user/user_info", (id,))
+
+
+async def get_user_levels_async(id, include_private = False, cursor: Optional[str] = None) -> home_handler.FeedPage:
+    parameters = dict(
+        user_id = id, include_private = include_private, **home_handler.get_cursor_parameters(cursor, "rating")
+    )
+    res = await async_database_handler.fetch_statement("user/user_levels", parameters)
+    return home_handler.FeedPage(res, "rating")
+
+
+def update_user_avatar(user_avatar_url, thumbnails: Optional[dict] = None):
+    """
+    :param thumbnails: The new avatar's thumbnail URLs from avatar_thumbnails.create_thumbnails. Without them the
+    previous avatar's are cleared
+    """
     assert "profile" in session
-    database_handler.execute_query_from_files(
-        f"{BASE_PATH}/update_user.sql", dict(user_avatar = user_avatar_url, user_id = session["profile"]["user_id"])
+    database_handler.execute_statements(
+        "user/update_user", dict(
+            user_avatar = user_avatar_url, user_avatar_thumbnails = Json(thumbnails) if thumbnails else None,
+            user_id = session["profile"]["user_id"]
+        )
     )
+    # Feed cards show the author's avatar
+    home_handler.invalidate_feed_cache()
+    feed_cards.invalidate_user(session["profile"]["user_id"])
@@ -0,0 +1,44 @@
+"""
+Rendered feed cards, reused until the level or its author changes.
+A card is cached under its level and author ids and their version counters, which the database bumps whenever
+something the card shows changes. A stale card is therefore never served, even by a worker that didn't see the
+write; the invalidation hooks only free the memory of cards that can no longer be asked for
+"""
+
+import os
+
+from flask import current_app
+from markupsafe import Markup
+
+from db import database_handler
+from db.result_cache import ResultCache
+
+card_cache = ResultCache(
+    max_entries = int(os.environ.get("CARD_CACHE_MAX_ENTRIES", 2048)),
+    ttl = float(os.environ.get("CARD_CACHE_TTL", 3600))
+)
+
+LEVEL_ID = 0
+USER_ID = 1
+
+
+def render_feed_card(level) -> Markup:
+    """
+    :param level: A feed row with the level's and the author's columns, including level_version and user_version
+    """
+    return card_cache.get_or_load(
+        (level["level_id"], level["user_id"], level["level_version"], level["user_version"]),
+        lambda: current_app.jinja_env.get_template("components/level_feed.html").module.level_in_feed(
+            level["level_name"], level["level_rating"], level["level_diff"], level["level_summary"], level["user_name"],
+            level["user_avatar"], level["level_id"], level["user_id"], level["user_avatar_thumbnails"]
+        )
+    )
+
+
+def invalidate_level(level_id):
+    level_id = int(level_id)
+    database_handler.after_commit(lambda: card_cache.discard(lambda key: key[LEVEL_ID] == level_id))
+
+
+def invalidate_user(user_id):
+    database_handler.after_commit(lambda: card_cache.discard(lambda key: key[USER_ID] == user_id))
@@ -1,5 +1,7 @@
 import os
 from datetime import timedelta
+from urllib.parse import quote
+from uuid import uuid4
 
 import firebase_admin
 import requests
@@ -10,9 +12,14 @@ from google.cloud.storage.bucket import Bucket
 
 load_dotenv(find_dotenv())
 
+# Seconds an upload or download made by the server may take
+FILE_TIMEOUT = 30
+
 
 class Firebase:
-    def __init__(self):
+    """The Firebase storage backend of storage_handler.Storage"""
+    
+    def __init__(self, http_session: requests.Session):
         self.__credentials = credentials.Certificate(
             {
                 "type": os.getenv("type"),
@@ -28,19 +35,40 @@ class Firebase:
             }
         )
         self.__bucket_name = "todo-undyne.appspot.com"
-        self.__app = firebase_admin.initialize_app(self.__credentials)
+        # Named after the process: a worker forked from a process that had already set Firebase up gets an app of its
+        # own rather than the parent's, whose name would otherwise be taken
+        self.__app = firebase_admin.initialize_app(self.__credentials, name = f"storage_{os.getpid()}")
+        self.__http_session = http_session
     
     def __get_storage_bucket(self) -> Bucket:
         return bucket(name = self.__bucket_name, app = self.__app)
     
-    def get_signed_url(self, file_name, file_type = 'jpeg'):
+    def get_signed_url(self, file_name, file_type = 'jpeg', expiration = timedelta(minutes = 10)):
         return self.__get_storage_bucket().blob(file_name).generate_signed_url(
-            expiration = timedelta(minutes = 10),
+            expiration = expiration,
             method = "PUT",
             content_type = f"image/{file_type}",
         )
     
+    def __get_download_url(self, file_name):
+        return f"https://firebasestorage.googleapis.com/v0/b/{self.__bucket_name}/o/{quote(file_name, safe = '')}"
+    
     def get_file_url(self, file_name):
-        url = f"https://firebasestorage.googleapis.com/v0/b/{self.__bucket_name}/o/{file_name}"
-        response = requests.get(url).json()
-        return f"{url}?alt=media&token={response['downloadTokens']}"
+        url = self.__get_download_url(file_name)
+        response = self.__http_session.get(url)
+        response.raise_for_status()
+        return f"{url}?alt=media&token={response.json()['downloadTokens']}"
+    
+    def load_file(self, file_name) -> bytes:
+        return self.__get_storage_bucket().blob(file_name).download_as_bytes(timeout = FILE_TIMEOUT)
+    
+    def store_file(self, file_name, data: bytes, content_type: str) -> str:
+        """Uploads from the server and returns the file's URL"""
+        blob = self.__get_storage_bucket().blob(file_name)
+        # A new download token per upload gives every version of the file its own URL, so browsers may cache each one
+        # for good
+        token = str(uuid4())
+        blob.metadata = {"firebaseStorageDownloadTokens": token}
+        blob.cache_control = "public, max-age=31536000, immutable"
+        blob.upload_from_string(data, content_type = content_type, timeout = FILE_TIMEOUT)
+        return f"{self.__get_download_url(file_name)}?alt=media&token={token}"
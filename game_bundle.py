@@ -0,0 +1,137 @@
+"""
+Builds the minified game modules into one content hashed script, with gzip and brotli variants next to it, and serves
+it with caching headers that let browsers keep it until the next build changes its name.
+Run python game_bundle.py (or flask build-game-bundle) after changing a game script and before starting the app.
+Without a built bundle the game page falls back to including each module on its own.
+"""
+
+import glob
+import gzip
+import hashlib
+import json
+import os
+from functools import lru_cache
+from typing import Optional
+
+import brotli
+from flask import abort, request, send_from_directory, url_for
+
+import utils
+
+# The game scripts in the order they have to run: every class is declared before the scripts that extend or use it
+GAME_MODULES = [
+    "util/math_utility",
+    
+    "loaders/asset_loader",
+    "loaders/audio_manager",
+    "loaders/font_loader",
+    "loaders/graphic_manager",
+    "loaders/asset_manager",
+    
+    "attacks/attack_manager",
+    "attacks/attack_codec",
+    "attacks/test_attacks",
+    "attacks/attack_parser",
+    
+    "graphics/graphics_object",
+    "graphics/arrow",
+    "graphics/box",
+    "graphics/speech_bubble",
+    "graphics/green_rectangle_manager",
+    "graphics/undyne",
+    "graphics/player",
+    "graphics/hud",
+    "graphics/button",
+    
+    "game/undyne_dialogue",
+    "game/renderer_manager",
+    "game/keyboard_handler",
+    "game/attack_runner",
+    "game/game_handler",
+    "main",
+]
+
+GAME_SCRIPTS_PATH = f"{utils.get_project_base_path()}/static/game/jsmin"
+BUNDLE_PATH = f"{utils.get_project_base_path()}/static/game/bundle"
+MANIFEST_PATH = f"{BUNDLE_PATH}/manifest.json"
+BUNDLE_NAME = "game.min.js"
+
+# Precompressed variants, preferred in this order when the client accepts them
+ENCODINGS = {
+    "br": ".br",
+    "gzip": ".gz",
+}
+
+# A year, the longest max-age browsers honour; the file name changes whenever the content does
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def build_bundle() -> dict:
+    """
+    Writes the bundle, its compressed variants and the manifest pointing at them, replacing the previous build
+    :return: The manifest
+    """
+    scripts = []
+    for module in GAME_MODULES:
+        with open(f"{GAME_SCRIPTS_PATH}/{module}.min.js", encoding = "utf-8") as file:
+            scripts.append(file.read().strip())
+    # Each module is a complete script, so ending it with a newline and a semicolon keeps them from running together
+    bundle = "\n;\n".join(scripts).encode()
+    
+    bundle_file_name = f"game.{hashlib.sha256(bundle).hexdigest()[:16]}.min.js"
+    os.makedirs(BUNDLE_PATH, exist_ok = True)
+    for old_file in glob.glob(f"{BUNDLE_PATH}/game.*.min.js*"):
+        os.remove(old_file)
+    
+    with open(f"{BUNDLE_PATH}/{bundle_file_name}", "wb") as file:
+        file.write(bundle)
+    with open(f"{BUNDLE_PATH}/{bundle_file_name}{ENCODINGS['gzip']}", "wb") as file:
+        file.write(gzip.compress(bundle, compresslevel = 9, mtime = 0))
+    with open(f"{BUNDLE_PATH}/{bundle_file_name}{ENCODINGS['br']}", "wb") as file:
+        file.write(brotli.compress(bundle, mode = brotli.MODE_TEXT, quality = 11))
+    
+    manifest = {BUNDLE_NAME: bundle_file_name}
+    with open(MANIFEST_PATH, "w") as file:
+        json.dump(manifest, file, indent = 4)
+    load_manifest.cache_clear()
+    return manifest
+
+
+@lru_cache(maxsize = None)
+def load_manifest() -> dict:
+    try:
+        with open(MANIFEST_PATH) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def bundle_url() -> Optional[str]:
+    """The URL of the built game bundle, or None when it hasn't been built"""
+    bundle_file_name = load_manifest().get(BUNDLE_NAME)
+    return url_for("game_bundle_file", filename = bundle_file_name) if bundle_file_name else None
+
+
+def send_bundle(filename: str):
+    """Sends a bundle built by build_bundle, precompressed when the client accepts one of its encodings"""
+    if filename not in load_manifest().values():
+        abort(404)
+    
+    for encoding, extension in ENCODINGS.items():
+        if request.accept_encodings[encoding] and os.path.exists(f"{BUNDLE_PATH}/{filename}{extension}"):
+            response = send_from_directory(
+                BUNDLE_PATH, filename + extension, mimetype = "text/javascript", max_age = IMMUTABLE_MAX_AGE
+            )
+            response.content_encoding = encoding
+            break
+    else:
+        response = send_from_directory(BUNDLE_PATH, filename, mimetype = "text/javascript", max_age = IMMUTABLE_MAX_AGE)
+    
+    response.vary.add("Accept-Encoding")
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+if __name__ == "__main__":
+    print(f"Built {build_bundle()[BUNDLE_NAME]}")
@@ -0,0 +1,102 @@
+"""
+Keeps the identity provider's OpenID discovery document, together with its signing keys (JWKS), in memory and on disk.
+With both at hand, a login verifies the ID token locally and needs no discovery, keys or userinfo request.
+
+The copy on disk is shared by every worker on the machine and survives restarts. When it is older than
+OIDC_METADATA_TTL seconds, one process refetches it under a file lock while the others wait and then read its result,
+so a deploy that starts every worker at once still fetches the documents once. If the provider can't be reached, the
+stale copy keeps being used until it can.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Optional
+
+import requests
+
+import utils
+
+CACHE_PATH = os.environ.get("OIDC_CACHE_PATH", f"{utils.get_project_base_path()}/.cache/oidc")
+TTL = float(os.environ.get("OIDC_METADATA_TTL", 24 * 60 * 60))
+REQUEST_TIMEOUT = 10
+# Seconds before a failed refresh is tried again, so logins don't each wait on a provider that is down
+RETRY_AFTER_FAILURE = 60
+
+# Set on the cached document, so holders of an older copy can tell that it was refreshed
+CACHED_AT_KEY = "_cached_at"
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderMetadata:
+    def __init__(self, metadata_url: str):
+        self.metadata_url = metadata_url
+        self.file_path = f"{CACHE_PATH}/{metadata_url.split('://', 1)[-1].replace('/', '_')}.json"
+        self.__metadata: Optional[dict] = None
+        self.__lock = threading.Lock()
+    
+    def get(self) -> dict:
+        """The discovery document, with the provider's key set under "jwks" as authlib expects it"""
+        metadata = self.__metadata
+        if metadata is not None and not self.__is_stale(metadata):
+            return metadata
+        
+        with self.__lock:
+            if self.__metadata is None or self.__is_stale(self.__metadata):
+                self.__metadata = self.__load()
+            return self.__metadata
+    
+    @staticmethod
+    def __is_stale(metadata: dict) -> bool:
+        return time.time() - metadata[CACHED_AT_KEY] >= TTL
+    
+    def __read_file(self) -> Optional[dict]:
+        try:
+            with open(self.file_path) as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+    
+    def __load(self) -> dict:
+        metadata = self.__read_file()
+        if metadata is not None and not self.__is_stale(metadata):
+            return metadata
+        
+        os.makedirs(CACHE_PATH, exist_ok = True)
+        with open(f"{self.file_path}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # Another worker may have refreshed the file while this one waited for the lock
+            metadata = self.__read_file()
+            if metadata is not None and not self.__is_stale(metadata):
+                return metadata
+            try:
+                fresh_metadata = self.__fetch()
+            except (requests.RequestException, ValueError):
+                if metadata is None:
+                    raise
+                logger.exception(f"could not refresh {self.metadata_url}, using the copy from before")
+                return dict(metadata, **{CACHED_AT_KEY: time.time() - TTL + RETRY_AFTER_FAILURE})
+            self.__write_file(fresh_metadata)
+            return fresh_metadata
+    
+    def __fetch(self) -> dict:
+        response = requests.get(self.metadata_url, timeout = REQUEST_TIMEOUT)
+        response.raise_for_status()
+        metadata = response.json()
+        response = requests.get(metadata["jwks_uri"], timeout = REQUEST_TIMEOUT)
+        response.raise_for_status()
+        metadata["jwks"] = response.json()
+        metadata[CACHED_AT_KEY] = time.time()
+        return metadata
+    
+    def __write_file(self, metadata: dict):
+        # Written next to the cache file and renamed over it, so readers never see half a document
+        file_descriptor, temporary_path = tempfile.mkstemp(dir = CACHE_PATH, suffix = ".json")
+        with os.fdopen(file_descriptor, "w") as file:
+            json.dump(metadata, file)
+        os.replace(temporary_path, self.file_path)
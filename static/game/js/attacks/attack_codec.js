@@ -0,0 +1,54 @@
+/**
+ * Decodes the compact binary level encoding written by db/level/level_codec.py.
+ */
+class AttackCodec {
+    
+    static FORMAT_VERSION = 1;
+    static DIRECTIONS = ["U", "D", "L", "R", "?"];
+    static REVERSED_BIT = 0b1000;
+    static CLOCKWISE_SHIFT_BIT = 0b1;
+    
+    /**
+     * Decodes an encoded level into the same level data JSON the level creator saves.
+     * @param buffer The ArrayBuffer holding the encoded level
+     * @return The level data JSON, with the attacks under "attacks"
+     */
+    static decode(buffer) {
+        const view = new DataView(buffer);
+        const magic = String.fromCharCode(view.getUint8(0), view.getUint8(1), view.getUint8(2));
+        if(magic !== "UDA") {
+            throw new Error("The data is not an encoded level");
+        }
+        if(view.getUint8(3) !== AttackCodec.FORMAT_VERSION) {
+            throw new Error("Unsupported level encoding version " + view.getUint8(3));
+        }
+        
+        const attackCount = view.getUint8(4);
+        const attacks = [];
+        let offset = 5;
+        for(let i = 0; i < attackCount; ++i) {
+            const attack = {
+                "attackDelay": view.getUint16(offset, true),
+                "clockwiseShift": (view.getUint8(offset + 2) & AttackCodec.CLOCKWISE_SHIFT_BIT) !== 0,
+                "arrows": []
+            };
+            const arrowCount = view.getUint8(offset + 3);
+            offset += 4;
+            
+            for(let j = 0; j < arrowCount; ++j) {
+                const packedDirection = view.getUint8(offset);
+                attack["arrows"].push({
+                    "direction": AttackCodec.DIRECTIONS[packedDirection & ~AttackCodec.REVERSED_BIT],
+                    "reversed": (packedDirection & AttackCodec.REVERSED_BIT) !== 0,
+                    "delay": view.getUint16(offset + 1, true),
+                    "speed": view.getUint16(offset + 3, true)
+                });
+                offset += 5;
+            }
+            
+            attacks.push(attack);
+        }
+        
+        return {"attacks": attacks};
+    }
+}
@@ -0,0 +1 @@
+class AttackCodec{static FORMAT_VERSION=1;static DIRECTIONS=["U","D","L","R","?"];static REVERSED_BIT=8;static CLOCKWISE_SHIFT_BIT=1;static decode(t){const e=new DataView(t);if("UDA"!==String.fromCharCode(e.getUint8(0),e.getUint8(1),e.getUint8(2)))throw new Error("The data is not an encoded level");if(e.getUint8(3)!==AttackCodec.FORMAT_VERSION)throw new Error("Unsupported level encoding version "+e.getUint8(3));var a=e.getUint8(4);const r=[];let o=5;for(let t=0;t<a;++t){const c={attackDelay:e.getUint16(o,!0),clockwiseShift:0!=(e.getUint8(o+2)&AttackCodec.CLOCKWISE_SHIFT_BIT),arrows:[]};var n=e.getUint8(o+3);o+=4;for(let t=0;t<n;++t){var s=e.getUint8(o);c.arrows.push({direction:AttackCodec.DIRECTIONS[s&~AttackCodec.REVERSED_BIT],reversed:0!=(s&AttackCodec.REVERSED_BIT),delay:e.getUint16(o+1,!0),speed:e.getUint16(o+3,!0)}),o+=5}r.push(c)}return{attacks:r}}}
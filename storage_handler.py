@@ -0,0 +1,156 @@
+"""
+File storage for the uploaded avatars, behind one interface with two backends:
+    firebase    Firebase storage, the default (firebase_handler.Firebase)
+    local       a directory on this machine, served by the app itself, so the upload flow runs offline and can be load
+                tested without touching the cloud
+chosen with STORAGE_BACKEND.
+
+A backend has get_signed_url(file_name, file_type, expiration), the URL the browser PUTs the file to,
+get_file_url(file_name), where the stored file can be read, and load_file(file_name) and
+store_file(file_name, data, content_type) for the server's own reads and writes; store_file returns the file's URL.
+Signed upload URLs stay valid for SIGNED_URL_LIFETIME, so one is handed out again for the same file and type until
+shortly before it expires instead of being signed anew.
+"""
+
+import os
+import time
+from datetime import timedelta
+from typing import Any, Callable
+
+import requests
+from flask import Blueprint, Flask, abort, request, send_from_directory, url_for
+from itsdangerous import BadSignature, URLSafeSerializer
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+import utils
+from db.result_cache import ResultCache
+
+SIGNED_URL_LIFETIME = timedelta(minutes = 10)
+# A cached URL is no longer handed out once it has less than this left, so a slow upload still finishes in time
+SIGNED_URL_MARGIN = timedelta(minutes = 2)
+
+# Connect and read timeouts, in seconds, of every request to the storage service
+HTTP_TIMEOUT = (3.05, 10)
+HTTP_RETRIES = Retry(
+    total = 3, backoff_factor = 0.3, status_forcelist = (429, 500, 502, 503, 504), allowed_methods = ("GET", "HEAD")
+)
+
+LOCAL_STORAGE_PATH = os.environ.get("LOCAL_STORAGE_PATH", f"{utils.get_project_base_path()}/local_storage")
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """Pools connections per host and gives every request a timeout unless it sets its own"""
+    
+    def __init__(self, timeout, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+    
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def create_http_session() -> requests.Session:
+    http_session = requests.Session()
+    adapter = TimeoutHTTPAdapter(HTTP_TIMEOUT, max_retries = HTTP_RETRIES)
+    http_session.mount("https://", adapter)
+    http_session.mount("http://", adapter)
+    return http_session
+
+
+class LocalStorage:
+    """A storage backend that keeps the files in a directory and signs upload URLs with the app's secret key"""
+    
+    def __init__(self, app: Flask, path: str = LOCAL_STORAGE_PATH):
+        self.path = path
+        os.makedirs(path, exist_ok = True)
+        self.__serializer = URLSafeSerializer(app.secret_key, salt = "local-storage-upload")
+        
+        blueprint = Blueprint("local_storage", __name__)
+        blueprint.add_url_rule("/local-storage/<file_name>", "upload_file", self.upload_file, methods = ["PUT"])
+        blueprint.add_url_rule("/local-storage/<file_name>", "read_file", self.read_file, methods = ["GET"])
+        app.register_blueprint(blueprint)
+    
+    def get_signed_url(self, file_name, file_type = "jpeg", expiration = SIGNED_URL_LIFETIME):
+        signature = self.__serializer.dumps([file_name, f"image/{file_type}", time.time() + expiration.total_seconds()])
+        return url_for("local_storage.upload_file", file_name = file_name, signature = signature, _external = True)
+    
+    def get_file_url(self, file_name):
+        # The upload time in the URL makes browsers fetch a replaced file instead of reusing the old one
+        version = int(os.path.getmtime(f"{self.path}/{file_name}"))
+        return url_for("local_storage.read_file", file_name = file_name, v = version, _external = True)
+    
+    def upload_file(self, file_name):
+        try:
+            signed_file_name, content_type, expires_at = self.__serializer.loads(request.args.get("signature", ""))
+        except BadSignature:
+            abort(403)
+        # Like a signed cloud storage URL, it only uploads the file and type it was signed for, until it expires
+        if signed_file_name != file_name or request.mimetype != content_type or time.time() > expires_at:
+            abort(403)
+        
+        self.__write(file_name, request.get_data())
+        return "", 200
+    
+    def __write(self, file_name, data: bytes):
+        # Written next to the file and renamed over it, so a reader never gets half an upload
+        temporary_path = f"{self.path}/.{file_name}.upload"
+        with open(temporary_path, "wb") as file:
+            file.write(data)
+        os.replace(temporary_path, f"{self.path}/{file_name}")
+    
+    def read_file(self, file_name):
+        return send_from_directory(self.path, file_name)
+    
+    def load_file(self, file_name) -> bytes:
+        with open(f"{self.path}/{file_name}", "rb") as file:
+            return file.read()
+    
+    def store_file(self, file_name, data: bytes, content_type: str) -> str:
+        # The content type is the one send_from_directory guesses from the file name
+        self.__write(file_name, data)
+        return self.get_file_url(file_name)
+
+
+class Storage:
+    def __init__(self, create_backend: Callable[[], Any]):
+        # Built on first use in each worker, so no HTTP connections or Firebase state cross a fork
+        self.backend = utils.ProcessLocal(create_backend)
+        self.__signed_urls = ResultCache(
+            max_entries = int(os.environ.get("SIGNED_URL_CACHE_MAX_ENTRIES", 4096)),
+            ttl = (SIGNED_URL_LIFETIME - SIGNED_URL_MARGIN).total_seconds()
+        )
+    
+    def get_signed_url(self, file_name, file_type = "jpeg") -> str:
+        return self.__signed_urls.get_or_load(
+            (file_name, file_type),
+            lambda: self.backend.get().get_signed_url(file_name, file_type, expiration = SIGNED_URL_LIFETIME)
+        )
+    
+    def get_file_url(self, file_name) -> str:
+        return self.backend.get().get_file_url(file_name)
+    
+    def load_file(self, file_name) -> bytes:
+        return self.backend.get().load_file(file_name)
+    
+    def store_file(self, file_name, data: bytes, content_type: str) -> str:
+        return self.backend.get().store_file(file_name, data, content_type)
+
+
+def create_firebase():
+    # Imported here so the local backend runs without Firebase credentials, and the Firebase SDK isn't loaded before
+    # a worker first needs it
+    from firebase_handler import Firebase
+    return Firebase(create_http_session())
+
+
+def create_storage(app: Flask) -> Storage:
+    backend_name = os.environ.get("STORAGE_BACKEND", "firebase")
+    if backend_name == "local":
+        local_storage = LocalStorage(app)
+        return Storage(lambda: local_storage)
+    if backend_name == "firebase":
+        return Storage(create_firebase)
+    raise ValueError(f"Unknown STORAGE_BACKEND {backend_name}")
@@ -0,0 +1,44 @@
+"""
+Tests that need PostgreSQL read its address from TEST_DATABASE_URL and are skipped without it. Point it at a database
+made for testing: the tests create and drop tables of their own in it.
+Run from the project root with: python -m pytest tests
+"""
+
+import os
+
+import pytest
+
+import utils
+from db import database_handler, migration_runner, sql_registry
+from db.connection_pool import BoundedConnectionPool
+
+
+def create_test_pool(dsn: str, **options) -> BoundedConnectionPool:
+    return BoundedConnectionPool(
+        dsn, **dict(dict(min_size = 0, max_size = 4, timeout = 1, max_idle = 60, max_lifetime = 1800), **options),
+        connection_factory = database_handler.PreparingConnection
+    )
+
+
+@pytest.fixture
+def database_url() -> str:
+    dsn = os.environ.get("TEST_DATABASE_URL")
+    if not dsn:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    return dsn
+
+
+@pytest.fixture
+def primary_pool(database_url, monkeypatch) -> BoundedConnectionPool:
+    """database_handler's pool, on the test database"""
+    pool = create_test_pool(database_url)
+    monkeypatch.setattr(database_handler, "pool", utils.ProcessLocal(lambda: pool))
+    yield pool
+    pool.closeall()
+
+
+@pytest.fixture
+def app_schema(database_url, primary_pool):
+    """The app's own tables, migrated to the latest version, with the statement registry loaded"""
+    migration_runner.migrate(database_url, log = lambda message: None)
+    sql_registry.load()
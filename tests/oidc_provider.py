@@ -0,0 +1,123 @@
+"""
+A stand-in OpenID provider for the login tests, serving on a free local port. It serves the discovery document, its key
+set and an authorization endpoint that redirects straight back with a code. Its token endpoint trades that code for an
+ID token signed with a key generated at start, carrying the nonce of the authorization request.
+Tests make it misbehave through id_token_claims, merged into every ID token, and signing_key.
+"""
+
+import json
+import secrets
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from joserfc import jwt
+from joserfc.jwk import RSAKey
+
+KEY_ID = "stand-in"
+
+
+class StandInProvider:
+    def __init__(self, client_id: str):
+        self.client_id = client_id
+        self.key = RSAKey.generate_key(2048, parameters = {"kid": KEY_ID})
+        # What ID tokens are signed with. Another key under the same key id makes their signatures wrong
+        self.signing_key = self.key
+        self.id_token_claims: Dict[str, object] = {}
+        # Requests by path, to tell what a login fetched
+        self.requests = Counter()
+        self.__nonces: Dict[str, Optional[str]] = {}
+        self.__server = ThreadingHTTPServer(("127.0.0.1", 0), self.__create_handler())
+        self.url = f"http://127.0.0.1:{self.__server.server_port}"
+        self.metadata_url = f"{self.url}/.well-known/openid-configuration"
+    
+    def start(self):
+        threading.Thread(target = self.__server.serve_forever, daemon = True).start()
+    
+    def stop(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+    
+    def get_metadata(self) -> dict:
+        return {
+            "issuer": f"{self.url}/",
+            "authorization_endpoint": f"{self.url}/authorize",
+            "token_endpoint": f"{self.url}/oauth/token",
+            "userinfo_endpoint": f"{self.url}/userinfo",
+            "jwks_uri": f"{self.url}/.well-known/jwks.json",
+            "id_token_signing_alg_values_supported": ["RS256"],
+        }
+    
+    def authorize(self, query: dict) -> str:
+        """:return: Where the browser is sent back to, with a code for the token endpoint"""
+        code = secrets.token_urlsafe(16)
+        self.__nonces[code] = query.get("nonce", [None])[0]
+        return f"{query['redirect_uri'][0]}?{urlencode(dict(code = code, state = query['state'][0]))}"
+    
+    def issue_tokens(self, form: dict) -> dict:
+        now = int(time.time())
+        claims = {
+            "iss": f"{self.url}/",
+            "aud": self.client_id,
+            "sub": "auth0|stand-in",
+            "iat": now,
+            "exp": now + 600,
+            "nonce": self.__nonces.pop(form["code"][0], None),
+            "nickname": "stand-in",
+            "name": "Stand In",
+            "email": "stand-in@example.com",
+            "email_verified": True,
+            "picture": "https://example.com/stand-in.png",
+            **self.id_token_claims,
+        }
+        return {
+            "access_token": secrets.token_urlsafe(16),
+            "token_type": "Bearer",
+            "expires_in": 600,
+            "id_token": jwt.encode({"alg": "RS256", "kid": KEY_ID}, claims, self.signing_key),
+        }
+    
+    def __create_handler(self):
+        provider = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+            
+            def send_json(self, body: dict):
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def do_GET(self):
+                url = urlparse(self.path)
+                provider.requests[url.path] += 1
+                if url.path == "/.well-known/openid-configuration":
+                    self.send_json(provider.get_metadata())
+                elif url.path == "/.well-known/jwks.json":
+                    self.send_json({"keys": [provider.key.as_dict(private = False)]})
+                elif url.path == "/authorize":
+                    self.send_response(302)
+                    self.send_header("Location", provider.authorize(parse_qs(url.query)))
+                    self.end_headers()
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+            
+            def do_POST(self):
+                url = urlparse(self.path)
+                provider.requests[url.path] += 1
+                form = parse_qs(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode())
+                if url.path == "/oauth/token":
+                    self.send_json(provider.issue_tokens(form))
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+        
+        return Handler
@@ -0,0 +1,161 @@
+import json
+import os
+import subprocess
+import sys
+from urllib.parse import urlparse
+
+import pytest
+import requests
+from flask import Flask, session
+from joserfc.errors import BadSignatureError, ClaimError
+from joserfc.jwk import RSAKey
+
+import auth_handler
+import oidc_metadata
+import utils
+from db.auth import auth_handler as db_auth_handler
+from tests.oidc_provider import KEY_ID, StandInProvider
+
+CLIENT_ID = "stand-in-client"
+
+
+@pytest.fixture(scope = "module")
+def provider() -> StandInProvider:
+    provider = StandInProvider(CLIENT_ID)
+    provider.start()
+    yield provider
+    provider.stop()
+
+
+@pytest.fixture(scope = "module")
+def login_app(provider, tmp_path_factory) -> Flask:
+    """
+    An app that logs in through the stand-in provider. authlib keeps its registered clients for the whole process, so
+    every test of the module shares this app and its cache directory
+    """
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("CLIENT_ID", CLIENT_ID)
+        monkeypatch.setenv("CLIENT_SECRET", "stand-in-secret")
+        monkeypatch.setenv("OIDC_METADATA_URL", provider.metadata_url)
+        # The stand-in provider serves plain HTTP
+        monkeypatch.setenv("AUTHLIB_INSECURE_TRANSPORT", "true")
+        monkeypatch.setattr(oidc_metadata, "CACHE_PATH", str(tmp_path_factory.mktemp("oidc")))
+        # Every login is of a new user, who gets their claims kept in the session to pick a user name
+        monkeypatch.setattr(db_auth_handler, "check_if_user_in_db", lambda user_id, user_email = None: None)
+        
+        app = Flask(__name__)
+        app.secret_key = "oidc-login-test"
+        app.testing = True
+        auth = auth_handler.Auth(app)
+        
+        @app.route("/login")
+        def login():
+            return auth.handle_login("http://localhost/callback")
+        
+        @app.route("/callback")
+        def callback():
+            return {"found": auth.handle_callbacks(), "claims": session.get("temp")}
+        
+        yield app
+
+
+@pytest.fixture
+def misbehave(provider):
+    """Reverts whatever a test made the provider do wrong"""
+    yield provider
+    provider.id_token_claims = {}
+    provider.signing_key = provider.key
+
+
+def log_in(app: Flask):
+    """Goes through the login redirects like a browser would, the provider logging the user in right away"""
+    client = app.test_client()
+    authorize_url = client.get("/login").location
+    callback_url = urlparse(requests.get(authorize_url, allow_redirects = False).headers["Location"])
+    return client.get(callback_url.path, query_string = callback_url.query)
+
+
+def test_login_trusts_the_verified_id_token(login_app, provider):
+    log_in(login_app)
+    requests_before = provider.requests.copy()
+    
+    response = log_in(login_app)
+    
+    assert response.json == {
+        "found": False,
+        "claims": {
+            "sub": "auth0|stand-in", "nickname": "stand-in", "name": "Stand In", "email": "stand-in@example.com",
+            "email_verified": True, "picture": "https://example.com/stand-in.png"
+        }
+    }
+    # Once the documents are cached a login only trades its code for tokens
+    assert provider.requests - requests_before == {"/authorize": 1, "/oauth/token": 1}
+
+
+def test_metadata_is_fetched_once_and_kept_on_disk(provider, tmp_path, monkeypatch):
+    monkeypatch.setattr(oidc_metadata, "CACHE_PATH", str(tmp_path))
+    requests_before = provider.requests.copy()
+    
+    metadata = oidc_metadata.ProviderMetadata(provider.metadata_url).get()
+    # A new worker or a restart starts with nothing in memory
+    reloaded = oidc_metadata.ProviderMetadata(provider.metadata_url).get()
+    
+    assert provider.requests - requests_before == {"/.well-known/openid-configuration": 1, "/.well-known/jwks.json": 1}
+    assert reloaded == metadata
+    assert metadata["jwks"]["keys"][0]["kid"] == KEY_ID
+    with open(oidc_metadata.ProviderMetadata(provider.metadata_url).file_path) as file:
+        assert json.load(file) == metadata
+
+
+def test_second_process_reads_the_cached_file(provider, tmp_path, monkeypatch):
+    monkeypatch.setattr(oidc_metadata, "CACHE_PATH", str(tmp_path))
+    metadata = oidc_metadata.ProviderMetadata(provider.metadata_url).get()
+    requests_before = provider.requests.copy()
+    
+    script = "import json, oidc_metadata, sys; print(json.dumps(oidc_metadata.ProviderMetadata(sys.argv[1]).get()))"
+    result = subprocess.run(
+        [sys.executable, "-c", script, provider.metadata_url],
+        cwd = utils.get_project_base_path(), env = dict(os.environ, OIDC_CACHE_PATH = str(tmp_path)),
+        capture_output = True, text = True, check = True
+    )
+    
+    assert json.loads(result.stdout) == metadata
+    assert provider.requests == requests_before
+
+
+def test_stale_copy_is_used_while_the_provider_is_down(provider, tmp_path, monkeypatch):
+    monkeypatch.setattr(oidc_metadata, "CACHE_PATH", str(tmp_path))
+    metadata = oidc_metadata.ProviderMetadata(provider.metadata_url).get()
+    monkeypatch.setattr(oidc_metadata, "TTL", 0)
+    
+    def fail(*args, **kwargs):
+        raise requests.ConnectionError("provider is down")
+    
+    monkeypatch.setattr(oidc_metadata.requests, "get", fail)
+    stale = oidc_metadata.ProviderMetadata(provider.metadata_url).get()
+    
+    assert stale["jwks"] == metadata["jwks"]
+
+
+@pytest.mark.parametrize(
+    "claims", [
+        {"nonce": "forged"},
+        # A token the provider issued to another client
+        {"aud": "another-client", "azp": "another-client"},
+        {"iss": "https://another-issuer/"},
+        {"exp": 1},
+    ],
+    ids = ["nonce", "audience", "issuer", "expired"]
+)
+def test_login_rejects_id_token_with_wrong_claim(login_app, misbehave, claims):
+    misbehave.id_token_claims = claims
+    
+    with pytest.raises(ClaimError):
+        log_in(login_app)
+
+
+def test_login_rejects_id_token_with_wrong_signature(login_app, misbehave):
+    misbehave.signing_key = RSAKey.generate_key(2048, parameters = {"kid": KEY_ID})
+    
+    with pytest.raises(BadSignatureError):
+        log_in(login_app)
@@ -0,0 +1,5 @@
+from db import query_plan_check
+
+
+def test_hot_queries_are_served_by_indexes(app_schema):
+    assert query_plan_check.check_query_plans() == {}
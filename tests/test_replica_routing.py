@@ -0,0 +1,146 @@
+"""
+Read replica routing against real servers. TEST_DATABASE_URL is the primary and TEST_REPLICA_DATABASE_URL a replica;
+any second PostgreSQL instance works as one, since the tests only look at which server a read went to.
+Skipped unless both are set.
+"""
+
+import os
+
+import pytest
+from flask import Flask, g
+
+import utils
+from db import database_handler, replica_router
+from db.home import home_handler
+
+# Nothing listens there, so a replica at this address is down
+DOWN_REPLICA_URL = "postgresql://postgres@127.0.0.1:1/postgres?connect_timeout=1"
+
+
+@pytest.fixture
+def replica_url(database_url) -> str:
+    dsn = os.environ.get("TEST_REPLICA_DATABASE_URL")
+    if not dsn:
+        pytest.skip("TEST_REPLICA_DATABASE_URL is not set")
+    return dsn
+
+
+@pytest.fixture
+def use_replicas(primary_pool, monkeypatch):
+    """Points database_handler at the given replicas, each with a pool of its own"""
+    replica_sets = []
+    
+    def use(*dsns: str):
+        monkeypatch.setenv("DATABASE_REPLICA_URLS", ",".join(dsns))
+        replica_set = database_handler.create_replicas()
+        replica_sets.append(replica_set)
+        monkeypatch.setattr(database_handler, "replicas", utils.ProcessLocal(lambda: replica_set))
+        return replica_set
+    
+    yield use
+    for replica_set in replica_sets:
+        for replica in replica_set.replicas:
+            replica.pool.closeall()
+
+
+def create_app() -> Flask:
+    app = Flask(__name__)
+    app.secret_key = "replica-routing-test"
+    database_handler.init_app(app)
+    
+    def read_server() -> str:
+        with database_handler.get_read_cursor() as cursor:
+            cursor.execute("SELECT 1")
+            return "primary" if cursor.connection is g.get("db_connection") else "replica"
+    
+    @app.route("/read")
+    def read():
+        return read_server()
+    
+    @app.route("/write-then-read", methods = ["POST"])
+    def write_then_read():
+        with database_handler.get_db_cursor(commit = True) as cursor:
+            cursor.execute("SELECT 1")
+        return read_server()
+    
+    return app
+
+
+def checkout_replica_name(app: Flask):
+    with app.test_request_context("/read"):
+        connection, replica = database_handler.checkout_replica()
+        if replica is None:
+            return None
+        replica.pool.putconn(connection)
+        return replica.name
+
+
+def test_reads_take_turns_over_the_replicas(replica_url, use_replicas):
+    use_replicas(replica_url, replica_url)
+    app = create_app()
+    
+    names = [checkout_replica_name(app) for _ in range(4)]
+    
+    assert names == ["replica_0", "replica_1", "replica_0", "replica_1"]
+
+
+def test_session_reads_its_writes_from_the_primary(replica_url, use_replicas):
+    use_replicas(replica_url)
+    app = create_app()
+    writer = app.test_client()
+    
+    assert writer.get("/read").text == "replica"
+    # Within the request that wrote, and in the session's next requests
+    assert writer.post("/write-then-read").text == "primary"
+    assert writer.get("/read").text == "primary"
+    # Other sessions still read from the replica
+    assert app.test_client().get("/read").text == "replica"
+
+
+def test_session_reads_from_replicas_again_after_the_window(replica_url, use_replicas):
+    use_replicas(replica_url)
+    client = create_app().test_client()
+    
+    client.post("/write-then-read")
+    with client.session_transaction() as session:
+        session[replica_router.SESSION_WRITE_KEY] -= replica_router.READ_YOUR_WRITES_WINDOW
+    
+    assert client.get("/read").text == "replica"
+
+
+def test_replica_that_is_down_is_skipped(replica_url, use_replicas):
+    replica_set = use_replicas(DOWN_REPLICA_URL, replica_url)
+    app = create_app()
+    
+    assert [checkout_replica_name(app) for _ in range(3)] == ["replica_1"] * 3
+    assert not replica_set.replicas[0].usable
+    assert replica_set.replicas[1].usable
+
+
+def test_lagging_replica_is_skipped(replica_url, use_replicas, monkeypatch):
+    # Any replica is further behind than a negative lag
+    monkeypatch.setattr(replica_router, "MAX_LAG", -1)
+    replica_set = use_replicas(replica_url)
+    app = create_app()
+    
+    assert checkout_replica_name(app) is None
+    assert app.test_client().get("/read").text == "primary"
+    assert replica_set.replicas[0].lag is not None
+    assert not replica_set.replicas[0].usable
+
+
+def test_every_replica_down_falls_back_to_the_primary(database_url, use_replicas):
+    use_replicas(DOWN_REPLICA_URL)
+    
+    assert create_app().test_client().get("/read").text == "primary"
+
+
+def test_feed_cache_is_filled_from_the_primary(replica_url, use_replicas, app_schema):
+    use_replicas(replica_url)
+    app = create_app()
+    home_handler.feed_cache.invalidate()
+    
+    # The replica stand-in has none of the app's tables, so the load would fail there
+    with app.test_request_context("/"):
+        list(home_handler.get_homefeed())
+        assert "db_connection" in g
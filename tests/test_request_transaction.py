@@ -0,0 +1,129 @@
+import pytest
+from flask import Flask, abort
+
+import utils
+from db import database_handler
+
+
+class RecordingConnection:
+    """Stands in for a pooled connection and records what the request does with it"""
+    
+    def __init__(self, calls: list):
+        self.calls = calls
+    
+    def cursor(self, cursor_factory = None):
+        return self
+    
+    def execute(self, query, parameters = None):
+        self.calls.append("execute")
+    
+    def close(self):
+        pass
+    
+    def commit(self):
+        self.calls.append("commit")
+
+
+class RecordingPool:
+    def __init__(self):
+        self.calls = []
+    
+    def getconn(self):
+        self.calls.append("getconn")
+        return RecordingConnection(self.calls)
+    
+    def putconn(self, connection):
+        self.calls.append("putconn")
+
+
+def create_app(callbacks: list) -> Flask:
+    """An app whose views write, then return or raise"""
+    app = Flask(__name__)
+    database_handler.init_app(app)
+    
+    def write(value: int):
+        with database_handler.get_db_cursor(commit = True) as cursor:
+            cursor.execute("INSERT INTO request_transaction_test VALUES (%s)", (value,))
+        database_handler.after_commit(lambda: callbacks.append(value))
+    
+    @app.route("/write/<int:value>")
+    def write_and_return(value):
+        write(value)
+        return "written"
+    
+    @app.route("/write/<int:value>/raise")
+    def write_and_raise(value):
+        write(value)
+        raise RuntimeError("failed after writing")
+    
+    @app.route("/write/<int:value>/abort")
+    def write_and_abort(value):
+        write(value)
+        abort(403)
+    
+    return app
+
+
+@pytest.fixture
+def recording_pool(monkeypatch) -> RecordingPool:
+    pool = RecordingPool()
+    monkeypatch.setattr(database_handler, "pool", utils.ProcessLocal(lambda: pool))
+    return pool
+
+
+def test_request_commits_once_after_the_view(recording_pool):
+    callbacks = []
+    response = create_app(callbacks).test_client().get("/write/1")
+    
+    assert response.status_code == 200
+    assert recording_pool.calls == ["getconn", "execute", "commit", "putconn"]
+    assert callbacks == [1]
+
+
+@pytest.mark.parametrize("path", ["/write/1/raise", "/write/1/abort"])
+def test_request_that_raises_commits_nothing(recording_pool, path):
+    callbacks = []
+    response = create_app(callbacks).test_client().get(path)
+    
+    assert response.status_code in (403, 500)
+    # Returning the connection uncommitted is what rolls it back
+    assert recording_pool.calls == ["getconn", "execute", "putconn"]
+    assert callbacks == []
+
+
+@pytest.fixture
+def transaction_table(primary_pool):
+    with database_handler.get_db_cursor(commit = True) as cursor:
+        cursor.execute("CREATE TABLE request_transaction_test (value integer)")
+    yield
+    with database_handler.get_db_cursor(commit = True) as cursor:
+        cursor.execute("DROP TABLE request_transaction_test")
+
+
+def get_values() -> list:
+    with database_handler.get_db_cursor() as cursor:
+        cursor.execute("SELECT value FROM request_transaction_test ORDER BY value")
+        return [row["value"] for row in cursor.fetchall()]
+
+
+def test_request_commits_its_writes(transaction_table):
+    callbacks = []
+    response = create_app(callbacks).test_client().get("/write/1")
+    
+    assert response.status_code == 200
+    assert get_values() == [1]
+    assert callbacks == [1]
+
+
+@pytest.mark.parametrize("path", ["/write/1/raise", "/write/1/abort"])
+def test_request_that_raises_leaves_no_rows(transaction_table, primary_pool, path):
+    callbacks = []
+    app = create_app(callbacks)
+    
+    response = app.test_client().get(path)
+    
+    assert response.status_code in (403, 500)
+    assert get_values() == []
+    assert callbacks == []
+    # The connection went back to the pool rather than staying checked out
+    assert primary_pool.stats()["in_use"] == 0
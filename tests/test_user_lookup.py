@@ -0,0 +1,55 @@
+import pytest
+from psycopg2.extras import Json
+
+from db import database_handler
+from db.auth import auth_handler
+from db.user import user_handler
+
+THUMBNAILS = {"64": {"webp": "https://example.com/64.webp", "jpeg": "https://example.com/64.jpeg"}}
+
+
+@pytest.fixture
+def user(app_schema) -> dict:
+    user = dict(
+        user_id = "test|user-lookup", user_name = "user_lookup_test", user_email = "user-lookup@example.com",
+        user_avatar = "https://example.com/user-lookup.png"
+    )
+    database_handler.execute_statements("auth/insert_user_data", user)
+    yield user
+    with database_handler.get_db_cursor(commit = True) as cursor:
+        cursor.execute("DELETE FROM user_info WHERE user_id = %s", (user["user_id"],))
+
+
+def test_returning_user_is_found_by_id(user):
+    found = auth_handler.check_if_user_in_db(user["user_id"])
+    
+    assert found is not None
+    assert found.model_dump() == user
+    assert found.creation_date is not None
+
+
+def test_user_is_found_by_email_from_another_login_method(user):
+    found = auth_handler.check_if_user_in_db("other-provider|user-lookup", user_email = user["user_email"])
+    
+    assert found is not None
+    assert found.user_id == user["user_id"]
+
+
+def test_unknown_user_is_not_found(user):
+    assert auth_handler.check_if_user_in_db("test|nobody", user_email = "nobody@example.com") is None
+
+
+def test_user_with_avatar_thumbnails_is_found(user):
+    database_handler.execute_statements(
+        "user/update_user", dict(
+            user_avatar = user["user_avatar"], user_avatar_thumbnails = Json(THUMBNAILS), user_id = user["user_id"]
+        )
+    )
+    
+    found = auth_handler.check_if_user_in_db(user["user_id"])
+    profile = user_handler.get_user_info(user["user_name"])[0]
+    
+    assert found.user_id == user["user_id"]
+    assert profile["user_id"] == user["user_id"]
+    assert profile["user_avatar"] == user["user_avatar"]
+    assert profile["user_avatar_thumbnails"] == THUMBNAILS
@@ -1,7 +1,15 @@
 import os
+import threading
 from functools import wraps
+from typing import Callable, Generic, List, Optional, TypeVar
 
-from flask import session, redirect, url_for
+from flask import session, redirect, url_for, abort
+
+T = TypeVar("T")
+
+# What forked processes inherited from their parent. Kept referenced so it is never closed: closing an inherited
+# connection would end the parent's session over the socket they share
+_inherited_objects: List[object] = []
 
 
 def get_project_base_path():
@@ -19,3 +27,60 @@ def requires_auth(f):
         return f(*args, **kwargs)
     
     return decorated
+
+
+def get_admin_user_ids() -> List[str]:
+    return [user_id.strip() for user_id in os.environ.get("ADMIN_USER_IDS", "").split(",") if user_id.strip()]
+
+
+def requires_admin(f):
+    """
+    For operational pages. Only the users listed in ADMIN_USER_IDS, separated by commas, get through; everyone else
+    gets a 403. Goes under requires_auth, which makes sure there is a user to check
+    """
+    
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if session["profile"]["user_id"] not in get_admin_user_ids():
+            abort(403)
+        return f(*args, **kwargs)
+    
+    return decorated
+
+
+class ProcessLocal(Generic[T]):
+    """
+    An object built by factory the first time get is called in each process, for anything holding sockets or threads,
+    such as connection pools and API clients. A forked worker, e.g. under gunicorn --preload, never uses its parent's
+    object but builds its own
+    """
+    
+    def __init__(self, factory: Callable[[], T]):
+        self.__factory = factory
+        self.__value: Optional[T] = None
+        self.__pid: Optional[int] = None
+        self.__lock = threading.Lock()
+        # Another thread may hold the lock at the moment of a fork, and nothing in the child would ever release it
+        os.register_at_fork(after_in_child = self.__replace_lock)
+    
+    def __replace_lock(self):
+        self.__lock = threading.Lock()
+    
+    def get(self) -> T:
+        if self.__pid == os.getpid():
+            return self.__value
+        with self.__lock:
+            if self.__pid != os.getpid():
+                if self.__pid is not None:
+                    _inherited_objects.append(self.__value)
+                self.__value = self.__factory()
+                self.__pid = os.getpid()
+            return self.__value
+    
+    def reset(self):
+        """
+        Has the next get build a new object, for when this one can't be used anymore. Closing it is up to the caller
+        """
+        with self.__lock:
+            self.__value = None
+            self.__pid = None